@@ -1,25 +1,78 @@
-import os  # noqa: F401
-from flask import Flask
+import os
+from flask import Flask, Response
 from .config import Config
-from .extensions import db, migrate, configure_logging
+from .extensions import db, init_migrate
+from .logs import configure_logging
+from .dbutil import install_sqlite_pragmas
+from .metrics import Metrics
+from .seen_events import SeenEvents
+from .webhooks.admission import Admission
+from .stripe_cache import PaymentIntentCache
 from . import models  # noqa: F401
 
 from .webhooks.routes import webhooks_bp
+from .webhooks import cli as webhooks_cli  # noqa: F401  (registers `flask webhooks ...`)
+from .orders.routes import orders_bp, payments_bp
+from .orders import cli as orders_cli  # noqa: F401  (registers `flask orders ...`)
+from .events.cli import events_cli
 
-def create_app():
+MODES = ("web", "cli")
+
+
+def create_app(mode=None):
+    """Build the app. `mode` (default: APP_MODE, else "web"):
+
+    - "web": everything, for the HTTP server.
+    - "cli": lean, for CLI commands and the async worker
+      (`flask --app "app:create_app('cli')" webhooks worker`): the blueprints'
+      commands without their routes, and no /healthz, /metrics, request
+      instrumentation or seen-events filter.
+    """
+    mode = mode or os.getenv("APP_MODE") or "web"
+    if mode not in MODES:
+        raise ValueError(f"unknown app mode {mode!r} (expected one of {', '.join(MODES)})")
     app = Flask(__name__)
     app.config.from_object(Config())
+    app.config["APP_MODE"] = mode
 
     # init extensions
     db.init_app(app)
-    migrate.init_app(app, db)
+    install_sqlite_pragmas(app)
+    init_migrate(app, db)   # `flask db ...`; imports Flask-Migrate on first use
     configure_logging(app)
+    app.extensions["pi_cache"] = PaymentIntentCache.from_app(app)
+
+    app.cli.add_command(events_cli)   # `flask events ...`
+
+    if mode == "cli":
+        Metrics().init_app(app, db, instrument=False)   # stage timings only; nothing serves them
+        for bp in (webhooks_bp, orders_bp, payments_bp):
+            app.cli.add_command(bp.cli, bp.name)
+        return app
+
+    app.extensions["seen_events"] = SeenEvents.from_app(app)   # None unless SEEN_FILTER_ENABLED
+    app.extensions["admission"] = Admission.from_app(app)      # None unless WEBHOOK_ADMISSION_ENABLED
+    Metrics().init_app(app, db)
 
     # blueprints
     app.register_blueprint(webhooks_bp, url_prefix="/webhooks")
+    app.register_blueprint(orders_bp, url_prefix="/orders")
+    app.register_blueprint(payments_bp, url_prefix="/payments")
 
     @app.get("/healthz")
     def healthz():
         return {"ok": True}, 200
 
+    @app.get("/metrics")
+    def metrics():
+        extra = {f"pi_cache_{k}": v for k, v in app.extensions["pi_cache"].stats().items()}
+        if app.extensions["seen_events"] is not None:
+            extra.update({f"seen_filter_{k}": v for k, v in app.extensions["seen_events"].stats().items()})
+        if app.extensions["admission"] is not None:
+            extra.update({f"webhook_admission_{k}": v for k, v in app.extensions["admission"].stats().items()})
+        if app.extensions["logging"] is not None:
+            extra.update({f"log_queue_{k}": v for k, v in app.extensions["logging"].stats().items()})
+        body = app.extensions["metrics"].render(extra=extra)
+        return Response(body, mimetype="text/plain; version=0.0.4")
+
     return app
@@ -1,12 +1,111 @@
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+_dotenv_loaded = False
+
+
+def load_env():
+    """Read .env into os.environ (existing variables win), once per process."""
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _dotenv_loaded = True
+
+
+def _flag(name, default):
+    return os.getenv(name, default).lower() in ("1", "true", "yes", "on")
+
+
+def sqlite_pragmas():
+    """PRAGMAs run on every new SQLite connection (see app.dbutil.install_sqlite_pragmas).
+
+    WAL lets readers run alongside the single writer, synchronous=NORMAL is
+    durable in WAL mode except for the last commits on power loss, and the
+    busy timeout makes concurrent writers wait for the lock instead of
+    failing with "database is locked".
+    """
+    return {
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    }
+
+
+def engine_options(uri):
+    """SQLALCHEMY_ENGINE_OPTIONS for the dialect in `uri`."""
+    if uri.startswith("sqlite"):
+        # Same wait as busy_timeout, for the driver's own lock handling
+        return {"connect_args": {"timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")) / 1000}}
+    # Postgres (and anything else with a real pool). Size the pool to the
+    # threads that share it in one process; see gunicorn's --threads.
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "5")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        "pool_pre_ping": _flag("DB_POOL_PRE_PING", "true"),
+    }
+
 
 class Config:
-    SECRET_KEY = os.getenv("SECRET_KEY", "dev-key")
-    SQLALCHEMY_DATABASE_URI = os.getenv("SQLALCHEMY_DATABASE_URI", "sqlite:///app.db")
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Values are read when Config() is instantiated (in create_app), not at
+    # import time, so env overrides made after `import app` still apply.
+    def __init__(self):
+        load_env()
+        self.SECRET_KEY = os.getenv("SECRET_KEY", "dev-key")
+        self.SQLALCHEMY_DATABASE_URI = os.getenv("SQLALCHEMY_DATABASE_URI", "sqlite:///app.db")
+        self.SQLALCHEMY_TRACK_MODIFICATIONS = False
+        self.SQLALCHEMY_ENGINE_OPTIONS = engine_options(self.SQLALCHEMY_DATABASE_URI)
+        self.SQLITE_PRAGMAS = sqlite_pragmas()
+
+        self.STRIPE_API_KEY = os.getenv("STRIPE_API_KEY", "")
+        self.STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
+        self.STRIPE_WEBHOOK_TOLERANCE = int(os.getenv("STRIPE_WEBHOOK_TOLERANCE", "300"))  # max signature age (s)
+        self.STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "")  # e.g. a local fake API in tests
+
+        # PaymentIntent metadata cache (app/stripe_cache.py)
+        self.PI_CACHE_MAXSIZE = int(os.getenv("PI_CACHE_MAXSIZE", "10000"))
+        self.PI_CACHE_TTL = float(os.getenv("PI_CACHE_TTL", "300"))
+        self.PI_CACHE_SHARED_PATH = os.getenv("PI_CACHE_SHARED_PATH", "")  # SQLite file shared by workers
+
+        # Bloom filter of recorded event ids in front of the duplicate check (app/seen_events.py)
+        self.SEEN_FILTER_ENABLED = _flag("SEEN_FILTER_ENABLED", "false")
+        self.SEEN_FILTER_CAPACITY = int(os.getenv("SEEN_FILTER_CAPACITY", "1000000"))
+        self.SEEN_FILTER_FP_RATE = float(os.getenv("SEEN_FILTER_FP_RATE", "0.001"))
+        self.SEEN_FILTER_WARM_HOURS = float(os.getenv("SEEN_FILTER_WARM_HOURS", "72"))
+        self.SEEN_FILTER_PATH = os.getenv("SEEN_FILTER_PATH", "")  # mmap'ed file shared by workers
+
+        # Stored event payloads (app/payloads.py): "zlib", "zstd" (needs zstandard) or "none"
+        self.EVENT_PAYLOAD_CODEC = os.getenv("EVENT_PAYLOAD_CODEC", "zlib")
+        self.EVENT_PAYLOAD_MAX_BYTES = int(os.getenv("EVENT_PAYLOAD_MAX_BYTES", str(256 * 1024)))
+        # `flask events archive` output (app/events/archive.py)
+        self.EVENT_ARCHIVE_DIR = os.getenv("EVENT_ARCHIVE_DIR", "archive/events")
+        # Structured logging (app/logs.py)
+        self.LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+        self.LOG_ASYNC = _flag("LOG_ASYNC", "true")
+        self.LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+        self.LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+        # Rows validated and inserted per transaction by POST /orders/import (app/orders/ingest.py)
+        self.ORDER_IMPORT_CHUNK_SIZE = int(os.getenv("ORDER_IMPORT_CHUNK_SIZE", "5000"))
+
+        # "sync": process events inside the webhook request (default).
+        # "async": the route only records the event; `flask webhooks worker` applies it.
+        self.WEBHOOK_INGEST_MODE = os.getenv("WEBHOOK_INGEST_MODE", "sync")
+        self.WEBHOOK_WORKER_THREADS = int(os.getenv("WEBHOOK_WORKER_THREADS", "4"))
+        self.WEBHOOK_WORKER_BATCH_SIZE = int(os.getenv("WEBHOOK_WORKER_BATCH_SIZE", "500"))
+        self.WEBHOOK_WORKER_POLL_INTERVAL = float(os.getenv("WEBHOOK_WORKER_POLL_INTERVAL", "1.0"))
+        self.WEBHOOK_WORKER_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_WORKER_MAX_ATTEMPTS", "8"))
+        self.WEBHOOK_WORKER_BACKOFF_BASE = float(os.getenv("WEBHOOK_WORKER_BACKOFF_BASE", "2.0"))
+        self.WEBHOOK_WORKER_BACKOFF_MAX = float(os.getenv("WEBHOOK_WORKER_BACKOFF_MAX", "300.0"))
 
-    STRIPE_API_KEY = os.getenv("STRIPE_API_KEY", "")
-    STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET", "")
+        # Admission control / load shedding for the webhook (app/webhooks/admission.py)
+        self.WEBHOOK_ADMISSION_ENABLED = _flag("WEBHOOK_ADMISSION_ENABLED", "false")
+        self.WEBHOOK_MAX_IN_FLIGHT = int(os.getenv("WEBHOOK_MAX_IN_FLIGHT", os.getenv("DB_POOL_SIZE", "8")))
+        self.WEBHOOK_PRIORITY_RESERVED = float(os.getenv("WEBHOOK_PRIORITY_RESERVED", "0.25"))
+        self.WEBHOOK_SHED_DB_LATENCY_MS = float(os.getenv("WEBHOOK_SHED_DB_LATENCY_MS", "100"))
+        self.WEBHOOK_RETRY_AFTER = int(os.getenv("WEBHOOK_RETRY_AFTER", "5"))
+        # Comma-separated; unset means the money-moving defaults in admission.py
+        priority_types = os.getenv("WEBHOOK_PRIORITY_EVENT_TYPES", "")
+        self.WEBHOOK_PRIORITY_EVENT_TYPES = tuple(t.strip() for t in priority_types.split(",") if t.strip()) or None
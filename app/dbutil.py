@@ -0,0 +1,46 @@
+# app/dbutil.py
+"""Small dialect-aware SQL helpers (SQLite for local dev, Postgres in prod)."""
+
+from sqlalchemy import event, func
+from .extensions import db
+
+
+def dialect_name():
+    return db.session.get_bind().dialect.name
+
+
+def dialect_insert(table):
+    """`INSERT` construct that supports `.on_conflict_do_*()` for the bound dialect."""
+    name = dialect_name()
+    if name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"upserts are not supported on {name!r}")
+    return insert(table)
+
+
+def greatest(a, b):
+    """SQL max of two scalars (`greatest()` on Postgres, 2-arg `max()` on SQLite)."""
+    if dialect_name() == "postgresql":
+        return func.greatest(a, b)
+    return func.max(a, b)
+
+
+def install_sqlite_pragmas(app):
+    """Run `SQLITE_PRAGMAS` on each new connection of the app's SQLite engines."""
+    pragmas = app.config.get("SQLITE_PRAGMAS") or {}
+    with app.app_context():
+        engines = [e for e in db.engines.values() if e.dialect.name == "sqlite"]
+    for engine in engines:
+        in_memory = engine.url.database in (None, "", ":memory:")
+
+        @event.listens_for(engine, "connect")
+        def _set_pragmas(dbapi_conn, record, in_memory=in_memory):
+            cursor = dbapi_conn.cursor()
+            for name, value in pragmas.items():
+                if in_memory and name == "journal_mode":
+                    continue  # in-memory databases can't use WAL
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
@@ -0,0 +1,169 @@
+# app/events/archive.py
+"""Retention for payment_events: export old rows to local cold storage, then delete them.
+
+`archive_events(cutoff, dest)` walks the PaymentEvent rows received before
+`cutoff` in keyset order on (received_at, id), one chunk at a time:
+
+1. the chunk, payloads included, is written to one new file per received
+   date, `<dest>/dt=YYYY-MM-DD/part-<run>-<seq>.jsonl.gz` (gzip JSONL), or
+   `.parquet` with pyarrow installed; each file is fsync'ed and renamed into
+   place, so a partition never holds a half-written file,
+2. the chunk's Stripe event ids go into `archived_event_ids`, so a
+   re-delivery of an archived event is still a duplicate,
+3. the rows are deleted by id, and the chunk is committed.
+
+Every chunk is its own short transaction, so no lock is held for longer than
+one bounded batch, and an interrupted run simply continues where it stopped.
+Export is at-least-once: a crash between writing a file and committing the
+delete exports those rows again on the next run (dedupe by stripe_event_id
+when reading). PENDING events are never archived.
+"""
+
+import gzip
+import os
+import re
+import uuid
+from collections import namedtuple
+from datetime import timedelta
+from sqlalchemy import and_, delete, func, or_, select
+from ..dbutil import dialect_insert
+from ..extensions import db
+from ..models import ArchivedEvent, EventStatus, PaymentEvent
+from ..payloads import decode_payload, dumps_compact, loads
+
+try:  # optional dependency
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:  # pragma: no cover - depends on environment
+    pyarrow = parquet = None
+
+FORMATS = ("auto", "jsonl", "parquet")
+
+ArchivedChunk = namedtuple("ArchivedChunk", "rows files bytes")
+
+_AGE = re.compile(r"^\s*(\d+)\s*([smhdw])\s*$")
+_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+_COLUMNS = (
+    "id", "stripe_event_id", "type", "received_at", "processed_at", "status", "attempts",
+    "last_error", "payment_id", "payment_intent_id",
+)
+
+
+def parse_age(value):
+    """Parse an age like "90d" into a timedelta (units s, m, h, d, w)."""
+    match = _AGE.match(value or "")
+    if not match:
+        raise ValueError(f"invalid age {value!r} (expected e.g. 90d, 12h, 2w)")
+    return timedelta(**{_UNITS[match.group(2)]: int(match.group(1))})
+
+
+def resolve_format(fmt):
+    if fmt == "auto":
+        return "parquet" if pyarrow is not None else "jsonl"
+    if fmt == "parquet" and pyarrow is None:
+        raise RuntimeError("--format parquet needs the `pyarrow` package")
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown archive format {fmt!r}")
+    return fmt
+
+
+def archivable(cutoff):
+    """WHERE clause for rows `archive_events` would move."""
+    table = PaymentEvent.__table__
+    return and_(table.c.received_at < cutoff, table.c.status != EventStatus.PENDING)
+
+
+def count_archivable(cutoff):
+    return db.session.execute(select(func.count()).select_from(PaymentEvent.__table__).where(archivable(cutoff))).scalar()
+
+
+def archive_events(cutoff, dest, fmt="auto", chunk_size=1000):
+    """Move events received before `cutoff` into `dest`; yields an ArchivedChunk per committed chunk."""
+    fmt = resolve_format(fmt)
+    table = PaymentEvent.__table__
+    columns = [table.c[c] for c in _COLUMNS] + [table.c.payload_data, table.c.payload]
+    run = uuid.uuid4().hex[:12]
+    seq = 0
+    last = None
+    while True:
+        q = select(*columns).where(archivable(cutoff)).order_by(table.c.received_at, table.c.id).limit(chunk_size)
+        if last is not None:
+            q = q.where(or_(table.c.received_at > last[0], and_(table.c.received_at == last[0], table.c.id > last[1])))
+        rows = db.session.execute(q).all()
+        if not rows:
+            return
+        last = (rows[-1].received_at, rows[-1].id)
+
+        by_date = {}
+        for row in rows:
+            by_date.setdefault(row.received_at.date(), []).append(row)
+        written = 0
+        for day, day_rows in sorted(by_date.items()):
+            seq += 1
+            directory = os.path.join(dest, f"dt={day.isoformat()}")
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"part-{run}-{seq:05d}.{'parquet' if fmt == 'parquet' else 'jsonl.gz'}")
+            records = [_record(row) for row in day_rows]
+            (_write_parquet if fmt == "parquet" else _write_jsonl)(path, records)
+            written += os.path.getsize(path)
+
+        db.session.execute(
+            dialect_insert(ArchivedEvent.__table__)
+            .values([{"stripe_event_id": r.stripe_event_id, "received_at": r.received_at} for r in rows])
+            .on_conflict_do_nothing(index_elements=[ArchivedEvent.__table__.c.stripe_event_id])
+        )
+        db.session.execute(delete(table).where(table.c.id.in_([r.id for r in rows])))
+        db.session.commit()
+        yield ArchivedChunk(len(rows), len(by_date), written)
+
+
+def _record(row):
+    record = {c: getattr(row, c) for c in _COLUMNS}
+    record["status"] = row.status.value if row.status is not None else None
+    for key in ("received_at", "processed_at"):
+        record[key] = record[key].isoformat() if record[key] is not None else None
+    text = decode_payload(row.payload_data) if row.payload_data is not None else row.payload
+    record["payload"] = text
+    return record
+
+
+def _write_jsonl(path, records):
+    def lines():
+        for record in records:
+            try:  # embed the event as JSON rather than as a string when it parses
+                record = {**record, "payload": loads(record["payload"]) if record["payload"] else None}
+            except ValueError:  # legacy rows cut mid-JSON: keep the text
+                pass
+            yield dumps_compact(record) + b"\n"
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0) as out:
+            for line in lines():
+                out.write(line)
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, path)
+
+
+def _write_parquet(path, records):
+    # Same fields as the JSONL files: timestamps as ISO text, the payload as JSON text
+    table = pyarrow.Table.from_pylist(records, schema=pyarrow.schema([
+        ("id", pyarrow.string()),
+        ("stripe_event_id", pyarrow.string()),
+        ("type", pyarrow.string()),
+        ("received_at", pyarrow.string()),
+        ("processed_at", pyarrow.string()),
+        ("status", pyarrow.string()),
+        ("attempts", pyarrow.int32()),
+        ("last_error", pyarrow.string()),
+        ("payment_id", pyarrow.string()),
+        ("payment_intent_id", pyarrow.string()),
+        ("payload", pyarrow.string()),
+    ]))
+    tmp = path + ".tmp"
+    parquet.write_table(table, tmp, compression="zstd")
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
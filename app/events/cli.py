@@ -0,0 +1,44 @@
+# app/events/cli.py
+"""`flask events ...` commands.
+
+Payment events have no HTTP routes, so these hang off a plain AppGroup
+that create_app registers, rather than a blueprint.
+"""
+
+import time
+from datetime import datetime
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from .archive import FORMATS, archive_events, count_archivable, parse_age, resolve_format
+
+events_cli = AppGroup("events", help="Payment event retention.")
+
+
+@events_cli.command("archive")
+@click.option("--older-than", default="90d", show_default=True, help="Age cutoff on received_at, e.g. 90d, 12h, 2w.")
+@click.option("--dest", default=None, help="Archive directory (default: EVENT_ARCHIVE_DIR).")
+@click.option("--format", "fmt", type=click.Choice(FORMATS), default="auto", show_default=True,
+              help="auto = parquet when pyarrow is installed, else gzip JSONL.")
+@click.option("--chunk-size", type=int, default=1000, show_default=True, help="Rows exported and deleted per transaction.")
+@click.option("--dry-run", is_flag=True, help="Only count what would be archived.")
+def archive_command(older_than, dest, fmt, chunk_size, dry_run):
+    """Export old payment_events to date-partitioned files and delete them (resumable)."""
+    try:
+        cutoff = datetime.utcnow() - parse_age(older_than)
+        fmt = resolve_format(fmt)
+    except (ValueError, RuntimeError) as e:
+        raise click.UsageError(str(e))
+    if dry_run:
+        click.echo(f"{count_archivable(cutoff)} event(s) received before {cutoff:%Y-%m-%d %H:%M} would be archived")
+        return
+
+    dest = dest or current_app.config.get("EVENT_ARCHIVE_DIR", "archive/events")
+    started = time.perf_counter()
+    rows = files = size = 0
+    for chunk in archive_events(cutoff, dest, fmt=fmt, chunk_size=chunk_size):
+        rows, files, size = rows + chunk.rows, files + chunk.files, size + chunk.bytes
+        click.echo(f"archived {rows} event(s) so far")
+    elapsed = time.perf_counter() - started
+    click.echo(f"archived {rows} event(s) received before {cutoff:%Y-%m-%d %H:%M} "
+               f"into {files} {fmt} file(s) under {dest} ({size} bytes) in {elapsed:.2f}s")
@@ -1,16 +1,34 @@
-import logging
+import click
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 
 db = SQLAlchemy()
-migrate = Migrate()
-
-def configure_logging(app):
-    # Simple JSON-ish structured logs
-    handler = logging.StreamHandler()
-    formatter = logging.Formatter(
-        '{"level": "%(levelname)s", "msg": "%(message)s", "name": "%(name)s"}'
-    )
-    handler.setFormatter(formatter)
-    app.logger.setLevel(logging.INFO)
-    app.logger.addHandler(handler)
+
+
+class LazyMigrateGroup(click.Group):
+    """`flask db ...` that imports Flask-Migrate (and Alembic) only when a `db` command runs.
+
+    Alembic is a sizeable share of the app's import time, and nothing but
+    migrations needs it.
+    """
+
+    def __init__(self, app, db):
+        super().__init__("db", help="Perform database migrations.")
+        self._app = app
+        self._db = db
+
+    def _load(self):
+        from flask_migrate import Migrate
+
+        if "migrate" not in self._app.extensions:
+            Migrate(self._app, self._db)    # registers the real `db` group in our place
+        return self._app.cli.commands["db"]
+
+    def list_commands(self, ctx):
+        return self._load().list_commands(ctx)
+
+    def get_command(self, ctx, name):
+        return self._load().get_command(ctx, name)
+
+
+def init_migrate(app, db):
+    app.cli.add_command(LazyMigrateGroup(app, db))
@@ -0,0 +1,241 @@
+# app/logs.py
+"""Structured JSON logging for the app logger.
+
+- `JsonFormatter` writes one JSON object per line: ts, level, logger, msg,
+  the request's context fields, any `extra={...}` fields, and `exc` for
+  tracebacks. Values are encoded by a JSON library, so quotes and newlines in
+  messages (exception text, payload fragments) cannot break a line.
+- Per-request context lives in a ContextVar, reset at the start of every
+  request (method, path, request_id). `bind(event_id=..., ...)` adds fields
+  while handling it. Every record logged during the request carries them,
+  and a summary line (`request`, with status and latency_ms) ends it.
+- With `LOG_ASYNC` (the default), the logger's only handler is a
+  QueueHandler. Records are finished on the request thread: the message is
+  formatted and the context captured. They are then queued for a
+  QueueListener thread, which encodes and writes them. When the queue is full
+  (`LOG_QUEUE_SIZE`), records are dropped and counted, so a slow stderr never
+  blocks a request. The listener is restarted in each forked worker and
+  drained at exit.
+- `LOG_SAMPLE_RATE` keeps that fraction of INFO-and-below records. The
+  decision is made once per request, so a request's lines are kept or dropped
+  together. Warnings and errors are always kept, and sampled records carry
+  `sample_rate` so counts can be scaled back up.
+
+Log with %-style arguments (`logger.info("... %s", x)`), not f-strings, so
+nothing is formatted for a disabled level.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, request
+from flask.logging import default_handler
+from .payloads import dumps_compact
+
+_context = ContextVar("log_context", default=None)
+
+# LogRecord attributes that are not `extra=` fields
+_RESERVED = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "ctx"}
+_QUIET_PATHS = ("/healthz", "/metrics")   # no request summary line
+
+
+def new_context(**fields):
+    """Start a fresh log context (a request, a worker's event), replacing any earlier one."""
+    _context.set(fields)
+
+
+def clear_context():
+    _context.set(None)
+
+
+def bind(**fields):
+    """Add fields to the current request's log context (no-op outside one)."""
+    ctx = _context.get()
+    if ctx is not None:
+        ctx.update(fields)
+
+
+class ContextFilter(logging.Filter):
+    """Runs in the thread that logs: attaches its context and applies sampling."""
+
+    def __init__(self, sample_rate=1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        ctx = _context.get()
+        record.ctx = dict(ctx) if ctx else None
+        if record.levelno > logging.INFO or self.sample_rate >= 1.0:
+            return True
+        keep = ctx.get("sampled") if ctx else None
+        if keep is None:
+            keep = random.random() < self.sample_rate
+        record.sample_rate = self.sample_rate
+        return keep
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        out = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        ctx = getattr(record, "ctx", None)
+        if ctx:
+            out.update((k, v) for k, v in ctx.items() if k != "sampled")
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                out[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            out["exc"] = record.exc_text
+        try:
+            return dumps_compact(out).decode("utf-8")
+        except TypeError:   # a non-JSON value in extra=; stringify what we can't encode
+            return dumps_compact({k: v if isinstance(v, (str, int, float, bool, type(None))) else str(v)
+                                  for k, v in out.items()}).decode("utf-8")
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking once `maxsize` are queued.
+
+    Uses a SimpleQueue (lock-free put, in C); the bound is checked with
+    qsize(), so it may be overshot by a record or two under contention.
+    """
+
+    def __init__(self, maxsize):
+        super().__init__(queue.SimpleQueue())
+        self.maxsize = maxsize
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Finish the record in place, while args and exc_info are still
+        # valid; the listener thread only encodes it. (Other handlers see the
+        # same message, and exc_text still carries the traceback.)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.queue.qsize() >= self.maxsize:
+            self.dropped += 1
+        else:
+            self.queue.put_nowait(record)
+
+
+class AsyncLogging:
+    """A DroppingQueueHandler and the QueueListener draining it into `target`."""
+
+    def __init__(self, target, maxsize):
+        self.target = target
+        self.handler = DroppingQueueHandler(maxsize)
+        self.listener = None
+        self.start()
+
+    def start(self):
+        self.listener = QueueListener(self.handler.queue, self.target, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()    # writes out what is queued
+            self.listener = None
+
+    def after_fork(self):
+        # The parent's listener thread does not exist here, and its queue
+        # lock may have been held at fork time: start over.
+        self.handler.queue = queue.SimpleQueue()
+        self.listener = None
+        self.start()
+
+    def stats(self):
+        return {"queued": self.handler.queue.qsize(), "dropped": self.handler.dropped}
+
+
+_async = None   # the process's AsyncLogging, if any
+
+
+def _after_fork():
+    if _async is not None:
+        _async.after_fork()
+
+
+def _at_exit():
+    if _async is not None:
+        _async.stop()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+atexit.register(_at_exit)
+
+
+def configure_logging(app, stream=None):
+    """Install the JSON handler on app.logger (replacing any earlier one) and the request hooks."""
+    global _async
+    config = app.config
+    target = logging.StreamHandler(stream or sys.stderr)
+    target.setFormatter(JsonFormatter())
+
+    if _async is not None:
+        _async.stop()
+        _async = None
+    if config.get("LOG_ASYNC", True):
+        _async = AsyncLogging(target, config.get("LOG_QUEUE_SIZE", 10000))
+        handler = _async.handler
+    else:
+        handler = target
+    handler.addFilter(ContextFilter(config.get("LOG_SAMPLE_RATE", 1.0)))
+
+    logger = app.logger
+    logger.removeHandler(default_handler)
+    for old in [h for h in logger.handlers if getattr(h, "_app_json_handler", False)]:
+        logger.removeHandler(old)    # from an earlier create_app in this process
+    handler._app_json_handler = True
+    logger.addHandler(handler)
+    logger.setLevel(config.get("LOG_LEVEL", "INFO"))
+    app.extensions["logging"] = _async
+
+    if app.config.get("APP_MODE") != "cli" and not app.extensions.get("log_request_hooks"):
+        _install_request_context(app)
+        app.extensions["log_request_hooks"] = True
+
+
+def _install_request_context(app):
+    request_logger = app.logger.getChild("request")
+
+    @app.before_request
+    def _start_log_context():
+        g._log_started = time.perf_counter()
+        sample_rate = app.config.get("LOG_SAMPLE_RATE", 1.0)
+        new_context(
+            request_id=request.headers.get("X-Request-Id") or uuid.uuid4().hex[:16],
+            method=request.method,
+            path=request.path,
+            sampled=True if sample_rate >= 1.0 else random.random() < sample_rate,
+        )
+
+    @app.after_request
+    def _log_request(response):
+        started = g.pop("_log_started", None)
+        if started is not None and request.path not in _QUIET_PATHS and request_logger.isEnabledFor(logging.INFO):
+            latency_ms = round((time.perf_counter() - started) * 1000, 3)
+            request_logger.info("request", extra={"status": response.status_code, "latency_ms": latency_ms})
+        return response
+
+    @app.teardown_request
+    def _clear_log_context(exc):
+        clear_context()
@@ -0,0 +1,175 @@
+# app/metrics.py
+"""In-process metrics for the webhook hot path, exposed as Prometheus text.
+
+Kept deliberately small (no client library): counters and fixed-bucket
+histograms whose label sets are created once and then only incremented, so
+instrumentation costs a dict lookup and a couple of additions per
+observation. What is collected:
+
+- `webhook_stage_seconds{stage}`: time spent in each stage of handling an
+  event (verify, normalize, payment, refund, pi_lookup, order, encode, record, commit),
+- `webhook_events_total{type,outcome}`: outcome per event type
+  (processed, duplicate, unhandled, ignored, queued, invalid_signature, shed),
+- `http_request_seconds{endpoint}`, and per request the SQL statement count
+  and DB time (`db_statements_per_request`, `db_seconds_per_request`),
+  from SQLAlchemy cursor-execute hooks,
+- the PaymentIntent cache's counters.
+
+`GET /metrics` renders everything (see create_app).
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from flask import current_app, request
+from sqlalchemy import event as sa_event
+
+STAGES = ("verify", "normalize", "payment", "refund", "pi_lookup", "order", "encode", "record", "commit")
+OUTCOMES = ("processed", "duplicate", "unhandled", "ignored", "queued", "invalid_signature", "shed")
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 12, 20, 50)
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stages = {s: Histogram(LATENCY_BUCKETS) for s in STAGES}
+        self.requests = {}          # endpoint -> Histogram
+        self.events = {}            # (type, outcome) -> count
+        self.db_statements = Histogram(COUNT_BUCKETS)
+        self.db_seconds = Histogram(LATENCY_BUCKETS)
+        self.db_statements_total = 0
+        self.db_seconds_total = 0.0
+
+    def init_app(self, app, db, instrument=True):
+        """Register on `app`; `instrument=False` skips the request and SQL hooks."""
+        app.extensions["metrics"] = self
+        if not instrument:
+            return self
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+        with app.app_context():
+            engines = list(db.engines.values())
+        for engine in engines:
+            sa_event.listen(engine, "before_cursor_execute", self._before_execute)
+            sa_event.listen(engine, "after_cursor_execute", self._after_execute)
+        return self
+
+    # --- recording ---------------------------------------------------------
+
+    def stage(self, name, started):
+        """Record the stage that began at `started` (perf_counter); returns now."""
+        now = time.perf_counter()
+        with self._lock:
+            self.stages[name].observe(now - started)
+        return now
+
+    def event(self, evt_type, outcome):
+        key = (evt_type or "", outcome)
+        with self._lock:
+            self.events[key] = self.events.get(key, 0) + 1
+
+    def request_db_time(self):
+        """(statements, seconds) of SQL run so far by the current request."""
+        local = self._local
+        return getattr(local, "statements", 0), getattr(local, "db_seconds", 0.0)
+
+    def _before_request(self):
+        local = self._local
+        local.request_started = time.perf_counter()
+        local.statements = 0
+        local.db_seconds = 0.0
+
+    def _teardown_request(self, exc=None):
+        local = self._local
+        started = getattr(local, "request_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        local.request_started = None
+        endpoint = request.endpoint or "unmatched"
+        with self._lock:
+            hist = self.requests.get(endpoint)
+            if hist is None:
+                hist = self.requests[endpoint] = Histogram(LATENCY_BUCKETS)
+            hist.observe(elapsed)
+            self.db_statements.observe(local.statements)
+            self.db_seconds.observe(local.db_seconds)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self._local.statement_started = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        local = self._local
+        elapsed = time.perf_counter() - local.statement_started
+        if getattr(local, "request_started", None) is not None:
+            local.statements += 1
+            local.db_seconds += elapsed
+        with self._lock:
+            self.db_statements_total += 1
+            self.db_seconds_total += elapsed
+
+    # --- exposition --------------------------------------------------------
+
+    def render(self, extra=None):
+        """Prometheus text format (0.0.4). `extra`: {name: value} gauges to append."""
+        out = []
+        with self._lock:
+            out.append("# TYPE webhook_stage_seconds histogram")
+            for stage, hist in self.stages.items():
+                _histogram(out, "webhook_stage_seconds", f'stage="{stage}"', hist)
+            out.append("# TYPE webhook_events_total counter")
+            for (evt_type, outcome), n in sorted(self.events.items()):
+                out.append(f'webhook_events_total{{type="{_escape(evt_type)}",outcome="{outcome}"}} {n}')
+            out.append("# TYPE http_request_seconds histogram")
+            for endpoint, hist in sorted(self.requests.items()):
+                _histogram(out, "http_request_seconds", f'endpoint="{_escape(endpoint)}"', hist)
+            out.append("# TYPE db_statements_per_request histogram")
+            _histogram(out, "db_statements_per_request", "", self.db_statements)
+            out.append("# TYPE db_seconds_per_request histogram")
+            _histogram(out, "db_seconds_per_request", "", self.db_seconds)
+            out.append("# TYPE db_statements_total counter")
+            out.append(f"db_statements_total {self.db_statements_total}")
+            out.append("# TYPE db_seconds_total counter")
+            out.append(f"db_seconds_total {self.db_seconds_total:.6f}")
+        for name, value in (extra or {}).items():
+            out.append(f"# TYPE {name} gauge")
+            out.append(f"{name} {value}")
+        return "\n".join(out) + "\n"
+
+
+def _histogram(out, name, labels, hist):
+    sep = "," if labels else ""
+    cumulative = 0
+    for bound, n in zip(hist.buckets, hist.counts):
+        cumulative += n
+        out.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+    out.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {hist.count}')
+    suffix = f"{{{labels}}}" if labels else ""
+    out.append(f"{name}_sum{suffix} {hist.sum:.6f}")
+    out.append(f"{name}_count{suffix} {hist.count}")
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def get_metrics():
+    return current_app.extensions["metrics"]
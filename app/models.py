@@ -1,10 +1,11 @@
 import enum
 from datetime import datetime
 from sqlalchemy import (
-    Column, String, Integer, Enum, DateTime, ForeignKey, UniqueConstraint, Text
+    Column, String, Integer, BigInteger, Enum, DateTime, ForeignKey, UniqueConstraint, Text, Index, LargeBinary, text
 )
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.orm import declarative_base, relationship, deferred
 from .extensions import db
+from .payloads import decode_payload, encode_payload, loads
 
 # Using Flask-SQLAlchemy's declarative base
 Base = db.Model
@@ -26,6 +27,11 @@ class PaymentStatus(str, enum.Enum):
     CANCELED = "CANCELED"
     REQUIRES_ACTION = "REQUIRES_ACTION"
 
+class EventStatus(str, enum.Enum):
+    PENDING = "PENDING"        # recorded by the webhook, waiting for the worker
+    PROCESSED = "PROCESSED"    # applied to Payment/Order
+    FAILED = "FAILED"          # gave up after WEBHOOK_WORKER_MAX_ATTEMPTS
+
 class Order(Base):
     __tablename__ = "orders"
 
@@ -34,9 +40,20 @@ class Order(Base):
     currency = Column(String(3), nullable=False)
     amount_due = Column(Integer, nullable=False)
     status = Column(Enum(OrderStatus), nullable=False, default=OrderStatus.DRAFT)
+    # Materialized totals, maintained incrementally (app/orders/totals.py)
+    amount_paid = Column(Integer, nullable=False, default=0)
+    amount_refunded = Column(Integer, nullable=False, default=0)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
-    payments = relationship("Payment", back_populates="order", lazy="selectin")
+    # Relationships are lazy by default; queries pick what to load with the
+    # profiles in app/query_profiles.py.
+    payments = relationship("Payment", back_populates="order", lazy="select")
+
+    __table_args__ = (
+        # Keyset pagination of the reporting API (app/orders/reporting.py)
+        Index("ix_orders_created_at_id", "created_at", "id"),
+        Index("ix_orders_status_created_at_id", "status", "created_at", "id"),
+    )
 
 class Payment(Base):
     __tablename__ = "payments"
@@ -55,21 +72,83 @@ class Payment(Base):
     card_last4 = Column(String(4), nullable=True)
     card_exp_month = Column(Integer, nullable=True)
     card_exp_year = Column(Integer, nullable=True)
+    # What the last applied event added to the order's amount_paid; written
+    # and read back by the upsert in app/webhooks/processing.py.
+    paid_delta = Column(Integer, nullable=False, default=0)
+    # Refunded/disputed amount currently counted against this payment
+    # (sum of its Refund rows' counted_amount, maintained incrementally)
+    amount_refunded = Column(Integer, nullable=False, default=0)
+    # amount_refunded carried over to the order by the last upsert (non-zero
+    # only when that upsert linked the payment to its order)
+    refunded_delta = Column(Integer, nullable=False, default=0)
+    # Stripe `created` (unix seconds) of the newest event applied to this row;
+    # older events are dropped by the upsert's WHERE (see processing.py).
+    last_event_created = Column(BigInteger, nullable=True)
 
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
+    __table_args__ = (
+        # Payments of an order (joins, reporting, status filters)
+        Index("ix_payments_order_id_status", "order_id", "status"),
+        # Keyset pagination of the reporting API
+        Index("ix_payments_created_at_id", "created_at", "id"),
+        # Paid totals per order: only SUCCEEDED rows, amount carried in the index
+        Index(
+            "ix_payments_order_id_succeeded",
+            "order_id",
+            postgresql_include=["amount_received"],
+            postgresql_where=text("status = 'SUCCEEDED'"),
+            sqlite_where=text("status = 'SUCCEEDED'"),
+        ),
+    )
+
     order = relationship(
         "Order", 
         back_populates="payments", 
-        lazy="joined"
+        lazy="select"
     )
     events = relationship(
         "PaymentEvent",
         back_populates="payment",
-        lazy="selectin",   # load related events efficiently
+        lazy="select",
         cascade="all, delete-orphan"  # if payment is deleted, events go too
     )
+    refunds = relationship("Refund", back_populates="payment", lazy="select")
+
+
+class RefundKind(str, enum.Enum):
+    REFUND = "REFUND"
+    DISPUTE = "DISPUTE"
+
+
+class Refund(Base):
+    """A Stripe refund (re_...) or dispute (dp_...) against a Payment, keyed by its Stripe id."""
+    __tablename__ = "refunds"
+
+    id = Column(String, primary_key=True)
+    stripe_refund_id = Column(String, unique=True, nullable=False)
+    kind = Column(Enum(RefundKind), nullable=False, default=RefundKind.REFUND)
+    payment_id = Column(String, ForeignKey("payments.id"), nullable=False)
+    stripe_charge_id = Column(String, nullable=True)
+    amount = Column(Integer, nullable=False)
+    currency = Column(String(3), nullable=True)
+    status = Column(String, nullable=False)   # Stripe's refund/dispute status, as sent
+    reason = Column(String, nullable=True)
+    # What this refund takes off the payment right now (amount, or 0 once it
+    # failed/was canceled/the dispute was won), and how much the last event
+    # changed that; both written by the upsert in app/webhooks/processing.py.
+    counted_amount = Column(Integer, nullable=False, default=0)
+    counted_delta = Column(Integer, nullable=False, default=0)
+    last_event_created = Column(BigInteger, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_refunds_payment_id", "payment_id"),
+    )
+
+    payment = relationship("Payment", back_populates="refunds")
 
 
 class PaymentEvent(Base):
@@ -78,10 +157,62 @@ class PaymentEvent(Base):
     id = Column(String, primary_key=True)
     stripe_event_id = Column(String, unique=True, nullable=False)
     type = Column(String, nullable=False)
-    payload = Column(Text, nullable=True)  # JSON string for cross-DB compatibility
+    # Payload bytes are deferred: listing events never loads them. Use
+    # set_payload()/payload_json rather than the columns directly.
+    payload = deferred(Column(Text, nullable=True))  # legacy plain-JSON rows (see app/payloads.py)
+    payload_data = deferred(Column(LargeBinary, nullable=True))  # marker byte + (compressed) JSON
     received_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     payment_id = Column(String, ForeignKey("payments.id"), nullable=True)
+
+    # Async ingestion state (see app/webhooks/worker.py)
+    payment_intent_id = Column(String, nullable=True)  # ordering key for the worker
+    status = Column(Enum(EventStatus), nullable=False, default=EventStatus.PROCESSED)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    processed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_payment_events_status_received_at", "status", "received_at"),
+        Index("ix_payment_events_payment_id_received_at", "payment_id", "received_at"),
+        Index("ix_payment_events_received_at", "received_at"),
+    )
+
     payment = relationship(
         "Payment", 
         back_populates="events"
-        )
\ No newline at end of file
+        )
+
+    def set_payload(self, event):
+        """Store `event` (dict or raw JSON) in the compact, compressed format."""
+        self.payload_data = encode_payload(event)
+        self.payload = None
+        self.__dict__.pop("_payload_json", None)
+
+    @property
+    def payload_text(self):
+        if self.payload_data is not None:
+            return decode_payload(self.payload_data)
+        return self.payload
+
+    @property
+    def payload_json(self):
+        """The stored event as a dict, decoded on first access (None if unparseable)."""
+        if "_payload_json" not in self.__dict__:
+            text = self.payload_text
+            try:
+                value = loads(text) if text else None
+            except ValueError:  # legacy rows were cut at 1 MB mid-JSON
+                value = None
+            self.__dict__["_payload_json"] = value
+        return self.__dict__["_payload_json"]
+
+class ArchivedEvent(Base):
+    """Stripe event id of a PaymentEvent moved out by `flask events archive`.
+
+    Kept so a re-delivery of an archived event is still a duplicate.
+    """
+    __tablename__ = "archived_event_ids"
+
+    stripe_event_id = Column(String, primary_key=True)
+    received_at = Column(DateTime, nullable=False)
@@ -0,0 +1,126 @@
+# app/orders/cli.py
+"""`flask orders ...` and `flask payments ...` commands."""
+
+import os
+import sys
+import time
+import click
+from ..webhooks.reconcile import FORMATS as EXPORT_FORMATS, ExportError, ReconcileStats, reconcile_export
+from .ingest import FORMATS, format_for, import_orders, read_records
+from .routes import orders_bp, payments_bp
+from .totals import reconcile_order_totals
+
+
+@orders_bp.cli.command("reconcile")
+@click.option("--repair", is_flag=True, help="Rewrite drifted totals/statuses.")
+@click.option("--chunk-size", type=int, default=1000, show_default=True)
+@click.option("--show", type=int, default=20, show_default=True, help="Drifted orders to print.")
+def reconcile_command(repair, chunk_size, show):
+    """Verify Order.amount_paid/amount_refunded/status against a full recompute from payments.
+
+    Exits 1 if drift was found and --repair was not given.
+    """
+    drifted = 0
+    for d in reconcile_order_totals(repair=repair, chunk_size=chunk_size):
+        drifted += 1
+        if drifted <= show:
+            refunded = (
+                f"amount_refunded {d.amount_refunded} -> {d.expected_refunded}, "
+                if d.amount_refunded != d.expected_refunded else ""
+            )
+            click.echo(
+                f"order {d.order_id}: amount_paid {d.amount_paid} -> {d.expected_paid}, {refunded}"
+                f"status {d.status.value} -> {d.expected_status.value}"
+            )
+    verb = "repaired" if repair else "found"
+    click.echo(f"{verb} {drifted} drifted order(s)")
+    if drifted and not repair:
+        sys.exit(1)
+
+
+@orders_bp.cli.command("import")
+@click.argument("source", type=click.File("r", encoding="utf-8"))
+@click.option("--format", "fmt", type=click.Choice(FORMATS), default=None,
+              help="Input format (default: from the file extension).")
+@click.option("--chunk-size", type=int, default=5000, show_default=True, help="Rows validated and inserted per transaction.")
+def import_command(source, fmt, chunk_size):
+    """Create orders from an NDJSON or CSV file ('-' for stdin), streamed in chunks.
+
+    Fields: id, currency, amount_due (minor units), and optionally
+    external_ref, status (DRAFT/AWAITING_PAYMENT) and created_at. Ids that
+    already exist are skipped, so an interrupted import can simply be re-run.
+    """
+    fmt = fmt or format_for(filename=source.name)
+    if fmt is None:
+        raise click.UsageError("cannot tell the format from the file name; pass --format")
+
+    last_report = time.perf_counter()
+
+    def progress(stats):
+        nonlocal last_report
+        if time.perf_counter() - last_report >= 5:
+            last_report = time.perf_counter()
+            click.echo(f"imported {stats.received} row(s) so far ({stats.rows_per_sec:.0f} rows/sec)")
+
+    stats = import_orders(read_records(source, fmt), chunk_size=chunk_size, progress=progress)
+    for line, message in stats.errors:
+        click.echo(f"line {line}: {message}", err=True)
+    click.echo(
+        f"imported {stats.received} row(s): inserted={stats.inserted} duplicates={stats.duplicates} "
+        f"invalid={stats.invalid} in {stats.elapsed:.2f}s ({stats.rows_per_sec:.0f} rows/sec)"
+    )
+    if stats.invalid:
+        sys.exit(1)
+
+
+@payments_bp.cli.command("reconcile")
+@click.argument("export", type=click.File("r", encoding="utf-8"))
+@click.option("--format", "fmt", type=click.Choice(EXPORT_FORMATS), default=None,
+              help="Export format (default: from the file extension).")
+@click.option("--as-of", type=int, default=None,
+              help="When the export was taken, unix seconds (default: the file's mtime, or now for stdin).")
+@click.option("--repair", is_flag=True, help="Apply synthesized events for missing/mismatched payments.")
+@click.option("--presorted", is_flag=True, help="The export is already ordered by PaymentIntent id; skip sorting.")
+@click.option("--run-size", type=int, default=100_000, show_default=True, help="Export rows sorted in memory per spilled run.")
+@click.option("--chunk-size", type=int, default=1000, show_default=True, help="Payments read per keyset query.")
+@click.option("--show", type=int, default=20, show_default=True, help="Discrepancies to print.")
+def reconcile_payments_command(export, fmt, as_of, repair, presorted, run_size, chunk_size, show):
+    """Compare payments with a Stripe export (CSV or JSONL, '-' for stdin) to find missed webhooks.
+
+    Reports PaymentIntents missing locally and ones whose amount or status
+    differs. Exits 1 if any were found and --repair was not given, or if
+    some can't be repaired (the local amount is higher than the export's).
+    """
+    name = export.name or ""
+    fmt = fmt or ("csv" if name.lower().endswith(".csv") else "jsonl" if name.lower().endswith((".jsonl", ".json")) else None)
+    if fmt is None:
+        raise click.UsageError("cannot tell the format from the file name; pass --format")
+    if as_of is None and name != "<stdin>" and os.path.exists(name):
+        as_of = int(os.path.getmtime(name))
+
+    stats, shown = ReconcileStats(), 0
+    try:
+        for d in reconcile_export(export, fmt, as_of=as_of, repair=repair, presorted=presorted,
+                                  run_size=run_size, chunk_size=chunk_size, stats=stats):
+            shown += 1
+            if shown > show:
+                continue
+            exported = f"{d.export[0]} {d.export[1].value}"
+            if d.kind == "missing":
+                click.echo(f"{d.payment_intent_id}: missing (export: {exported})")
+            else:
+                note = "" if d.repairable else "; not repairable, check it in Stripe"
+                click.echo(f"{d.payment_intent_id}: {d.kind} differs: {d.local[0]} {d.local[1].value} (export: {exported}){note}")
+    except ExportError as e:
+        raise click.ClickException(str(e))
+
+    click.echo(
+        f"compared {stats.export_rows} export row(s) with {stats.local_rows} payment(s): matched={stats.matched} "
+        f"missing={stats.missing} amount_mismatch={stats.amount_mismatch} status_mismatch={stats.status_mismatch} "
+        f"local_only={stats.local_only} unrepairable={stats.unrepairable} in {stats.elapsed:.2f}s ({stats.rows_per_sec:.0f} rows/sec)"
+    )
+    if stats.repair is not None:
+        r = stats.repair
+        click.echo(f"repair: recorded={r.recorded} duplicates={r.duplicates} stale={r.stale} payments={r.payments} orders={r.orders}")
+    if stats.unrepairable or (stats.discrepancies and not repair):
+        sys.exit(1)
@@ -0,0 +1,209 @@
+# app/orders/ingest.py
+"""Order creation: validation, and bulk import from NDJSON/CSV streams.
+
+`import_orders(read_records(lines, fmt))` takes the lines of a file being
+read or of a request body being streamed, and works through them
+`chunk_size` records at a time, so memory stays flat however large the input
+is:
+
+1. each record is validated (`validate_order`); bad ones are counted and
+   reported with their line number, the rest of the chunk goes ahead,
+2. the chunk is written with one executemany of
+   `INSERT ... ON CONFLICT (id) DO NOTHING RETURNING id` (SQLAlchemy sends it
+   as multi-row VALUES batches), so ids that already exist are skipped,
+3. the chunk is committed.
+
+Re-running an import is therefore safe: rows already inserted count as
+duplicates. Orders start AWAITING_PAYMENT with nothing paid; if payments for
+an order arrived before the order did, run `flask orders reconcile --repair`
+after the import.
+"""
+
+import csv
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from itertools import islice
+from ..dbutil import dialect_insert
+from ..extensions import db
+from ..models import Order, OrderStatus
+from ..payloads import loads
+
+FORMATS = ("ndjson", "csv")
+# Statuses an order may be created in; the rest are driven by its payments
+CREATE_STATUSES = (OrderStatus.DRAFT, OrderStatus.AWAITING_PAYMENT)
+MAX_AMOUNT = 99_999_999   # Stripe's limit for a charge, in minor units
+MAX_ERRORS = 20           # invalid records kept (with line numbers) for the report
+MAX_EXTERNAL_REF = 255
+
+_CURRENCY = re.compile(r"^[a-z]{3}$")
+_ID = re.compile(r"^[A-Za-z0-9_.:-]{1,64}$")
+
+
+class InvalidOrder(ValueError):
+    pass
+
+
+@dataclass
+class ImportStats:
+    received: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    elapsed: float = 0.0
+    errors: list = field(default_factory=list)   # (line, message), the first MAX_ERRORS
+
+    @property
+    def rows_per_sec(self):
+        return self.received / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "received": self.received, "inserted": self.inserted, "duplicates": self.duplicates,
+            "invalid": self.invalid, "elapsed": round(self.elapsed, 3), "rows_per_sec": round(self.rows_per_sec),
+            "errors": [{"line": line, "error": message} for line, message in self.errors],
+        }
+
+
+def validate_order(record, now=None):
+    """Row values for an `orders` INSERT from an input record; InvalidOrder if it isn't one.
+
+    Accepts `id`, `currency` (ISO code, any case), `amount_due` (integer minor
+    units; digit strings are fine, as CSV gives them) and optionally
+    `external_ref` (a string), `status` (DRAFT or AWAITING_PAYMENT) and
+    `created_at` (ISO).
+    """
+    if not isinstance(record, dict):
+        raise InvalidOrder("expected an object")
+    order_id = record.get("id")
+    if not isinstance(order_id, str) or not _ID.match(order_id):
+        raise InvalidOrder(f"invalid id {order_id!r}")
+
+    currency = record.get("currency")
+    if not isinstance(currency, str) or not _CURRENCY.match(currency.strip().lower()):
+        raise InvalidOrder(f"invalid currency {currency!r} (expected a 3-letter ISO code)")
+
+    amount = record.get("amount_due")
+    if isinstance(amount, str) and amount.strip().isascii() and amount.strip().isdecimal():
+        amount = int(amount)   # ASCII only: isdigit() also passes "²", which int() rejects
+    if isinstance(amount, bool) or not isinstance(amount, int) or not 0 < amount <= MAX_AMOUNT:
+        raise InvalidOrder(f"invalid amount_due {record.get('amount_due')!r} (expected an integer 1..{MAX_AMOUNT} in minor units)")
+
+    status = record.get("status") or OrderStatus.AWAITING_PAYMENT.value
+    try:
+        status = OrderStatus(str(status).upper())
+    except ValueError:
+        status = None
+    if status not in CREATE_STATUSES:
+        raise InvalidOrder(f"invalid status {record.get('status')!r} (expected one of {', '.join(s.value for s in CREATE_STATUSES)})")
+
+    external_ref = record.get("external_ref") or None
+    if external_ref is not None and (not isinstance(external_ref, str) or len(external_ref) > MAX_EXTERNAL_REF):
+        raise InvalidOrder(f"invalid external_ref {external_ref!r} (expected a string of at most {MAX_EXTERNAL_REF} characters)")
+
+    row = {
+        "id": order_id,
+        "external_ref": external_ref,
+        "currency": currency.strip().lower(),
+        "amount_due": amount,
+        "status": status,
+        "amount_paid": 0,
+        "amount_refunded": 0,
+    }
+    created = now or datetime.utcnow()
+    if record.get("created_at"):
+        try:
+            created = datetime.fromisoformat(str(record["created_at"]))
+        except ValueError:
+            raise InvalidOrder(f"invalid created_at {record['created_at']!r}")
+        if created.tzinfo is not None:
+            created = created.astimezone(timezone.utc).replace(tzinfo=None)
+    row["created_at"] = row["updated_at"] = created
+    return row
+
+
+def iter_ndjson(lines):
+    """(line number, record) per non-blank line; a line that isn't JSON becomes an InvalidOrder record."""
+    for lineno, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield lineno, loads(line)
+        except ValueError:
+            yield lineno, InvalidOrder("not valid JSON")
+
+
+def iter_csv(lines):
+    """(line number, record) per CSV row; the first line is the header."""
+    reader = csv.DictReader(lines)
+    for record in reader:
+        yield reader.line_num, record
+
+
+def read_records(lines, fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r} (expected one of {', '.join(FORMATS)})")
+    return iter_csv(lines) if fmt == "csv" else iter_ndjson(lines)
+
+
+def format_for(filename=None, mimetype=None):
+    """Input format from a file name or content type; None if neither says."""
+    if mimetype in ("text/csv", "application/csv"):
+        return "csv"
+    if mimetype in ("application/x-ndjson", "application/jsonl", "application/json"):
+        return "ndjson"
+    if filename:
+        name = filename.lower()
+        if name.endswith(".csv"):
+            return "csv"
+        if name.endswith((".ndjson", ".jsonl", ".json")):
+            return "ndjson"
+    return None
+
+
+def insert_orders(rows):
+    """Insert validated rows, skipping ids that already exist; the number inserted. Does not commit."""
+    if not rows:
+        return 0
+    stmt = dialect_insert(Order.__table__).on_conflict_do_nothing(index_elements=["id"]).returning(Order.id)
+    return len(db.session.execute(stmt, rows).all())
+
+
+def import_orders(records, chunk_size=5000, progress=None):
+    """Validate and insert (line, record) pairs chunk by chunk, committing each; returns ImportStats.
+
+    `progress(stats)` is called after every chunk.
+    """
+    stats = ImportStats()
+    started = time.perf_counter()
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+        rows, now = {}, datetime.utcnow()
+        for lineno, record in chunk:
+            try:
+                if isinstance(record, InvalidOrder):
+                    raise record
+                row = validate_order(record, now)
+            except InvalidOrder as e:
+                stats.invalid += 1
+                if len(stats.errors) < MAX_ERRORS:
+                    stats.errors.append((lineno, str(e)))
+                continue
+            if row["id"] in rows:
+                stats.duplicates += 1   # repeated within the chunk: first one wins
+                continue
+            rows[row["id"]] = row
+        inserted = insert_orders(list(rows.values()))
+        db.session.commit()
+        stats.received += len(chunk)
+        stats.inserted += inserted
+        stats.duplicates += len(rows) - inserted
+        stats.elapsed = time.perf_counter() - started
+        if progress is not None:
+            progress(stats)
+    stats.elapsed = time.perf_counter() - started
+    return stats
@@ -0,0 +1,123 @@
+# app/orders/reporting.py
+"""Read queries behind the reporting API (app/orders/routes.py).
+
+Lists are walked with keyset pagination on (created_at, id): each chunk is
+`WHERE (created_at, id) > (:last_created_at, :last_id) ORDER BY created_at,
+id LIMIT n`, served by the ix_*_created_at_id indexes, so the cost of a page
+does not grow with its position and an export streams in constant memory.
+Only the columns in ORDER_COLUMNS / PAYMENT_COLUMNS are selected; event
+payloads are never read. The detail views load through the REPORT_ORDER
+and AUDIT_PAYMENT profiles (app/query_profiles.py).
+
+A cursor is the last row's (created_at, id), opaque to clients.
+"""
+
+import base64
+import hashlib
+from datetime import datetime
+from enum import Enum
+from itertools import islice
+from sqlalchemy import func, select, tuple_
+from ..extensions import db
+from ..models import Order, Payment
+from ..query_profiles import AUDIT_PAYMENT, EVENT_HEADER_COLUMNS, ORDER_COLUMNS, PAYMENT_COLUMNS, REPORT_ORDER
+
+
+def encode_cursor(created_at, row_id):
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from a cursor; ValueError if it isn't one."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), row_id
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid cursor {cursor!r}") from e
+
+
+def serialize(row):
+    """A result row (or dict) as a JSON-ready dict (ISO timestamps, enum values)."""
+    out = {}
+    for key, value in (row if isinstance(row, dict) else row._mapping).items():
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, Enum):
+            value = value.value
+        out[key] = value
+    return out
+
+
+def iter_keyset(columns, created_at, row_id, where=(), after=None, chunk_size=500):
+    """Yield rows of `columns` in (created_at, id) order, one LIMIT query per chunk."""
+    while True:
+        q = select(*columns).where(*where).order_by(created_at, row_id).limit(chunk_size)
+        if after is not None:
+            q = q.where(tuple_(created_at, row_id) > tuple_(*after))
+        rows = db.session.execute(q).all()
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        after = (rows[-1].created_at, rows[-1].id)
+
+
+def iter_orders(status=None, after=None, chunk_size=500):
+    where = (Order.status == status,) if status is not None else ()
+    return iter_keyset(ORDER_COLUMNS, Order.created_at, Order.id, where, after, chunk_size)
+
+
+def iter_payments(since=None, after=None, chunk_size=500):
+    where = (Payment.created_at >= since,) if since is not None else ()
+    return iter_keyset(PAYMENT_COLUMNS, Payment.created_at, Payment.id, where, after, chunk_size)
+
+
+def page(rows, limit):
+    """First `limit` rows of a keyset iterator (built with chunk_size=limit + 1) and the next cursor or None."""
+    rows = list(islice(rows, limit + 1))
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, (encode_cursor(rows[-1].created_at, rows[-1].id) if more else None)
+
+
+def order_etag(order_id):
+    """Version tag of an order's detail (the order row and its payments), or None if there is no such order.
+
+    One small aggregate query: cheap enough to answer a conditional GET
+    without loading the detail.
+    """
+    row = db.session.execute(
+        select(Order.updated_at, func.max(Payment.updated_at), func.count(Payment.id))
+        .select_from(Order)
+        .outerjoin(Payment, Payment.order_id == Order.id)
+        .where(Order.id == order_id)
+        .group_by(Order.id, Order.updated_at)
+    ).first()
+    if row is None:
+        return None
+    version = "|".join(str(v) for v in (order_id, *row))
+    return hashlib.blake2b(version.encode(), digest_size=12).hexdigest()
+
+
+def _fields(obj, columns):
+    return {c.key: getattr(obj, c.key) for c in columns}
+
+
+def order_detail(order_id):
+    """The order's columns plus its payments (two queries), or None."""
+    order = db.session.execute(select(Order).options(*REPORT_ORDER).where(Order.id == order_id)).scalar()
+    if order is None:
+        return None
+    payments = sorted(order.payments, key=lambda p: (p.created_at, p.id))
+    return {**serialize(_fields(order, ORDER_COLUMNS)),
+            "payments": [serialize(_fields(p, PAYMENT_COLUMNS)) for p in payments]}
+
+
+def payment_events(payment_id):
+    """The payment's columns plus the headers of its stored events, oldest first (two queries), or None."""
+    payment = db.session.execute(select(Payment).options(*AUDIT_PAYMENT).where(Payment.id == payment_id)).scalar()
+    if payment is None:
+        return None
+    events = sorted(payment.events, key=lambda e: (e.received_at, e.id))
+    return {**serialize(_fields(payment, PAYMENT_COLUMNS)),
+            "events": [serialize(_fields(e, EVENT_HEADER_COLUMNS)) for e in events]}
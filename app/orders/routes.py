@@ -0,0 +1,152 @@
+# app/orders/routes.py
+"""Read-only reporting API.
+
+    GET /orders/<id>                 order + its payments; ETag / If-None-Match
+    GET /orders?status=PAID          orders, oldest first
+    GET /payments?since=2026-10-01   payments created since (ISO date/time, UTC)
+    GET /payments/<id>/events        a payment and its stored events (headers only, no payloads)
+    POST /orders                     create one order (JSON)
+    POST /orders/import              bulk create from an NDJSON or CSV body (streamed)
+
+Lists return `{"data": [...], "next_cursor": ...}` pages (`limit`, default
+100, max 1000; pass `cursor` to continue). With `format=ndjson` (or
+`Accept: application/x-ndjson`) the whole result from `cursor` on is
+streamed instead, one JSON object per line, read in keyset chunks so memory
+stays flat however many rows there are. See reporting.py for the queries.
+"""
+
+import io
+from datetime import datetime, timezone
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+from ..extensions import db
+from ..models import OrderStatus
+from ..payloads import dumps_compact
+from . import ingest, reporting
+
+
+orders_bp = Blueprint("orders", __name__)
+payments_bp = Blueprint("payments", __name__)
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+STREAM_CHUNK = 1000
+NDJSON = "application/x-ndjson"
+
+
+class BadRequest(ValueError):
+    pass
+
+
+@orders_bp.errorhandler(BadRequest)
+@payments_bp.errorhandler(BadRequest)
+def _bad_request(e):
+    return jsonify({"error": str(e)}), 400
+
+
+@orders_bp.get("/<order_id>")
+def order_detail(order_id):
+    etag = reporting.order_etag(order_id)
+    if etag is None:
+        return jsonify({"error": "not found"}), 404
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(reporting.order_detail(order_id))
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"   # may be stored, but revalidate
+    return response
+
+
+@orders_bp.post("")
+def create_order():
+    record = request.get_json(silent=True)
+    try:
+        row = ingest.validate_order(record)
+    except ingest.InvalidOrder as e:
+        raise BadRequest(str(e))
+    if not ingest.insert_orders([row]):
+        db.session.rollback()
+        return jsonify({"error": f"order {row['id']} already exists"}), 409
+    db.session.commit()
+    current_app.logger.info("Order %s created (%s %s)", row["id"], row["amount_due"], row["currency"])
+    response = jsonify(reporting.order_detail(row["id"]))
+    response.status_code = 201
+    response.headers["Location"] = f"{request.path}/{row['id']}"
+    return response
+
+
+@orders_bp.post("/import")
+def import_orders():
+    """Bulk create from the request body, read line by line (never buffered whole).
+
+    The format comes from `Content-Type` (text/csv or application/x-ndjson) or `?format=`.
+    """
+    fmt = request.args.get("format") or ingest.format_for(mimetype=request.mimetype)
+    if fmt not in ingest.FORMATS:
+        raise BadRequest("send text/csv or application/x-ndjson (or pass ?format=csv|ndjson)")
+    lines = io.TextIOWrapper(request.stream, encoding="utf-8", newline="" if fmt == "csv" else None)
+    records = ingest.read_records(lines, fmt)
+    stats = ingest.import_orders(records, chunk_size=current_app.config["ORDER_IMPORT_CHUNK_SIZE"])
+    current_app.logger.info(
+        "Imported orders: received=%s inserted=%s duplicates=%s invalid=%s (%.0f rows/sec)",
+        stats.received, stats.inserted, stats.duplicates, stats.invalid, stats.rows_per_sec,
+    )
+    return jsonify(stats.as_dict())
+
+
+@orders_bp.get("")
+def list_orders():
+    status = request.args.get("status")
+    if status is not None:
+        try:
+            status = OrderStatus(status.upper())
+        except ValueError:
+            raise BadRequest(f"unknown status {status!r}")
+    return _listing(lambda after, chunk: reporting.iter_orders(status, after, chunk))
+
+
+@payments_bp.get("")
+def list_payments():
+    since = request.args.get("since")
+    if since is not None:
+        try:
+            since = datetime.fromisoformat(since)
+        except ValueError:
+            raise BadRequest(f"invalid since {since!r} (expected an ISO 8601 date or datetime)")
+        if since.tzinfo is not None:
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return _listing(lambda after, chunk: reporting.iter_payments(since, after, chunk))
+
+
+@payments_bp.get("/<payment_id>/events")
+def payment_events(payment_id):
+    detail = reporting.payment_events(payment_id)
+    if detail is None:
+        return jsonify({"error": "not found"}), 404
+    return jsonify(detail)
+
+
+def _listing(query):
+    """A JSON page, or an NDJSON stream of everything from the cursor on."""
+    after = None
+    if request.args.get("cursor"):
+        try:
+            after = reporting.decode_cursor(request.args["cursor"])
+        except ValueError as e:
+            raise BadRequest(str(e))
+
+    if request.args.get("format") == "ndjson" or request.accept_mimetypes.best == NDJSON:
+        def lines():
+            for row in query(after, STREAM_CHUNK):
+                yield dumps_compact(reporting.serialize(row)) + b"\n"
+
+        return Response(stream_with_context(lines()), mimetype=NDJSON)
+
+    try:
+        limit = min(int(request.args.get("limit", DEFAULT_LIMIT)), MAX_LIMIT)
+    except ValueError:
+        raise BadRequest("limit must be an integer")
+    if limit < 1:
+        raise BadRequest("limit must be positive")
+    rows, next_cursor = reporting.page(query(after, limit + 1), limit)
+    return jsonify({"data": [reporting.serialize(r) for r in rows], "next_cursor": next_cursor})
@@ -0,0 +1,155 @@
+# app/orders/totals.py
+"""Materialized order totals.
+
+`Order.amount_paid` is maintained incrementally: when an event changes what
+a Payment contributes (its amount while SUCCEEDED, else 0), the difference is
+added to the order with a single `UPDATE ... SET amount_paid = amount_paid + :delta`
+that also re-derives the status, in the caller's transaction.
+`Order.amount_refunded` works the same way from refund/dispute events
+(the sum of the order's `Payment.amount_refunded`). Nothing on
+the hot path sums over an order's payments any more; `reconcile_order_totals`
+does the full recompute in bulk to verify (and optionally repair) the totals.
+"""
+
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import bindparam, case, cast, func, literal, select, update
+from ..extensions import db
+from ..models import Order, OrderStatus, Payment, PaymentStatus
+
+# Statuses that are derived from the paid total (others, e.g. DRAFT or
+# CANCELED, are set by hand and left alone by reconcile unless totals drift).
+PAYMENT_DRIVEN_STATUSES = (
+    OrderStatus.AWAITING_PAYMENT, OrderStatus.PARTIALLY_PAID, OrderStatus.PAID,
+    OrderStatus.PARTIALLY_REFUNDED, OrderStatus.REFUNDED,
+)
+
+Drift = namedtuple(
+    "Drift", "order_id amount_paid expected_paid amount_refunded expected_refunded status expected_status"
+)
+
+
+def succeeded_amount(status, amount_received):
+    """What a Payment contributes to its order's amount_paid."""
+    return (amount_received or 0) if status == PaymentStatus.SUCCEEDED else 0
+
+
+def order_status_for(total_paid, amount_due, total_refunded=0):
+    """Order status implied by the SUCCEEDED and refunded totals (minor units)."""
+    if total_paid <= 0:
+        return OrderStatus.AWAITING_PAYMENT
+    if total_refunded >= total_paid:
+        return OrderStatus.REFUNDED
+    if total_refunded > 0:
+        return OrderStatus.PARTIALLY_REFUNDED
+    if total_paid < (amount_due or 0):
+        return OrderStatus.PARTIALLY_PAID
+    return OrderStatus.PAID
+
+
+def order_status_expr(paid, amount_due, refunded):
+    """SQL version of `order_status_for`, for use inside an UPDATE."""
+    status_type = Order.__table__.c.status.type
+
+    def status(s):
+        return cast(literal(s.name), status_type)
+
+    return case(
+        (paid <= 0, status(OrderStatus.AWAITING_PAYMENT)),
+        (refunded >= paid, status(OrderStatus.REFUNDED)),
+        (refunded > 0, status(OrderStatus.PARTIALLY_REFUNDED)),
+        (paid < func.coalesce(amount_due, 0), status(OrderStatus.PARTIALLY_PAID)),
+        else_=status(OrderStatus.PAID),
+    )
+
+
+def _delta_update():
+    orders = Order.__table__
+    new_paid = orders.c.amount_paid + bindparam("paid_delta")
+    new_refunded = orders.c.amount_refunded + bindparam("refunded_delta")
+    return (
+        update(orders)
+        .where(orders.c.id == bindparam("order_id"))
+        .values(
+            amount_paid=new_paid,
+            amount_refunded=new_refunded,
+            status=order_status_expr(new_paid, orders.c.amount_due, new_refunded),
+            updated_at=bindparam("now"),
+        )
+    )
+
+
+def apply_order_delta(order_id, paid_delta, refunded_delta=0):
+    """Move one order's totals; returns (amount_paid, amount_refunded, amount_due, status) or None."""
+    orders = Order.__table__
+    stmt = _delta_update().returning(
+        orders.c.amount_paid, orders.c.amount_refunded, orders.c.amount_due, orders.c.status
+    )
+    return db.session.execute(
+        stmt,
+        {"order_id": order_id, "paid_delta": paid_delta, "refunded_delta": refunded_delta, "now": datetime.utcnow()},
+    ).first()
+
+
+def apply_order_deltas(deltas):
+    """Bulk form of `apply_order_delta` for {order_id: (paid_delta, refunded_delta)} (one executemany)."""
+    now = datetime.utcnow()
+    params = [
+        {"order_id": order_id, "paid_delta": paid, "refunded_delta": refunded, "now": now}
+        for order_id, (paid, refunded) in deltas.items() if paid or refunded
+    ]
+    if params:
+        db.session.execute(_delta_update(), params)
+    return len(params)
+
+
+def reconcile_order_totals(repair=False, chunk_size=1000):
+    """Compare materialized totals with a full recompute; yields Drift rows.
+
+    Walks orders by primary key in chunks (one grouped SUM per chunk). With
+    `repair`, each drifted chunk is fixed with a bulk UPDATE and committed.
+    """
+    last_id = None
+    while True:
+        q = (
+            select(Order.id, Order.amount_due, Order.amount_paid, Order.amount_refunded, Order.status)
+            .order_by(Order.id)
+            .limit(chunk_size)
+        )
+        if last_id is not None:
+            q = q.where(Order.id > last_id)
+        rows = db.session.execute(q).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+
+        succeeded = Payment.status == PaymentStatus.SUCCEEDED
+        totals = {
+            order_id: (paid, refunded)
+            for order_id, paid, refunded in db.session.execute(
+                select(
+                    Payment.order_id,
+                    func.coalesce(func.sum(case((succeeded, Payment.amount_received), else_=0)), 0),
+                    func.coalesce(func.sum(Payment.amount_refunded), 0),
+                )
+                .where(Payment.order_id.in_([r.id for r in rows]))
+                .group_by(Payment.order_id)
+            ).all()
+        }
+
+        fixes = []
+        for r in rows:
+            expected_paid, expected_refunded = totals.get(r.id, (0, 0))
+            expected_status = r.status
+            drifted = (r.amount_paid, r.amount_refunded) != (expected_paid, expected_refunded)
+            if drifted or r.status in PAYMENT_DRIVEN_STATUSES:
+                expected_status = order_status_for(expected_paid, r.amount_due, expected_refunded)
+            if drifted or r.status != expected_status:
+                yield Drift(r.id, r.amount_paid, expected_paid, r.amount_refunded, expected_refunded,
+                            r.status, expected_status)
+                fixes.append({"id": r.id, "amount_paid": expected_paid, "amount_refunded": expected_refunded,
+                              "status": expected_status})
+
+        if repair and fixes:
+            db.session.execute(update(Order), fixes)
+            db.session.commit()
@@ -0,0 +1,141 @@
+# app/payloads.py
+"""Storage format for PaymentEvent payloads.
+
+A stored payload is one marker byte followed by the body:
+
+    b"\\x00" + utf-8 JSON              (uncompressed; used when compression doesn't pay)
+    b"\\x01" + zlib(utf-8 JSON)
+    b"\\x02" + zstd(utf-8 JSON)        (needs the optional `zstandard` package)
+
+JSON is written compactly; webhook bodies are stored as received (already
+valid JSON, so there is nothing to gain from re-serializing them). Rows written before this format live in the
+legacy `payment_events.payload` text column and are read from there until
+`flask webhooks compress-payloads` converts them.
+
+Payloads whose encoded size exceeds EVENT_PAYLOAD_MAX_BYTES are replaced by
+a reduced event that keeps only the fields the normalizer reads, flagged
+with `"truncated": true`, so a stored payload is always valid JSON.
+"""
+
+import json
+import zlib
+from flask import current_app, has_app_context
+
+try:  # optional dependency
+    import zstandard
+except ImportError:  # pragma: no cover - depends on environment
+    zstandard = None
+
+try:  # optional dependency: several times faster than the stdlib json
+    import orjson
+except ImportError:  # pragma: no cover - depends on environment
+    orjson = None
+
+RAW, ZLIB, ZSTD = b"\x00", b"\x01", b"\x02"
+CODECS = {"none": RAW, "zlib": ZLIB, "zstd": ZSTD}
+
+DEFAULT_CODEC = "zlib"
+DEFAULT_MAX_BYTES = 256 * 1024
+MIN_COMPRESS_BYTES = 64  # below this, compression overhead outweighs the gain
+
+# data.object keys the normalizers read (payments, refunds, disputes);
+# everything else can go in a reduced payload
+_KEEP_KEYS = (
+    "id", "object", "payment_intent", "charge", "currency", "amount", "amount_received",
+    "amount_total", "status", "paid", "reason", "metadata", "payment_method_details", "created",
+)
+# Keys kept for each refund embedded in a charge (charge.refunded)
+_REFUND_KEYS = ("id", "charge", "amount", "currency", "status", "reason")
+
+
+def _settings():
+    if has_app_context():
+        cfg = current_app.config
+        return cfg.get("EVENT_PAYLOAD_CODEC", DEFAULT_CODEC), cfg.get("EVENT_PAYLOAD_MAX_BYTES", DEFAULT_MAX_BYTES)
+    return DEFAULT_CODEC, DEFAULT_MAX_BYTES
+
+
+def loads(data):
+    """Parse JSON text or bytes (orjson when installed)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_compact(event):
+    if orjson is not None:
+        return orjson.dumps(event)
+    return json.dumps(event, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def encode_payload(event, codec=None, max_bytes=None, bounded=True):
+    """Encode an event (dict, or JSON text/bytes) for `PaymentEvent.payload_data`.
+
+    With `bounded=False` the body is stored as given, whatever its size (used
+    when converting legacy rows, which may not even be valid JSON).
+    """
+    default_codec, default_max = _settings()
+    codec = codec or default_codec
+    max_bytes = max_bytes or default_max
+
+    if isinstance(event, str):
+        body = event.encode("utf-8")
+    elif isinstance(event, (bytes, bytearray)):
+        body = bytes(event)
+    else:
+        body = dumps_compact(event)
+
+    blob = _compress(body, codec)
+    if bounded and len(blob) > max_bytes:
+        if not isinstance(event, dict):
+            event = loads(body)
+        blob = _compress(dumps_compact(reduce_event(event)), codec)
+    return blob
+
+
+def decode_payload(blob):
+    """Inverse of `encode_payload`; returns the JSON text."""
+    if not blob:
+        return None
+    marker, body = blob[:1], blob[1:]
+    if marker == ZLIB:
+        body = zlib.decompress(body)
+    elif marker == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("payload is zstd-compressed but `zstandard` is not installed")
+        body = zstandard.ZstdDecompressor().decompress(body)
+    elif marker != RAW:
+        raise ValueError(f"unknown payload format marker {marker!r}")
+    return body.decode("utf-8")
+
+
+def reduce_event(event):
+    """Keep just the envelope and the data.object fields the normalizer uses."""
+    obj = event.get("data", {}).get("object", {}) or {}
+    kept = {k: obj[k] for k in _KEEP_KEYS if k in obj}
+    charges = (obj.get("charges") or {}).get("data") or []
+    if charges and isinstance(charges, list):
+        kept["charges"] = {"data": [{"payment_method_details": charges[0].get("payment_method_details")}]}
+    refunds = (obj.get("refunds") or {}).get("data") or []
+    if refunds and isinstance(refunds, list):
+        kept["refunds"] = {"data": [{k: r[k] for k in _REFUND_KEYS if k in r} for r in refunds]}
+    return {
+        "id": event.get("id"),
+        "type": event.get("type"),
+        "created": event.get("created"),
+        "truncated": True,
+        "data": {"object": kept},
+    }
+
+
+def _compress(body, codec):
+    marker = CODECS.get(codec)
+    if marker is None:
+        raise ValueError(f"unknown EVENT_PAYLOAD_CODEC {codec!r}")
+    if marker == RAW or len(body) < MIN_COMPRESS_BYTES:
+        return RAW + body
+    if marker == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("EVENT_PAYLOAD_CODEC=zstd needs the `zstandard` package")
+        return ZSTD + zstandard.ZstdCompressor(level=3).compress(body)
+    return ZLIB + zlib.compress(body, 6)
@@ -0,0 +1,56 @@
+# app/query_profiles.py
+"""Named loader option sets for Order / Payment / PaymentEvent queries.
+
+Relationships in app/models.py are lazy by default. Each access path states
+what it needs up front instead:
+
+    select(Payment).options(*WEBHOOK_PAYMENT)            webhooks/processing.py
+    select(Order).options(*REPORT_ORDER)                 orders/reporting.py: order_detail
+    select(Payment).options(*AUDIT_PAYMENT)              orders/reporting.py: payment_events
+
+Columns left out by a profile raise on access instead of loading lazily.
+PROFILES maps the names to the option tuples for callers that pick one at
+runtime.
+"""
+
+from sqlalchemy.orm import load_only, raiseload, selectinload
+from .models import Order, Payment, PaymentEvent
+
+ORDER_COLUMNS = (
+    Order.id, Order.external_ref, Order.currency, Order.amount_due, Order.amount_paid,
+    Order.amount_refunded, Order.status, Order.created_at, Order.updated_at,
+)
+PAYMENT_COLUMNS = (
+    Payment.id, Payment.order_id, Payment.stripe_payment_intent_id, Payment.currency,
+    Payment.amount_received, Payment.amount_refunded, Payment.status, Payment.method_type,
+    Payment.card_brand, Payment.card_last4, Payment.created_at, Payment.updated_at,
+)
+EVENT_HEADER_COLUMNS = (
+    PaymentEvent.id, PaymentEvent.stripe_event_id, PaymentEvent.type, PaymentEvent.status,
+    PaymentEvent.attempts, PaymentEvent.received_at, PaymentEvent.processed_at, PaymentEvent.payment_id,
+)
+
+# Hot webhook path: just the payment row. Touching a relationship raises
+# instead of quietly adding a query per event.
+WEBHOOK_PAYMENT = (raiseload("*"),)
+
+# Reporting: an order with its payments (one extra SELECT ... IN for all
+# payments), only the columns the API returns.
+REPORT_ORDER = (
+    load_only(*ORDER_COLUMNS, raiseload=True),
+    selectinload(Order.payments).load_only(*PAYMENT_COLUMNS, raiseload=True).raiseload("*"),
+)
+
+# Audit: a payment with its event headers, never the payload bytes.
+AUDIT_PAYMENT = (
+    load_only(*PAYMENT_COLUMNS, raiseload=True),
+    raiseload(Payment.order),
+    raiseload(Payment.refunds),
+    selectinload(Payment.events).load_only(*EVENT_HEADER_COLUMNS, raiseload=True).raiseload("*"),
+)
+
+PROFILES = {
+    "webhook": WEBHOOK_PAYMENT,
+    "report": REPORT_ORDER,
+    "audit": AUDIT_PAYMENT,
+}
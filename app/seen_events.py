@@ -0,0 +1,210 @@
+# app/seen_events.py
+"""Optional Bloom filter of Stripe event ids already recorded.
+
+Most deliveries are first-time events. A duplicate is detected by
+record_event's INSERT ... ON CONFLICT, which runs before the event is
+applied but only after its payload has been encoded and sent to the
+database. With the filter enabled (SEEN_FILTER_ENABLED), the sync webhook
+checks it first:
+
+- "definitely new" (no false negatives): go straight to recording the
+  event, with no extra query,
+- "maybe seen": one primary-key probe (`is_recorded`) decides, and a real
+  duplicate is acknowledged without encoding or inserting anything.
+
+The unique constraint stays the safety net, so the filter can't cause a
+wrong answer. A lost bit only means that duplicate is caught by the insert,
+as without the filter.
+
+The filter is sized for SEEN_FILTER_CAPACITY ids at a SEEN_FILTER_FP_RATE
+false-positive rate. It is warmed on first use from ids received in the
+last SEEN_FILTER_WARM_HOURS (Stripe retries for up to three days), and
+recorded ids are added after each commit. With SEEN_FILTER_PATH the bits
+live in a memory-mapped file: every worker on the host shares one filter,
+and it is warmed only once. Bits are only ever set, so a concurrent update
+from another process can at worst lose a bit.
+"""
+
+import math
+import mmap
+import os
+import struct
+import threading
+from datetime import datetime, timedelta
+from hashlib import blake2b
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+_MAGIC = b"SEENBLM1"
+_HEADER = struct.Struct("<8sQII")       # magic, bits, hashes, warmed
+_HEADER_SIZE = 64
+
+
+def bloom_size(capacity, fp_rate):
+    """(bits, hashes) for `capacity` items at `fp_rate`."""
+    capacity = max(1, capacity)
+    bits = math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2)
+    bits = (bits + 7) // 8 * 8
+    return bits, max(1, round(bits / capacity * math.log(2)))
+
+
+class BloomFilter:
+    def __init__(self, bits, hashes, path=None):
+        self.bits = bits
+        self.hashes = hashes
+        self.path = path
+        self._lock = threading.Lock()
+        nbytes = bits // 8
+        if path:
+            self._buf, self._offset = _map_file(path, bits, hashes), _HEADER_SIZE
+        else:
+            self._buf, self._offset = bytearray(nbytes), 0
+
+    def _positions(self, key):
+        digest = blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, key):
+        buf, offset = self._buf, self._offset
+        with self._lock:
+            for pos in self._positions(key):
+                buf[offset + (pos >> 3)] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        buf, offset = self._buf, self._offset
+        return all(buf[offset + (pos >> 3)] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    @property
+    def warmed(self):
+        if self.path:
+            return bool(_HEADER.unpack_from(self._buf, 0)[3])
+        return getattr(self, "_warmed", False)
+
+    def mark_warmed(self):
+        if self.path:
+            _HEADER.pack_into(self._buf, 0, _MAGIC, self.bits, self.hashes, 1)
+        self._warmed = True
+
+    @property
+    def memory_bytes(self):
+        return self.bits // 8
+
+    def fill_ratio(self):
+        ones = int.from_bytes(self._buf[self._offset:self._offset + self.bits // 8], "little").bit_count()
+        return ones / self.bits
+
+    def estimated_items(self):
+        fill = min(self.fill_ratio(), 1.0 - 1e-12)
+        return -self.bits / self.hashes * math.log(1.0 - fill)
+
+    def estimated_fp_rate(self):
+        """Current false-positive probability, from the share of bits set."""
+        return self.fill_ratio() ** self.hashes
+
+
+def _map_file(path, bits, hashes):
+    """Open (or create) the shared filter file and map it; a file sized for other parameters is reset."""
+    size = _HEADER_SIZE + bits // 8
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        header = os.pread(fd, _HEADER.size, 0)
+        if len(header) < _HEADER.size or _HEADER.unpack(header)[:3] != (_MAGIC, bits, hashes):
+            os.ftruncate(fd, 0)
+            os.ftruncate(fd, size)
+            os.pwrite(fd, _HEADER.pack(_MAGIC, bits, hashes, 0), 0)
+        return mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+    finally:
+        os.close(fd)
+
+
+class SeenEvents:
+    """The app's filter plus its counters (see module docstring)."""
+
+    def __init__(self, bloom, fp_target, warm_hours=72.0, logger=None):
+        self.bloom = bloom
+        self.fp_target = fp_target
+        self.warm_hours = warm_hours
+        self._logger = logger
+        self._warm_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.maybe_seen = 0
+        self.false_positives = 0     # maybe seen, but not recorded after all
+        self.warmed_ids = 0
+
+    @classmethod
+    def from_app(cls, app):
+        cfg = app.config
+        if not cfg.get("SEEN_FILTER_ENABLED"):
+            return None
+        fp_rate = cfg.get("SEEN_FILTER_FP_RATE", 0.001)
+        bits, hashes = bloom_size(cfg.get("SEEN_FILTER_CAPACITY", 1_000_000), fp_rate)
+        bloom = BloomFilter(bits, hashes, path=cfg.get("SEEN_FILTER_PATH") or None)
+        return cls(bloom, fp_rate, warm_hours=cfg.get("SEEN_FILTER_WARM_HOURS", 72.0), logger=app.logger)
+
+    def might_contain(self, stripe_event_id):
+        """False means definitely never recorded; True means check the database."""
+        self.warm()
+        seen = stripe_event_id in self.bloom
+        with self._lock:
+            self.checks += 1
+            self.maybe_seen += seen
+        return seen
+
+    def add(self, stripe_event_id):
+        if stripe_event_id:
+            self.bloom.add(stripe_event_id)
+
+    def false_positive(self):
+        with self._lock:
+            self.false_positives += 1
+
+    def warm(self):
+        """Load recently received ids, once per process (or once per host with a shared file)."""
+        if self.bloom.warmed:
+            return
+        with self._warm_lock:
+            if self.bloom.warmed:
+                return
+            from .extensions import db
+            from .models import PaymentEvent
+
+            since = datetime.utcnow() - timedelta(hours=self.warm_hours)
+            try:
+                ids = db.session.execute(
+                    select(PaymentEvent.stripe_event_id).where(PaymentEvent.received_at >= since)
+                ).scalars()
+                for n, evt_id in enumerate(ids, 1):
+                    self.bloom.add(evt_id)
+                    self.warmed_ids = n
+            except SQLAlchemyError as e:
+                # Nothing to warm from (e.g. before migrations): start empty
+                db.session.rollback()
+                self._log("seen-events filter not warmed: %s", e)
+            self.bloom.mark_warmed()
+
+    def stats(self):
+        return {
+            "bits": self.bloom.bits,
+            "hashes": self.bloom.hashes,
+            "memory_bytes": self.bloom.memory_bytes,
+            "estimated_items": round(self.bloom.estimated_items()),
+            "fp_rate_target": self.fp_target,
+            "fp_rate_estimated": round(self.bloom.estimated_fp_rate(), 6),
+            "checks": self.checks,
+            "maybe_seen": self.maybe_seen,
+            "false_positives": self.false_positives,
+            "warmed_ids": self.warmed_ids,
+        }
+
+    def _log(self, msg, *args):
+        if self._logger is not None:
+            self._logger.warning(msg, *args)
+
+
+def get_seen_events():
+    """The app's SeenEvents, or None when the filter is disabled."""
+    return current_app.extensions.get("seen_events")
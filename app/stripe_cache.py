@@ -0,0 +1,221 @@
+# app/stripe_cache.py
+"""PaymentIntent metadata cache used to link new Payments to Orders.
+
+One PaymentIntent produces several events (payment_intent.created,
+charge.succeeded, checkout.session.completed, ...), and any of them may be
+the first to create the Payment and need `metadata.order_id` from Stripe.
+This layer keeps that lookup to (at most) one API call per PI:
+
+- a bounded in-process LRU with a TTL,
+- single-flight: concurrent misses for the same PI wait on one retrieval,
+- optionally a SQLite file shared by every worker on the host
+  (PI_CACHE_SHARED_PATH), consulted before calling Stripe.
+
+Failed retrievals are not cached; the error is raised to every waiter.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+
+class StripeFetcher:
+    """Fetch PaymentIntent metadata with a lazily built StripeClient."""
+
+    def __init__(self, api_key, api_base=None):
+        self.api_key = api_key
+        self.api_base = api_base or None
+        self._client = None
+
+    def __call__(self, pi_id):
+        if self._client is None:
+            import stripe
+            base = {"api": self.api_base} if self.api_base else {}
+            self._client = stripe.StripeClient(self.api_key, base_addresses=base)
+        pi = self._client.payment_intents.retrieve(pi_id)
+        return dict(pi.get("metadata") or {})
+
+
+class SQLiteSharedTier:
+    """Host-wide cache tier in a SQLite file, safe across threads and forked workers."""
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pi_metadata "
+                "(pi_id TEXT PRIMARY KEY, metadata TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, pi_id):
+        row = self._conn().execute(
+            "SELECT metadata FROM pi_metadata WHERE pi_id = ? AND expires_at > ?",
+            (pi_id, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, pi_id, metadata):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO pi_metadata (pi_id, metadata, expires_at) VALUES (?, ?, ?)",
+            (pi_id, json.dumps(metadata), time.time() + self.ttl),
+        )
+
+
+class _Call:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class PaymentIntentCache:
+    def __init__(self, fetch, maxsize=10_000, ttl=300.0, shared=None, logger=None):
+        self._fetch = fetch
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._shared = shared
+        self._logger = logger
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # pi_id -> (expires_at, metadata)
+        self._inflight = {}             # pi_id -> _Call
+
+        self.hits = 0            # served from the in-process LRU
+        self.misses = 0          # LRU misses that led a lookup
+        self.coalesced = 0       # LRU misses that waited on another caller's lookup
+        self.shared_hits = 0     # served from the SQLite tier
+        self.fetches = 0         # Stripe API calls
+        self.fetch_errors = 0
+        self.fetch_seconds = 0.0
+        self.fetch_seconds_max = 0.0
+
+    @classmethod
+    def from_app(cls, app, fetch=None):
+        cfg = app.config
+        ttl = cfg.get("PI_CACHE_TTL", 300.0)
+        shared_path = cfg.get("PI_CACHE_SHARED_PATH")
+        return cls(
+            fetch or StripeFetcher(cfg.get("STRIPE_API_KEY", ""), cfg.get("STRIPE_API_BASE")),
+            maxsize=cfg.get("PI_CACHE_MAXSIZE", 10_000),
+            ttl=ttl,
+            shared=SQLiteSharedTier(shared_path, ttl) if shared_path else None,
+            logger=app.logger,
+        )
+
+    def get_metadata(self, pi_id):
+        """Metadata dict for `pi_id` (treat as read-only)."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(pi_id)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(pi_id)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[pi_id]
+            call = self._inflight.get(pi_id)
+            leader = call is None
+            if leader:
+                call = self._inflight[pi_id] = _Call()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = self._load(pi_id)
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(pi_id, None)
+                if call.error is None:
+                    self._store(pi_id, call.value)
+            call.done.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "shared_hits": self.shared_hits,
+            "fetches": self.fetches,
+            "fetch_errors": self.fetch_errors,
+            "fetch_seconds": self.fetch_seconds,
+            "fetch_seconds_max": self.fetch_seconds_max,
+        }
+
+    def _store(self, pi_id, metadata):
+        if self.maxsize <= 0:
+            return
+        self._entries[pi_id] = (time.monotonic() + self.ttl, metadata)
+        self._entries.move_to_end(pi_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _load(self, pi_id):
+        if self._shared is not None:
+            try:
+                metadata = self._shared.get(pi_id)
+            except sqlite3.Error as e:
+                metadata = None
+                self._log("PI cache shared tier read failed: %s", e)
+            if metadata is not None:
+                with self._lock:
+                    self.shared_hits += 1
+                return metadata
+
+        started = time.perf_counter()
+        failed = True
+        try:
+            metadata = self._fetch(pi_id)
+            failed = False
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.fetches += 1
+                self.fetch_errors += failed
+                self.fetch_seconds += elapsed
+                self.fetch_seconds_max = max(self.fetch_seconds_max, elapsed)
+
+        if self._shared is not None:
+            try:
+                self._shared.set(pi_id, metadata)
+            except sqlite3.Error as e:
+                self._log("PI cache shared tier write failed: %s", e)
+        return metadata
+
+    def _log(self, msg, *args):
+        if self._logger is not None:
+            self._logger.warning(msg, *args)
+
+
+def get_pi_cache():
+    return current_app.extensions["pi_cache"]
@@ -0,0 +1,131 @@
+# app/webhooks/admission.py
+"""Admission control for the webhook endpoint (one controller per worker process).
+
+During a burst (typically Stripe redelivering a backlog after an outage),
+accepting every event piles up transactions until the database slows down
+for everyone, requests time out, and Stripe retries even more. Once a
+request's signature is verified and before it touches the database, the
+route asks `try_acquire(evt_type)`. The answer is no, and the route returns
+503 with Retry-After, when either:
+
+- too many webhooks are already in flight in this process
+  (`WEBHOOK_MAX_IN_FLIGHT`), or
+- the database is slow: an EWMA of the mean statement time of recent
+  webhooks, from the SQL hooks in app/metrics.py, is above
+  `WEBHOOK_SHED_DB_LATENCY_MS`.
+
+Money-moving event types (`WEBHOOK_PRIORITY_EVENT_TYPES`) get preference:
+- The last `WEBHOOK_PRIORITY_RESERVED` share of the in-flight slots is kept
+  for them.
+- They are shed on latency only at twice the threshold.
+
+Informational events go first, and Stripe redelivers them later. While
+everything is being shed, nothing updates the EWMA, so it decays with a
+`LATENCY_HALF_LIFE` half-life. A request that arrives when nothing else is
+in flight is always admitted; it re-measures the database, so traffic comes
+back as soon as the database has recovered.
+
+Stripe follows its own retry schedule, so Retry-After is a hint for other
+senders and proxies. The 503 itself is what matters: Stripe retries any
+non-2xx response.
+"""
+
+import math
+import threading
+import time
+from flask import current_app
+
+LATENCY_HALF_LIFE = 2.0     # seconds for the latency estimate to halve without new samples
+LATENCY_ALPHA = 0.2         # weight of each new request in the EWMA
+DEFAULT_PRIORITY_TYPES = (
+    "payment_intent.succeeded", "payment_intent.payment_failed", "charge.succeeded", "charge.refunded",
+    "charge.refund.updated", "charge.dispute.created", "charge.dispute.closed",
+    # Current API versions deliver refunds only as refund.* (charge.refunded embeds none)
+    "refund.created", "refund.updated", "refund.failed",
+)
+
+
+class Admission:
+    def __init__(self, max_in_flight=8, priority_reserved=0.25, latency_threshold=0.1, retry_after=5,
+                 priority_types=DEFAULT_PRIORITY_TYPES):
+        self.max_in_flight = max_in_flight
+        # In-flight slots informational events may use; the rest are kept for priority ones
+        self.soft_limit = max(1, max_in_flight - math.ceil(max_in_flight * priority_reserved))
+        self.latency_threshold = latency_threshold
+        self.retry_after = retry_after
+        self.priority_types = frozenset(priority_types)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._latency = 0.0
+        self._latency_at = time.monotonic()
+        self.admitted = {False: 0, True: 0}                 # priority -> count
+        self.shed = {}                                      # (priority, reason) -> count
+
+    @classmethod
+    def from_app(cls, app):
+        config = app.config
+        if not config.get("WEBHOOK_ADMISSION_ENABLED", False):
+            return None
+        return cls(
+            max_in_flight=config.get("WEBHOOK_MAX_IN_FLIGHT", 8),
+            priority_reserved=config.get("WEBHOOK_PRIORITY_RESERVED", 0.25),
+            latency_threshold=config.get("WEBHOOK_SHED_DB_LATENCY_MS", 100) / 1000,
+            retry_after=config.get("WEBHOOK_RETRY_AFTER", 5),
+            priority_types=config.get("WEBHOOK_PRIORITY_EVENT_TYPES") or DEFAULT_PRIORITY_TYPES,
+        )
+
+    def is_priority(self, evt_type):
+        return evt_type in self.priority_types
+
+    def db_latency(self, now=None):
+        """Current estimate of mean statement time (seconds), decayed for the time without samples."""
+        now = time.monotonic() if now is None else now
+        return self._latency * 0.5 ** ((now - self._latency_at) / LATENCY_HALF_LIFE)
+
+    def try_acquire(self, evt_type):
+        """Take an in-flight slot for an event of `evt_type`; None if admitted, else the reason it was shed."""
+        priority = self.is_priority(evt_type)
+        with self._lock:
+            if self.in_flight >= (self.max_in_flight if priority else self.soft_limit):
+                reason = "in_flight"
+            elif self.in_flight and self.db_latency() > self.latency_threshold * (2 if priority else 1):
+                reason = "db_latency"
+            else:
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+                self.admitted[priority] += 1
+                return None
+            self.shed[(priority, reason)] = self.shed.get((priority, reason), 0) + 1
+            return reason
+
+    def release(self, statements=0, db_seconds=0.0):
+        """Give the slot back, feeding the request's SQL time into the latency estimate."""
+        now = time.monotonic()
+        with self._lock:
+            self.in_flight -= 1
+            if statements:
+                sample = db_seconds / statements
+                self._latency = self.db_latency(now) * (1 - LATENCY_ALPHA) + sample * LATENCY_ALPHA
+                self._latency_at = now
+
+    def stats(self):
+        with self._lock:
+            shed = lambda priority: sum(n for (p, _), n in self.shed.items() if p == priority)
+            return {
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "max_in_flight": self.max_in_flight,
+                "db_latency_seconds": round(self.db_latency(), 6),
+                "admitted_priority_total": self.admitted[True],
+                "admitted_other_total": self.admitted[False],
+                "shed_priority_total": shed(True),
+                "shed_other_total": shed(False),
+                "shed_in_flight_total": sum(n for (_, r), n in self.shed.items() if r == "in_flight"),
+                "shed_db_latency_total": sum(n for (_, r), n in self.shed.items() if r == "db_latency"),
+            }
+
+
+def get_admission():
+    """The app's Admission, or None when admission control is disabled."""
+    return current_app.extensions.get("admission")
@@ -0,0 +1,245 @@
+# app/webhooks/batch.py
+"""Bulk event processing for replays and backfills.
+
+`process_batch` applies N events with a fixed number of statements, no
+matter how big N is:
+
+1. one `IN (...)` query to drop event ids we have already recorded or
+   archived (event types no normalizer handles are dropped before that),
+2. one query for every touched Payment (by PaymentIntent id),
+3. the same normalization as the webhook (`normalize_event`), merged in memory
+   in `created` order (events older than the stored row are counted as stale),
+4. one `INSERT ... ON CONFLICT DO UPDATE ... RETURNING` for the Payments,
+5. one executemany applying each touched Order's paid-total delta,
+   then refund/dispute events one by one (`apply_refunds`; they are rare),
+6. one `INSERT ... ON CONFLICT DO NOTHING` for the PaymentEvents,
+
+then commits. Unlike the webhook, it never calls the Stripe API: a Payment
+whose events carry no `metadata.order_id` stays unlinked.
+"""
+
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import func, select
+from ..dbutil import dialect_insert, greatest
+from ..extensions import db
+from ..models import ArchivedEvent, Payment, PaymentEvent, EventStatus
+from ..payloads import encode_payload, loads
+from ..orders.totals import apply_order_deltas, succeeded_amount
+from .normalizers import PAYMENT_STATUS_RANK, Normalized, RefundEvent, normalize_event, resolve, supersedes
+from .processing import apply_refunds, newer_event, payment_status_rank
+
+PAYMENT_COLUMNS = (
+    "id", "order_id", "stripe_payment_intent_id", "currency", "amount_received", "status",
+    "amount_refunded", "method_type", "card_brand", "card_last4", "card_exp_month", "card_exp_year",
+    "last_event_created", "created_at", "updated_at",
+)
+
+
+@dataclass
+class BatchStats:
+    received: int = 0
+    duplicates: int = 0
+    recorded: int = 0
+    unhandled: int = 0
+    ignored: int = 0
+    stale: int = 0
+    payments: int = 0
+    orders: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def events_per_sec(self):
+        return self.received / self.elapsed if self.elapsed else 0.0
+
+    def __iadd__(self, other):
+        for field in self.__dataclass_fields__:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        return self
+
+
+def iter_jsonl_events(lines):
+    """Yield events from JSONL: one event per line, or `stripe events list` pages."""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        obj = loads(line)
+        if obj.get("object") == "list":
+            yield from obj.get("data", [])
+        else:
+            yield obj
+
+
+def process_events(events, batch_size=500):
+    """Apply an iterable of events in batches of `batch_size`; returns total BatchStats."""
+    total = BatchStats()
+    events = iter(events)
+    while True:
+        chunk = list(islice(events, batch_size))
+        if not chunk:
+            return total
+        total += process_batch(chunk)
+
+
+def process_batch(events):
+    started = time.perf_counter()
+    stats = BatchStats(received=len(events))
+
+    # 1. Dedupe: within the batch, then against what is already stored
+    by_id = {}
+    for event in events:
+        if resolve(event.get("type")) is None:
+            stats.ignored += 1
+            continue
+        by_id.setdefault(event.get("id"), event)
+    by_id.pop(None, None)
+    seen = set(
+        db.session.execute(
+            select(PaymentEvent.stripe_event_id).where(PaymentEvent.stripe_event_id.in_(list(by_id)))
+            .union_all(select(ArchivedEvent.stripe_event_id).where(ArchivedEvent.stripe_event_id.in_(list(by_id))))
+        ).scalars()
+    ) if by_id else set()
+    fresh = [e for evt_id, e in by_id.items() if evt_id not in seen]
+    stats.duplicates = len(events) - stats.ignored - len(fresh)
+    if not fresh:
+        stats.elapsed = time.perf_counter() - started
+        return stats
+
+    # Apply in Stripe creation order (`stripe events list` dumps are newest first)
+    fresh.sort(key=lambda e: e.get("created") or 0)
+    normalized = [(e, normalize_event(e)) for e in fresh]
+
+    # 2. Load every touched Payment in one query
+    pi_ids = {n.payment_intent_id for _, n in normalized if isinstance(n, Normalized)}
+    payments_table = Payment.__table__
+    existing = {}
+    if pi_ids:
+        rows = db.session.execute(
+            select(*[payments_table.c[c] for c in PAYMENT_COLUMNS])
+            .where(payments_table.c.stripe_payment_intent_id.in_(pi_ids))
+        ).mappings()
+        existing = {r["stripe_payment_intent_id"]: dict(r) for r in rows}
+
+    # 3. Merge events onto Payment rows in memory (same rules as apply_event)
+    now = datetime.utcnow()
+    merged = {}
+    old_totals = {}   # pi_id -> (paid, refunded) counted by its order before this batch
+    for _, n in normalized:
+        if n is None:
+            stats.unhandled += 1
+            continue
+        if isinstance(n, RefundEvent):
+            continue
+        row = merged.get(n.payment_intent_id)
+        if row is None:
+            row = existing.get(n.payment_intent_id)
+            linked = row is not None and row["order_id"] is not None
+            old_totals[n.payment_intent_id] = (
+                (succeeded_amount(row["status"], row["amount_received"]), row["amount_refunded"]) if linked else (0, 0)
+            )
+            if row is None:
+                row = dict.fromkeys(PAYMENT_COLUMNS)
+                row.update(
+                    id=str(uuid.uuid4()),
+                    stripe_payment_intent_id=n.payment_intent_id,
+                    currency=n.currency or "usd",
+                    amount_received=0,
+                    amount_refunded=0,
+                    created_at=now,
+                )
+            merged[n.payment_intent_id] = row
+        row["order_id"] = row["order_id"] or n.order_id
+        if row["status"] is not None and not supersedes(
+            row["last_event_created"], PAYMENT_STATUS_RANK.get(row["status"], 0),
+            n.created, PAYMENT_STATUS_RANK.get(n.status, 0),
+        ):
+            stats.stale += 1
+            continue
+        if n.created is not None:
+            row["last_event_created"] = n.created
+        row["currency"] = n.currency or row["currency"]
+        row["amount_received"] = max(row["amount_received"] or 0, n.amount_received or 0)
+        row["status"] = n.status or row["status"]
+        if n.card:
+            row["method_type"] = "card"
+            row["card_brand"] = n.card.get("brand")
+            row["card_last4"] = n.card.get("last4")
+            row["card_exp_month"] = n.card.get("exp_month")
+            row["card_exp_year"] = n.card.get("exp_year")
+        row["updated_at"] = now
+
+    # 4. Upsert Payments; RETURNING gives the real ids even if a concurrent
+    #    webhook inserted the same PaymentIntent after step 2.
+    payment_ids, written = {}, {}
+    if merged:
+        ins = dialect_insert(payments_table).values(list(merged.values()))
+        excluded = ins.excluded
+        ins = ins.on_conflict_do_update(
+            index_elements=[payments_table.c.stripe_payment_intent_id],
+            set_={
+                "order_id": func.coalesce(payments_table.c.order_id, excluded.order_id),
+                "currency": excluded.currency,
+                "amount_received": greatest(payments_table.c.amount_received, excluded.amount_received),
+                "status": excluded.status,
+                "method_type": excluded.method_type,
+                "card_brand": excluded.card_brand,
+                "card_last4": excluded.card_last4,
+                "card_exp_month": excluded.card_exp_month,
+                "card_exp_year": excluded.card_exp_year,
+                "last_event_created": func.coalesce(excluded.last_event_created, payments_table.c.last_event_created),
+                "updated_at": excluded.updated_at,
+            },
+            # A concurrent webhook may have applied a newer event since step 2
+            where=newer_event(
+                payments_table.c.last_event_created, payment_status_rank(payments_table.c.status),
+                excluded.last_event_created, payment_status_rank(excluded.status),
+            ),
+        ).returning(payments_table.c.stripe_payment_intent_id, payments_table.c.id)
+        written = dict(db.session.execute(ins).all())
+        stats.payments = len(written)
+        payment_ids = {pi_id: row["id"] for pi_id, row in existing.items()}
+        payment_ids.update(written)
+
+    # 5. Move each touched Order's totals by the batch's net change (a payment
+    #    linked by this batch brings along any refunds it already had)
+    deltas = {}
+    for pi_id, row in merged.items():
+        if row["order_id"] and pi_id in written:
+            old_paid, old_refunded = old_totals[pi_id]
+            paid, refunded = deltas.get(row["order_id"], (0, 0))
+            deltas[row["order_id"]] = (
+                paid + succeeded_amount(row["status"], row["amount_received"]) - old_paid,
+                refunded + row["amount_refunded"] - old_refunded,
+            )
+    stats.orders = apply_order_deltas(deltas)
+    for _, n in normalized:
+        if isinstance(n, RefundEvent):
+            payment_ids[n.payment_intent_id] = apply_refunds(n, lookup=False)
+
+    # 6. Record the events (a concurrent delivery of the same id wins quietly)
+    event_rows = []
+    for event, n in normalized:
+        event_rows.append({
+            "id": str(uuid.uuid4()),
+            "stripe_event_id": event["id"],
+            "type": event.get("type"),
+            "payload_data": encode_payload(event),
+            "received_at": now,
+            "payment_id": payment_ids.get(n.payment_intent_id) if n else None,
+            "payment_intent_id": n.payment_intent_id if n else None,
+            "status": EventStatus.PROCESSED,
+            "attempts": 0,
+            "processed_at": now,
+        })
+    ins = dialect_insert(PaymentEvent.__table__).values(event_rows).on_conflict_do_nothing(
+        index_elements=[PaymentEvent.__table__.c.stripe_event_id]
+    )
+    stats.recorded = db.session.execute(ins).rowcount
+
+    db.session.commit()
+    stats.elapsed = time.perf_counter() - started
+    return stats
@@ -0,0 +1,86 @@
+# app/webhooks/cli.py
+"""`flask webhooks ...` commands."""
+
+import signal
+import time
+import click
+from flask import current_app
+from .batch import iter_jsonl_events, process_events
+from .payload_backfill import compress_legacy_payloads
+from .routes import webhooks_bp
+from .worker import EventWorker, pending_backlog, retry_failed
+
+
+@webhooks_bp.cli.command("worker")
+@click.option("--threads", type=int, default=None, help="Worker threads (default: WEBHOOK_WORKER_THREADS).")
+@click.option("--batch-size", type=int, default=None, help="Events fetched per poll.")
+@click.option("--once", is_flag=True, help="Drain what is due now and exit.")
+def worker_command(threads, batch_size, once):
+    """Apply PENDING webhook events recorded in async ingest mode."""
+    app = current_app._get_current_object()
+    worker = EventWorker(app, threads=threads, batch_size=batch_size)
+
+    if once:
+        total = 0
+        while True:
+            n = worker.run_once()
+            if not n:
+                break
+            total += n
+        click.echo(f"processed {total} event(s)")
+        return
+
+    def _shutdown(signum, frame):
+        click.echo("stopping worker after in-flight events...")
+        worker.stop()
+
+    signal.signal(signal.SIGINT, _shutdown)
+    signal.signal(signal.SIGTERM, _shutdown)
+    worker.run_forever(poll_interval=app.config.get("WEBHOOK_WORKER_POLL_INTERVAL", 1.0))
+
+
+@webhooks_bp.cli.command("status")
+def status_command():
+    """Show the async ingest backlog."""
+    pending, failed = pending_backlog()
+    click.echo(f"pending={pending} failed={failed}")
+
+
+@webhooks_bp.cli.command("retry-failed")
+@click.argument("event_ids", nargs=-1)
+def retry_failed_command(event_ids):
+    """Requeue FAILED events (all, or the given Stripe event ids)."""
+    count = retry_failed(list(event_ids))
+    click.echo(f"requeued {count} event(s)")
+
+
+@webhooks_bp.cli.command("replay")
+@click.argument("source", type=click.File("r"))
+@click.option("--batch-size", type=int, default=500, show_default=True)
+def replay_command(source, batch_size):
+    """Apply Stripe events from a JSONL file ('-' for stdin) in bulk.
+
+    Each line is an event, or a `stripe events list` page. Already-recorded
+    event ids are skipped, so replays are safe to repeat.
+    """
+    started = time.perf_counter()
+    stats = process_events(iter_jsonl_events(source), batch_size=batch_size)
+    elapsed = time.perf_counter() - started
+    rate = stats.received / elapsed if elapsed else 0.0
+    click.echo(
+        f"replayed {stats.received} event(s): recorded={stats.recorded} duplicates={stats.duplicates} "
+        f"unhandled={stats.unhandled} ignored={stats.ignored} stale={stats.stale} payments={stats.payments} orders={stats.orders} "
+        f"in {elapsed:.2f}s ({rate:.0f} events/sec)"
+    )
+
+
+@webhooks_bp.cli.command("compress-payloads")
+@click.option("--chunk-size", type=int, default=1000, show_default=True)
+def compress_payloads_command(chunk_size):
+    """Convert legacy text payloads to the compressed format (resumable)."""
+    rows = before = after = 0
+    for n, b, a in compress_legacy_payloads(chunk_size=chunk_size):
+        rows, before, after = rows + n, before + b, after + a
+        click.echo(f"converted {rows} row(s) so far")
+    ratio = f" ({after / before:.1%} of original size)" if before else ""
+    click.echo(f"converted {rows} payload(s): {before} -> {after} bytes{ratio}")
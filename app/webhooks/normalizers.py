@@ -0,0 +1,235 @@
+# app/webhooks/normalizers.py
+"""Registry of per-event-type normalizers.
+
+A normalizer turns an event's `data.object` into a `Normalized` record
+(what the event says about its PaymentIntent's Payment) without touching
+the database or needing an app. Register one per exact event type, or per
+prefix by ending the key with a dot:
+
+    @register("charge.", pi_field="payment_intent")
+    def _charge(obj): ...
+
+`resolve(evt_type)` is a single dict lookup once a type has been seen;
+`None` means nobody handles the type and the event can be dropped before
+any DB work.
+
+`normalize_event` stamps the result with the event's `created` time, which
+the upserts use as a version: Stripe doesn't deliver in order, and an event
+older than the one already applied to a row is dropped. Events created in
+the same second are ordered by how far along the lifecycle their status is
+(`PAYMENT_STATUS_RANK`, `refund_status_rank`).
+"""
+
+from dataclasses import dataclass, replace
+from typing import Callable, Optional
+from ..models import PaymentStatus, RefundKind
+
+
+@dataclass(frozen=True, slots=True)
+class Normalized:
+    payment_intent_id: str
+    currency: Optional[str]
+    amount_received: int
+    status: PaymentStatus
+    method_type: Optional[str]
+    card: dict
+    order_id: Optional[str]
+    created: Optional[int] = None       # the event's `created` (unix seconds)
+
+
+@dataclass(frozen=True, slots=True)
+class RefundRecord:
+    refund_id: str              # re_... or dp_...
+    kind: RefundKind
+    charge_id: Optional[str]
+    amount: int
+    currency: Optional[str]
+    status: str
+    reason: Optional[str]
+
+    @property
+    def counted_amount(self):
+        """What this refund/dispute currently takes off its payment."""
+        counted = REFUND_COUNTED if self.kind == RefundKind.REFUND else DISPUTE_COUNTED
+        return self.amount if self.status in counted else 0
+
+
+@dataclass(frozen=True, slots=True)
+class RefundEvent:
+    """What a refund or dispute event says: refund rows for one PaymentIntent."""
+    payment_intent_id: str
+    refunds: tuple
+    order_id: Optional[str] = None
+    created: Optional[int] = None
+
+
+@dataclass(frozen=True, slots=True)
+class Handler:
+    normalize: Callable
+    pi_field: str       # data.object key holding the PaymentIntent id
+
+
+# Map Stripe status to enum if possible
+STATUS_ENUM_MAP = {
+    "requires_payment_method": PaymentStatus.REQUIRES_PAYMENT_METHOD,
+    "requires_confirmation": PaymentStatus.REQUIRES_CONFIRMATION,
+    "processing": PaymentStatus.PROCESSING,
+    "succeeded": PaymentStatus.SUCCEEDED,
+    "canceled": PaymentStatus.CANCELED,
+    "requires_action": PaymentStatus.REQUIRES_ACTION,
+}
+
+# Same-second tie-break between events: a later lifecycle stage wins
+PAYMENT_STATUS_RANK = {
+    PaymentStatus.REQUIRES_PAYMENT_METHOD: 0,
+    PaymentStatus.REQUIRES_CONFIRMATION: 1,
+    PaymentStatus.REQUIRES_ACTION: 2,
+    PaymentStatus.PROCESSING: 3,
+    PaymentStatus.SUCCEEDED: 4,
+    PaymentStatus.CANCELED: 4,
+}
+# Final refund/dispute statuses; anything else can still change
+REFUND_FINAL = frozenset({"succeeded", "failed", "canceled", "won", "lost", "warning_closed"})
+
+# Refunds count while pending or done; disputes from the moment funds are
+# withdrawn until the dispute is won (inquiries, "warning_*", never move money).
+REFUND_COUNTED = frozenset({"pending", "requires_action", "succeeded"})
+DISPUTE_COUNTED = frozenset({"needs_response", "under_review", "lost"})
+
+_EXACT = {}
+_PREFIXES = {}
+_resolved = {}          # evt_type -> Handler or None, filled on first sight
+_RESOLVED_MAX = 4096    # Stripe has a few hundred types; don't grow without bound
+
+
+def register(key, pi_field="id"):
+    """Decorator registering `fn(obj) -> Normalized | RefundEvent | None` for a type or "prefix."."""
+    def decorator(fn):
+        (_PREFIXES if key.endswith(".") else _EXACT)[key] = Handler(fn, pi_field)
+        _resolved.clear()
+        return fn
+    return decorator
+
+
+def resolve(evt_type):
+    """The Handler for `evt_type` (exact match first, then the longest prefix), or None."""
+    try:
+        return _resolved[evt_type]
+    except KeyError:
+        pass
+    handler = _EXACT.get(evt_type)
+    if handler is None and evt_type:
+        for prefix in sorted(_PREFIXES, key=len, reverse=True):
+            if evt_type.startswith(prefix):
+                handler = _PREFIXES[prefix]
+                break
+    if len(_resolved) < _RESOLVED_MAX:
+        _resolved[evt_type] = handler
+    return handler
+
+
+def payment_intent_id_for(evt_type, obj):
+    """Return the PaymentIntent id an event refers to, or None."""
+    handler = resolve(evt_type)
+    return obj.get(handler.pi_field) if handler else None
+
+
+def normalize_event(event):
+    """Extract the Payment fields carried by `event`, or None if it has no PI."""
+    handler = resolve(event.get("type"))
+    if handler is None:
+        return None
+    obj = event.get("data", {}).get("object", {})
+    if not obj.get(handler.pi_field):
+        return None
+    n = handler.normalize(obj)
+    created = event.get("created")
+    return replace(n, created=created) if n is not None and created is not None else n
+
+
+def refund_status_rank(status):
+    return 1 if status in REFUND_FINAL else 0
+
+
+def supersedes(old_created, old_rank, new_created, new_rank):
+    """Whether an event (created, rank) may overwrite a row last written at (created, rank).
+
+    Unversioned events (no `created`) and rows always accept.
+    """
+    if new_created is None or old_created is None:
+        return True
+    return old_created < new_created or (old_created == new_created and old_rank <= new_rank)
+
+
+def _record(obj, pi_field, currency, amount, status, card=None, method_type=None):
+    metadata = obj.get("metadata") or {}   # some events include metadata directly
+    return Normalized(
+        payment_intent_id=obj[pi_field],
+        currency=currency,
+        amount_received=amount or 0,
+        status=STATUS_ENUM_MAP.get((status or "").lower(), PaymentStatus.PROCESSING),
+        method_type=method_type,
+        card=card or {},
+        order_id=metadata.get("order_id"),
+    )
+
+
+@register("payment_intent.")
+def _payment_intent(obj):
+    method_type, card = None, {}
+    # Pull payment method details if available
+    pm = (obj.get("charges") or {}).get("data") or [{}]
+    if isinstance(pm, list) and pm[0].get("payment_method_details"):
+        pmd = pm[0]["payment_method_details"]
+        method_type = pmd.get("type")
+        card = pmd.get("card", {}) if method_type == "card" else {}
+    return _record(obj, "id", obj.get("currency"), obj.get("amount_received"), obj.get("status"), card, method_type)
+
+
+@register("charge.", pi_field="payment_intent")
+def _charge(obj):
+    status = "succeeded" if obj.get("paid") and obj.get("status") == "succeeded" else obj.get("status")
+    pmd = obj.get("payment_method_details") or {}
+    method_type = pmd.get("type")
+    card = pmd.get("card", {}) if method_type == "card" else {}
+    return _record(obj, "payment_intent", obj.get("currency"), obj.get("amount"), status, card, method_type)
+
+
+@register("checkout.session.completed", pi_field="payment_intent")
+def _checkout_completed(obj):
+    # amount_total may be on session, but we'll re-sync from PI if needed
+    return _record(obj, "payment_intent", obj.get("currency"), obj.get("amount_total"), "succeeded")
+
+
+def _refund(obj, kind=RefundKind.REFUND):
+    return RefundRecord(
+        refund_id=obj["id"],
+        kind=kind,
+        charge_id=obj.get("charge"),
+        amount=obj.get("amount") or 0,
+        currency=obj.get("currency"),
+        status=obj.get("status") or "",
+        reason=obj.get("reason"),
+    )
+
+
+@register("charge.refunded", pi_field="payment_intent")
+def _charge_refunded(obj):
+    # Older API versions embed the charge's refunds; newer ones send
+    # refund.created/updated for each instead, which land below.
+    refunds = (obj.get("refunds") or {}).get("data") or []
+    if not refunds:
+        return None
+    records = tuple(_refund({"charge": obj.get("id"), **r}) for r in refunds if r.get("id"))
+    return RefundEvent(obj["payment_intent"], records, (obj.get("metadata") or {}).get("order_id"))
+
+
+@register("charge.refund.updated", pi_field="payment_intent")
+@register("refund.", pi_field="payment_intent")
+def _refund_object(obj):
+    return RefundEvent(obj["payment_intent"], (_refund(obj),))
+
+
+@register("charge.dispute.", pi_field="payment_intent")
+def _dispute(obj):
+    return RefundEvent(obj["payment_intent"], (_refund(obj, RefundKind.DISPUTE),))
@@ -0,0 +1,44 @@
+# app/webhooks/payload_backfill.py
+"""Convert legacy plain-text PaymentEvent payloads to the compressed format."""
+
+from sqlalchemy import select, update, bindparam
+from ..extensions import db
+from ..models import PaymentEvent
+from ..payloads import encode_payload
+
+
+def compress_legacy_payloads(chunk_size=1000):
+    """Rewrite rows that still use `payload` (text) into `payload_data`.
+
+    Walks the table by primary key in chunks and commits after each, so it
+    can be interrupted and resumed. Yields (rows_converted, bytes_before,
+    bytes_after) per chunk. Rows truncated mid-JSON by the old 1 MB cut are
+    stored as-is (compressed), since there is nothing to re-parse.
+    """
+    table = PaymentEvent.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .values(payload_data=bindparam("b_data"), payload=None)
+    )
+    last_id = ""
+    while True:
+        rows = db.session.execute(
+            select(table.c.id, table.c.payload)
+            .where(table.c.id > last_id, table.c.payload.is_not(None), table.c.payload_data.is_(None))
+            .order_by(table.c.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+
+        params, before, after = [], 0, 0
+        for row_id, text in rows:
+            blob = encode_payload(text, bounded=False)
+            before += len(text)
+            after += len(blob)
+            params.append({"b_id": row_id, "b_data": blob})
+        db.session.execute(stmt, params)
+        db.session.commit()
+        yield len(rows), before, after
@@ -0,0 +1,354 @@
+# app/webhooks/processing.py
+"""Apply a verified Stripe event to Payment/Order rows.
+
+Shared by the webhook route (sync ingest) and the background worker
+(async ingest). Nothing here commits; callers own the transaction.
+"""
+
+import time
+import uuid
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import and_, case, func, literal, or_, select, update
+from ..dbutil import dialect_insert, greatest
+from ..extensions import db
+from ..metrics import get_metrics
+from ..models import ArchivedEvent, Payment, PaymentStatus, PaymentEvent, EventStatus, Refund
+from ..orders.totals import apply_order_delta, succeeded_amount
+from ..payloads import encode_payload
+from ..query_profiles import WEBHOOK_PAYMENT
+from ..stripe_cache import get_pi_cache
+from .normalizers import (  # noqa: F401  (re-exported)
+    PAYMENT_STATUS_RANK, REFUND_FINAL, Normalized, RefundEvent, normalize_event, payment_intent_id_for,
+    refund_status_rank,
+)
+
+
+def apply_event(event, pe):
+    """Normalize `event` onto its Payment (and Order) and link `pe` to it."""
+    n = normalize_event(event)
+    if n is None:
+        current_app.logger.info("Unhandled or non-PI event type: %s", event.get("type"))
+        return None
+    pe.payment_id = apply_normalized(n)
+    return pe.payment_id
+
+
+def apply_normalized(n, lookup=True):
+    """Apply a normalized event to its Payment (and refunds) and move its order's totals.
+
+    Returns the Payment id. Runs in the caller's transaction. With `lookup`,
+    a Payment with no order is linked via the PaymentIntent's metadata.
+    """
+    if isinstance(n, RefundEvent):
+        return apply_refunds(n, lookup)
+
+    metrics = get_metrics()
+    t = time.perf_counter()
+    row = upsert_payment(n)
+    t = metrics.stage("payment", t)
+    if row is None:
+        # Older than what the Payment already reflects: nothing to apply
+        current_app.logger.info("Stale event for %s (created=%s) dropped", n.payment_intent_id, n.created)
+        return db.session.execute(
+            select(Payment).options(*WEBHOOK_PAYMENT).where(Payment.stripe_payment_intent_id == n.payment_intent_id)
+        ).scalar_one().id
+    order_id, paid_delta, refunded_delta = row.order_id, row.paid_delta, row.refunded_delta
+
+    if order_id is None and lookup:
+        order_id, carried = _link_order(row.id, n.payment_intent_id)
+        t = metrics.stage("pi_lookup", t)
+        if carried:
+            paid_delta, refunded_delta = carried
+
+    if order_id and (paid_delta or refunded_delta):
+        _move_order_totals(order_id, paid_delta, refunded_delta)
+        metrics.stage("order", t)
+    return row.id
+
+
+def apply_refunds(r, lookup=True):
+    """Upsert the refund/dispute rows of a RefundEvent and move the totals by what changed.
+
+    Each refund is keyed by its Stripe id and remembers what it currently
+    counts (`counted_amount`), so a re-sent or updated refund only moves the
+    totals by the difference. A refund delivered before any event that
+    links its payment to an order is only counted on the Payment until the
+    upsert that links it carries it over (`refunded_delta`).
+    """
+    metrics = get_metrics()
+    t = time.perf_counter()
+    payments, refunds = Payment.__table__, Refund.__table__
+    now = datetime.utcnow()
+
+    # Get or create the Payment: a refund can be delivered before any event
+    # that created it. A bare placeholder counts nothing towards the order.
+    ins = dialect_insert(payments).values(
+        id=str(uuid.uuid4()),
+        stripe_payment_intent_id=r.payment_intent_id,
+        order_id=r.order_id,
+        currency=next((x.currency for x in r.refunds if x.currency), None) or "usd",
+        amount_received=0,
+        status=PaymentStatus.PROCESSING,
+        paid_delta=0,
+        amount_refunded=0,
+        refunded_delta=0,
+        created_at=now,
+        updated_at=now,
+    )
+    payment = db.session.execute(
+        ins.on_conflict_do_update(
+            index_elements=[payments.c.stripe_payment_intent_id], set_={"updated_at": ins.excluded.updated_at}
+        ).returning(payments.c.id, payments.c.order_id)
+    ).one()
+
+    refunded_delta = 0
+    for rec in r.refunds:
+        ins = dialect_insert(refunds).values(
+            id=str(uuid.uuid4()),
+            stripe_refund_id=rec.refund_id,
+            kind=rec.kind,
+            payment_id=payment.id,
+            stripe_charge_id=rec.charge_id,
+            amount=rec.amount,
+            currency=rec.currency,
+            status=rec.status,
+            reason=rec.reason,
+            counted_amount=rec.counted_amount,
+            counted_delta=rec.counted_amount,
+            last_event_created=r.created,
+            created_at=now,
+            updated_at=now,
+        )
+        excluded = ins.excluded
+        final = refunds.c.status.in_(REFUND_FINAL)
+        # A stale event updates nothing, returns no row and so counts 0
+        refunded_delta += db.session.execute(
+            ins.on_conflict_do_update(
+                index_elements=[refunds.c.stripe_refund_id],
+                set_={
+                    "amount": excluded.amount,
+                    "status": excluded.status,
+                    "reason": func.coalesce(excluded.reason, refunds.c.reason),
+                    "counted_amount": excluded.counted_amount,
+                    "counted_delta": excluded.counted_amount - refunds.c.counted_amount,
+                    "last_event_created": func.coalesce(excluded.last_event_created, refunds.c.last_event_created),
+                    "updated_at": excluded.updated_at,
+                },
+                where=newer_event(
+                    refunds.c.last_event_created, case((final, 1), else_=0),
+                    excluded.last_event_created, refund_status_rank(rec.status),
+                ),
+            ).returning(refunds.c.counted_delta)
+        ).scalar() or 0
+    t = metrics.stage("refund", t)
+
+    if refunded_delta:
+        db.session.execute(
+            update(payments)
+            .where(payments.c.id == payment.id)
+            .values(amount_refunded=payments.c.amount_refunded + refunded_delta, updated_at=now)
+        )
+
+    order_id, paid_delta = payment.order_id, 0
+    if order_id is None and lookup:
+        # Linking carries the payment's whole paid/refunded amounts over,
+        # including the refund just applied.
+        order_id, carried = _link_order(payment.id, r.payment_intent_id)
+        t = metrics.stage("pi_lookup", t)
+        if carried:
+            paid_delta, refunded_delta = carried
+        else:
+            refunded_delta = 0
+    if order_id and (paid_delta or refunded_delta):
+        _move_order_totals(order_id, paid_delta, refunded_delta)
+        metrics.stage("order", t)
+    return payment.id
+
+
+def _link_order(payment_id, payment_intent_id):
+    """Link an order-less Payment via its PaymentIntent's metadata.order_id.
+
+    Returns (order_id or None, (paid, refunded) carried over to the order, or
+    None when nothing was linked by this call).
+    """
+    if not current_app.config.get("STRIPE_API_KEY"):
+        return None, None
+    # The events haven't carried metadata.order_id, so look the PI up
+    # (cached, and coalesced with concurrent events for the same PI).
+    try:
+        order_id = get_pi_cache().get_metadata(payment_intent_id).get("order_id")
+    except Exception as e:
+        current_app.logger.info("PI retrieve failed or unnecessary: %s", e)
+        return None, None
+    if not order_id:
+        return None, None
+    payments = Payment.__table__
+    linked = db.session.execute(
+        update(payments)
+        .where(payments.c.id == payment_id, payments.c.order_id.is_(None))
+        .values(order_id=order_id)
+        .returning(payments.c.amount_received, payments.c.status, payments.c.amount_refunded)
+    ).first()
+    if linked is None:
+        return order_id, None   # linked concurrently; that transaction carried the totals
+    # Newly linked: the order has counted nothing from this payment yet
+    return order_id, (succeeded_amount(linked.status, linked.amount_received), linked.amount_refunded)
+
+
+def _move_order_totals(order_id, paid_delta, refunded_delta):
+    order = apply_order_delta(order_id, paid_delta, refunded_delta)
+    if order:
+        current_app.logger.info(
+            "order %s: total_paid=%s refunded=%s / amount_due=%s -> %s",
+            order_id, order.amount_paid, order.amount_refunded, order.amount_due, order.status.value,
+            extra={"order_id": order_id},
+        )
+
+
+def upsert_payment(n):
+    """Apply `n` to its Payment in one INSERT ... ON CONFLICT DO UPDATE ... RETURNING.
+
+    Merge rules: amount_received only grows, status follows the event, card
+    details are replaced when the event carries them, and order_id is set
+    once. An event older than the last one applied (`last_event_created`,
+    see `newer_event`) fails the upsert's WHERE and changes nothing.
+    `paid_delta` is computed by the statement itself from the row it
+    replaces (inside the SET, column references are the old values), so
+    concurrent events for the same PI serialize on the row and each one
+    gets the exact change it made to the order's paid total.
+
+    Returns (id, order_id, amount_received, status, paid_delta, refunded_delta),
+    or None for a stale event.
+    """
+    payments = Payment.__table__
+    c = payments.c
+    now = datetime.utcnow()
+    values = dict(
+        id=str(uuid.uuid4()),
+        stripe_payment_intent_id=n.payment_intent_id,
+        order_id=n.order_id,
+        currency=n.currency or "usd",
+        amount_received=n.amount_received or 0,
+        status=n.status,
+        paid_delta=succeeded_amount(n.status, n.amount_received),
+        refunded_delta=0,
+        last_event_created=n.created,
+        created_at=now,
+        updated_at=now,
+    )
+    card = n.card
+    if card:
+        values.update(
+            method_type="card",
+            card_brand=card.get("brand"),
+            card_last4=card.get("last4"),
+            card_exp_month=card.get("exp_month"),
+            card_exp_year=card.get("exp_year"),
+        )
+
+    ins = dialect_insert(payments).values(**values)
+    excluded = ins.excluded
+    new_amount = greatest(c.amount_received, excluded.amount_received)
+    new_paid = case((excluded.status == PaymentStatus.SUCCEEDED, new_amount), else_=0)
+    old_paid = case((c.status == PaymentStatus.SUCCEEDED, c.amount_received), else_=0)
+    set_ = {
+        "order_id": func.coalesce(c.order_id, excluded.order_id),
+        "currency": func.coalesce(literal(n.currency, c.currency.type), c.currency),
+        "amount_received": new_amount,
+        "status": excluded.status,
+        # An order that wasn't linked before has counted nothing of this payment
+        "paid_delta": case((c.order_id.is_(None), new_paid), else_=new_paid - old_paid),
+        # ...nor its refunds, if they arrived first
+        "refunded_delta": case((c.order_id.is_(None), c.amount_refunded), else_=0),
+        "last_event_created": func.coalesce(excluded.last_event_created, c.last_event_created),
+        "updated_at": excluded.updated_at,
+    }
+    if card:
+        for col in ("method_type", "card_brand", "card_last4", "card_exp_month", "card_exp_year"):
+            set_[col] = excluded[col]
+
+    stmt = ins.on_conflict_do_update(
+        index_elements=[c.stripe_payment_intent_id],
+        set_=set_,
+        where=newer_event(c.last_event_created, payment_status_rank(c.status),
+                          excluded.last_event_created, PAYMENT_STATUS_RANK.get(n.status, 0)),
+    ).returning(c.id, c.order_id, c.amount_received, c.status, c.paid_delta, c.refunded_delta)
+    return db.session.execute(stmt).first()
+
+
+def payment_status_rank(status):
+    """SQL for PAYMENT_STATUS_RANK[status]."""
+    return case(PAYMENT_STATUS_RANK, value=status, else_=0)
+
+
+def newer_event(row_created, row_rank, new_created, new_rank):
+    """SQL version of `normalizers.supersedes`, for an upsert's ON CONFLICT ... WHERE.
+
+    The row is only written if the incoming event is newer (or unversioned),
+    so a late event is dropped by the statement itself, without locking the
+    row first or reading it back.
+    """
+    return or_(
+        new_created.is_(None),
+        row_created.is_(None),
+        row_created < new_created,
+        and_(row_created == new_created, row_rank <= new_rank),
+    )
+
+
+def is_recorded(stripe_event_id):
+    """Whether the event id is stored (or archived): two primary-key/unique probes."""
+    return db.session.execute(
+        select(PaymentEvent.id).where(PaymentEvent.stripe_event_id == stripe_event_id)
+        .union_all(select(ArchivedEvent.stripe_event_id).where(ArchivedEvent.stripe_event_id == stripe_event_id))
+        .limit(1)
+    ).first() is not None
+
+
+def record_event(event, status, payment_id=None, payment_intent_id=None, raw=None):
+    """Insert the PaymentEvent row unless its Stripe event id is already stored.
+
+    `raw`, when given, is the body as received and is stored instead of a
+    re-serialization of `event`.
+
+    One `INSERT ... ON CONFLICT (stripe_event_id) DO NOTHING RETURNING id`:
+    returns the new row's id, or None for a duplicate, including one
+    delivered concurrently (the loser waits on the winner's row and then
+    sees the conflict) and one already archived.
+    """
+    metrics = get_metrics()
+    t = time.perf_counter()
+    payload = encode_payload(raw if raw is not None else event)  # compressed and size-bounded
+    t = metrics.stage("encode", t)
+    now = datetime.utcnow()
+    table = PaymentEvent.__table__
+    values = dict(
+        id=str(uuid.uuid4()),
+        stripe_event_id=event.get("id"),
+        type=event.get("type"),
+        payload_data=payload,
+        received_at=now,
+        payment_id=payment_id,
+        payment_intent_id=payment_intent_id,
+        status=status,
+        attempts=0,
+        processed_at=now if status == EventStatus.PROCESSED else None,
+    )
+    # INSERT ... SELECT ... WHERE NOT EXISTS: an archived id (see
+    # app/events/archive.py) is a duplicate too, in the same statement.
+    archived = select(ArchivedEvent.stripe_event_id).where(ArchivedEvent.stripe_event_id == values["stripe_event_id"])
+    row = select(*[literal(v, table.c[k].type).label(k) for k, v in values.items()]).where(~archived.exists())
+    stmt = dialect_insert(table).from_select(list(values), row).on_conflict_do_nothing(
+        index_elements=[table.c.stripe_event_id]
+    ).returning(table.c.id)
+    inserted = db.session.execute(stmt).scalar()
+    metrics.stage("record", t)
+    return inserted
+
+
+def link_event(event_row_id, payment_id):
+    """Point a PaymentEvent recorded before it was applied at its Payment."""
+    db.session.execute(
+        update(PaymentEvent.__table__).where(PaymentEvent.__table__.c.id == event_row_id).values(payment_id=payment_id)
+    )
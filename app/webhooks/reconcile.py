@@ -0,0 +1,327 @@
+# app/webhooks/reconcile.py
+"""Find missed webhooks: compare `payments` with a Stripe export.
+
+`reconcile_export(lines, fmt)` sort-merges two streams ordered by
+PaymentIntent id:
+
+- the export, read row by row and turned into PaymentIntent-shaped objects
+  (`iter_export`), then sorted externally: runs of `run_size` rows are sorted
+  in memory and spilled to temporary files, and the runs are merged with
+  `heapq.merge` (skipped with `presorted=True`);
+- `payments`, walked in keyset chunks on stripe_payment_intent_id (its unique
+  index), selecting only the compared columns.
+
+Neither side is ever held in full, so a run costs one pass over each and
+memory is bounded by `run_size` and `chunk_size`. Every export row goes
+through the same normalizer as a webhook (`normalize_event` on a synthesized
+event), so "what the export says" means exactly what a delivered event would
+have said. Each PaymentIntent where the two sides disagree is yielded as a
+`Discrepancy`.
+
+With `repair=True`, the synthesized events for missing and mismatched rows
+are applied through the bulk path (`process_events`). Their `created` is the
+export's as-of time, so the usual version check keeps any event applied
+after the export was taken. Their ids are deterministic, so a repeated
+repair is a no-op. The upsert only ever raises amount_received, so a payment
+whose local amount is higher than the export's can't be repaired that way:
+it is reported with `repairable=False` and left for a person to check.
+"""
+
+import csv
+import heapq
+import tempfile
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from itertools import groupby
+from sqlalchemy import select
+from ..dbutil import dialect_name
+from ..extensions import db
+from ..models import Payment
+from ..payloads import dumps_compact, loads
+from .batch import BatchStats, iter_jsonl_events, process_events
+from .normalizers import PAYMENT_STATUS_RANK, Normalized, normalize_event
+
+FORMATS = ("csv", "jsonl")
+
+# Currencies Stripe amounts have no minor unit for (dashboard CSVs give major units)
+ZERO_DECIMAL_CURRENCIES = frozenset({
+    "bif", "clp", "djf", "gnf", "jpy", "kmf", "krw", "mga", "pyg", "rwf", "ugx", "vnd", "vuv", "xaf", "xof", "xpf",
+})
+# Dashboard payment statuses -> PaymentIntent status
+CSV_STATUS = {
+    "paid": "succeeded",
+    "refunded": "succeeded",             # refunds are tracked separately (Refund rows)
+    "partially refunded": "succeeded",
+    "failed": "requires_payment_method",
+    "canceled": "canceled",
+    "uncaptured": "requires_capture",
+    "pending": "processing",
+}
+# PaymentIntent status -> the event type a webhook would have carried
+PI_EVENT_TYPE = {
+    "succeeded": "payment_intent.succeeded",
+    "canceled": "payment_intent.canceled",
+    "processing": "payment_intent.processing",
+    "requires_action": "payment_intent.requires_action",
+    "requires_payment_method": "payment_intent.payment_failed",
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Discrepancy:
+    payment_intent_id: str
+    kind: str                  # "missing", "amount" or "status" (amount wins when both differ)
+    local: tuple = None        # (amount_received, status) or None
+    export: tuple = None
+    repairable: bool = True    # False: local amount is higher, which a replayed event can't lower
+
+
+@dataclass
+class ReconcileStats:
+    export_rows: int = 0
+    local_rows: int = 0
+    matched: int = 0
+    missing: int = 0
+    amount_mismatch: int = 0
+    status_mismatch: int = 0
+    local_only: int = 0        # not in the export (it may cover a shorter period)
+    unrepairable: int = 0      # amount mismatches with the higher amount stored locally
+    elapsed: float = 0.0
+    repair: BatchStats = None
+
+    @property
+    def discrepancies(self):
+        return self.missing + self.amount_mismatch + self.status_mismatch
+
+    @property
+    def rows_per_sec(self):
+        return (self.export_rows + self.local_rows) / self.elapsed if self.elapsed else 0.0
+
+
+def _minor_units(amount, currency):
+    try:
+        value = Decimal(amount.replace(",", ""))
+    except (InvalidOperation, AttributeError):
+        raise ExportError(f"invalid amount {amount!r}")
+    return int(value if currency in ZERO_DECIMAL_CURRENCIES else value * 100)
+
+
+def _csv_object(row):
+    """A dashboard payments export row as a PaymentIntent-shaped object (None if it has no PaymentIntent)."""
+    fields, metadata = {}, {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        key = key.strip().lower()
+        if key.endswith(" (metadata)"):
+            metadata[key[:-len(" (metadata)")]] = value
+        else:
+            fields[key] = (value or "").strip()
+    pi_id = fields.get("paymentintent id") or fields.get("payment_intent") or ""
+    if not pi_id and fields.get("id", "").startswith("pi_"):
+        pi_id = fields["id"]
+    if not pi_id:
+        return None
+    currency = fields.get("currency", "").lower() or None
+    status = fields.get("status", "").lower()
+    status = CSV_STATUS.get(status, status.replace(" ", "_"))
+    amount = _minor_units(fields.get("amount") or "0", currency)
+    return {
+        "object": "payment_intent",
+        "id": pi_id,
+        "currency": currency,
+        "amount_received": amount if status == "succeeded" else 0,
+        "status": status,
+        "metadata": {k: v for k, v in metadata.items() if v},
+    }
+
+
+def iter_export(lines, fmt):
+    """PaymentIntent/charge objects from a Stripe export.
+
+    - jsonl: PaymentIntent or Charge objects, one per line, or `stripe ... list` pages;
+    - csv: a dashboard payments export (`PaymentIntent ID`, `Amount` in major
+      units, `Currency`, `Status`, `... (metadata)` columns).
+    """
+    if fmt == "csv":
+        for row in csv.DictReader(lines):
+            obj = _csv_object(row)
+            if obj is not None:
+                yield obj
+        return
+    if fmt != "jsonl":
+        raise ExportError(f"unknown format {fmt!r} (expected one of {', '.join(FORMATS)})")
+    for line in lines:
+        if not line.strip():
+            continue
+        obj = loads(line)
+        for o in obj.get("data", []) if obj.get("object") == "list" else [obj]:
+            if o.get("object") in ("payment_intent", "charge"):
+                yield o
+
+
+def synthesize_event(obj, as_of):
+    """The webhook event that would have reported `obj`'s current state, created at `as_of`."""
+    if obj.get("object") == "charge":
+        evt_type = f"charge.{obj.get('status') or 'updated'}"
+        pi_id = obj.get("payment_intent")
+    else:
+        evt_type = PI_EVENT_TYPE.get(obj.get("status"), "payment_intent.created")
+        pi_id = obj.get("id")
+    return {
+        "id": f"evt_reconcile_{pi_id}_{as_of}",
+        "object": "event",
+        "type": evt_type,
+        "created": as_of,
+        "data": {"object": obj},
+    }
+
+
+def _export_state(obj, as_of):
+    """(normalized, event) for an export object; normalized is None if it names no PaymentIntent."""
+    event = synthesize_event(obj, as_of)
+    n = normalize_event(event)
+    return (n if isinstance(n, Normalized) else None), event
+
+
+def _spill(run, stack):
+    f = stack.enter_context(tempfile.TemporaryFile("w+", encoding="utf-8"))
+    for key, payload in sorted(run, key=lambda r: r[0]):
+        f.write(f"{key}\t{payload}\n")
+    f.seek(0)
+    return ((line.split("\t", 1)[0], line.rstrip("\n").split("\t", 1)[1]) for line in f)
+
+
+def _keyed(objs):
+    """(pi_id, compact JSON) per export object that names a PaymentIntent."""
+    for obj in objs:
+        pi_id = obj.get("payment_intent") if obj.get("object") == "charge" else obj.get("id")
+        if pi_id:
+            yield pi_id, dumps_compact(obj).decode()
+
+
+def sort_export(pairs, run_size, stack):
+    """`_keyed` pairs ordered by PaymentIntent id: runs sorted in memory, spilled, then merged."""
+    runs, run = [], []
+    for pair in pairs:
+        run.append(pair)
+        if len(run) >= run_size:
+            runs.append(_spill(run, stack))
+            run = []
+    if not runs:
+        return iter(sorted(run, key=lambda r: r[0]))
+    if run:
+        runs.append(_spill(run, stack))
+    return heapq.merge(*runs, key=lambda r: r[0])
+
+
+def _ordered(pairs, side):
+    """Pass (key, value) pairs through, failing loudly if the keys are not ascending."""
+    last = None
+    for key, value in pairs:
+        if last is not None and key < last:
+            raise ExportError(f"{side} is not ordered by PaymentIntent id ({key!r} after {last!r})")
+        last = key
+        yield key, value
+
+
+def iter_local(chunk_size=1000):
+    """(pi_id, row) for every Payment in PaymentIntent id order, one keyset query per chunk."""
+    pi = Payment.stripe_payment_intent_id
+    if dialect_name() == "postgresql":
+        pi = pi.collate("C")   # byte order, like Python's str comparison
+    after = None
+    while True:
+        q = select(Payment.stripe_payment_intent_id, Payment.amount_received, Payment.status).order_by(pi).limit(chunk_size)
+        if after is not None:
+            q = q.where(pi > after)
+        rows = db.session.execute(q).all()
+        for row in rows:
+            yield row.stripe_payment_intent_id, row
+        if len(rows) < chunk_size:
+            return
+        after = rows[-1].stripe_payment_intent_id
+
+
+def _latest_per_pi(pairs, as_of):
+    """(pi_id, normalized, event) per PaymentIntent, keeping its most advanced export row."""
+    for pi_id, group in groupby(pairs, key=lambda r: r[0]):
+        best = None
+        for _, payload in group:
+            n, event = _export_state(loads(payload), as_of)
+            if n is None:
+                continue
+            if best is None or PAYMENT_STATUS_RANK.get(n.status, 0) >= PAYMENT_STATUS_RANK.get(best[0].status, 0):
+                best = (n, event)
+        if best is not None:
+            yield pi_id, best
+
+
+def reconcile_export(lines, fmt, as_of=None, repair=False, presorted=False, run_size=100_000,
+                     chunk_size=1000, repair_batch_size=500, stats=None):
+    """Yield a Discrepancy per PaymentIntent where `payments` and the export disagree.
+
+    `as_of` (unix seconds, default now) is when the export was taken. Pass a
+    ReconcileStats as `stats` to get counts; it is complete once the generator is exhausted.
+    """
+    stats = stats if stats is not None else ReconcileStats()
+    as_of = int(as_of or time.time())
+    started = time.perf_counter()
+
+    def counted(pairs, field):
+        for pair in pairs:
+            setattr(stats, field, getattr(stats, field) + 1)
+            yield pair
+
+    with ExitStack() as stack:
+        export = _keyed(counted(iter_export(lines, fmt), "export_rows"))
+        if not presorted:
+            export = sort_export(export, run_size, stack)
+        export = _latest_per_pi(_ordered(export, "export"), as_of)
+        local = _ordered(counted(iter_local(chunk_size), "local_rows"), "payments")
+        # Repair events wait in a temp file and are applied after the merge,
+        # so the keyset walk never sees its own writes.
+        repairs = stack.enter_context(tempfile.TemporaryFile("w+", encoding="utf-8")) if repair else None
+
+        ours, theirs = next(local, None), next(export, None)
+        while ours is not None or theirs is not None:
+            if theirs is None or (ours is not None and ours[0] < theirs[0]):
+                stats.local_only += 1
+                ours = next(local, None)
+                continue
+            pi_id, (n, event) = theirs
+            exported = (n.amount_received, n.status)
+            if ours is None or pi_id < ours[0]:
+                stats.missing += 1
+                discrepancy = Discrepancy(pi_id, "missing", None, exported)
+            else:
+                row = ours[1]
+                current = (row.amount_received, row.status)
+                ours = next(local, None)
+                if current == exported:
+                    stats.matched += 1
+                    discrepancy = None
+                elif row.amount_received != n.amount_received:
+                    stats.amount_mismatch += 1
+                    repairable = row.amount_received < n.amount_received
+                    stats.unrepairable += not repairable
+                    discrepancy = Discrepancy(pi_id, "amount", current, exported, repairable)
+                else:
+                    stats.status_mismatch += 1
+                    discrepancy = Discrepancy(pi_id, "status", current, exported)
+            theirs = next(export, None)
+            if discrepancy is not None:
+                if repairs is not None and discrepancy.repairable:
+                    repairs.write(dumps_compact(event).decode() + "\n")
+                yield discrepancy
+
+        if repairs is not None:
+            repairs.seek(0)
+            stats.repair = process_events(iter_jsonl_events(repairs), batch_size=repair_batch_size)
+    stats.elapsed = time.perf_counter() - started
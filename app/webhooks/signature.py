@@ -0,0 +1,46 @@
+# app/webhooks/signature.py
+"""Stripe-Signature verification on the raw request body.
+
+Same rules as `stripe.Webhook.construct_event` / `WebhookSignature.verify_header`:
+the header carries `t=<unix ts>` and one or more `v1=<hex HMAC-SHA256>`
+(other schemes are ignored); a match against HMAC(secret, "<t>.<body>") is
+required, and the timestamp may be at most `tolerance` seconds old. Unlike
+the library it works on bytes, so the body is never decoded or copied.
+"""
+
+import hashlib
+import hmac
+import time
+
+DEFAULT_TOLERANCE = 300
+
+
+class SignatureVerificationError(ValueError):
+    pass
+
+
+def verify_signature(payload, header, secret, tolerance=DEFAULT_TOLERANCE, now=None):
+    """Raise SignatureVerificationError unless `header` signs `payload` (bytes)."""
+    timestamp, signatures = None, []
+    try:
+        for item in header.split(","):
+            key, _, value = item.partition("=")
+            if key == "t":
+                timestamp = int(value)
+            elif key == "v1":
+                signatures.append(value)
+    except ValueError:
+        timestamp = None
+    if timestamp is None:
+        raise SignatureVerificationError("Unable to extract timestamp and signatures from header")
+    if not signatures:
+        raise SignatureVerificationError("No signatures found with expected scheme v1")
+
+    mac = hmac.new(secret.encode("utf-8"), b"%d." % timestamp, hashlib.sha256)
+    mac.update(payload)
+    expected = mac.hexdigest().encode()
+    if not any(hmac.compare_digest(expected, s.encode("utf-8", "replace")) for s in signatures):
+        raise SignatureVerificationError("No signatures found matching the expected signature for payload")
+
+    if tolerance and timestamp < (now if now is not None else time.time()) - tolerance:
+        raise SignatureVerificationError(f"Timestamp outside the tolerance zone ({timestamp})")
@@ -0,0 +1,181 @@
+# app/webhooks/worker.py
+"""Background worker that drains PENDING PaymentEvents recorded by async ingest.
+
+Ordering: events that share a PaymentIntent are applied one at a time in
+`received_at` order; different PaymentIntents run in parallel on a thread
+pool. If an event for a PI has to be retried, later events for that PI wait
+behind it until it succeeds or is marked FAILED.
+
+Every event is applied in its own transaction that starts by flipping the
+row PENDING -> PROCESSED with a conditional UPDATE, so two workers racing on
+the same row can't both apply it (the loser sees rowcount 0 and backs off).
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import aliased
+from ..extensions import db
+from ..logs import clear_context, new_context
+from ..models import PaymentEvent, EventStatus
+from .processing import apply_event
+
+
+class EventWorker:
+    def __init__(self, app, threads=None, batch_size=None, max_attempts=None,
+                 backoff_base=None, backoff_max=None):
+        cfg = app.config
+        self.app = app
+        self.threads = threads or cfg.get("WEBHOOK_WORKER_THREADS", 4)
+        self.batch_size = batch_size or cfg.get("WEBHOOK_WORKER_BATCH_SIZE", 500)
+        self.max_attempts = max_attempts or cfg.get("WEBHOOK_WORKER_MAX_ATTEMPTS", 8)
+        self.backoff_base = backoff_base if backoff_base is not None else cfg.get("WEBHOOK_WORKER_BACKOFF_BASE", 2.0)
+        self.backoff_max = backoff_max if backoff_max is not None else cfg.get("WEBHOOK_WORKER_BACKOFF_MAX", 300.0)
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def backoff(self, attempts):
+        """Seconds to wait before retry number `attempts` (1-based)."""
+        return min(self.backoff_base * (2 ** (attempts - 1)), self.backoff_max)
+
+    def run_forever(self, poll_interval=1.0):
+        self.app.logger.info("webhook worker started: threads=%s batch_size=%s", self.threads, self.batch_size)
+        with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="webhook-worker") as pool:
+            while not self._stop.is_set():
+                done = self.run_once(pool=pool)
+                if not done:
+                    self._stop.wait(poll_interval)
+        self.app.logger.info("webhook worker stopped")
+
+    def run_once(self, pool=None):
+        """Apply one batch of due events. Returns how many were applied or failed."""
+        groups = self._due_groups()
+        if not groups:
+            return 0
+        if pool is None:
+            with ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="webhook-worker") as own_pool:
+                return sum(own_pool.map(self._drain_group, groups))
+        return sum(pool.map(self._drain_group, groups))
+
+    def _due_groups(self):
+        """Ids of due PENDING events, grouped per PaymentIntent in arrival order.
+
+        The database returns only events that are due and have no earlier
+        PENDING event for their PI still backing off, so nothing overtakes an
+        event that is waiting for a retry, and backed-off rows never fill the
+        batch ahead of due ones.
+        """
+        with self.app.app_context():
+            rows = db.session.execute(due_events(datetime.utcnow(), self.batch_size)).all()
+
+        groups = OrderedDict()
+        for event_id, pi_id in rows:
+            key = pi_id or event_id  # events without a PI have no ordering constraint
+            groups.setdefault(key, []).append(event_id)
+        return list(groups.values())
+
+    def _drain_group(self, event_ids):
+        handled = 0
+        with self.app.app_context():
+            try:
+                for event_id in event_ids:
+                    if self._stop.is_set():
+                        break
+                    outcome = self._process_one(event_id)
+                    if outcome is None:
+                        break  # scheduled for retry; keep later events for this PI queued
+                    handled += outcome
+            finally:
+                clear_context()
+                db.session.remove()
+        return handled
+
+    def _process_one(self, event_id):
+        """Returns 1 if applied or terminally failed, 0 if skipped, None if retrying."""
+        try:
+            claimed = db.session.execute(
+                update(PaymentEvent)
+                .where(PaymentEvent.id == event_id, PaymentEvent.status == EventStatus.PENDING)
+                .values(status=EventStatus.PROCESSED, processed_at=datetime.utcnow(), last_error=None)
+            ).rowcount
+            if not claimed:
+                db.session.rollback()
+                return 0
+
+            pe = db.session.get(PaymentEvent, event_id)
+            new_context(event_id=pe.stripe_event_id, event_type=pe.type, payment_intent_id=pe.payment_intent_id)
+            apply_event(pe.payload_json, pe)
+            db.session.commit()
+            return 1
+        except Exception as e:
+            db.session.rollback()
+            return self._record_failure(event_id, e)
+
+    def _record_failure(self, event_id, exc):
+        pe = db.session.get(PaymentEvent, event_id)
+        pe.attempts = (pe.attempts or 0) + 1
+        pe.last_error = f"{type(exc).__name__}: {exc}"[:2000]
+        if pe.attempts >= self.max_attempts:
+            pe.status = EventStatus.FAILED
+            pe.next_attempt_at = None
+            outcome = 1
+        else:
+            pe.next_attempt_at = datetime.utcnow() + timedelta(seconds=self.backoff(pe.attempts))
+            outcome = None
+        retry = "giving up" if outcome else f"retry at {pe.next_attempt_at.isoformat()}"
+        db.session.commit()
+        self.app.logger.warning(
+            "webhook event %s attempt %s failed: %s (%s)", pe.stripe_event_id, pe.attempts, pe.last_error, retry,
+            extra={"event_id": pe.stripe_event_id, "payment_intent_id": pe.payment_intent_id},
+        )
+        return outcome
+
+
+def due_events(now, limit):
+    """(id, payment_intent_id) of the first `limit` PENDING events the worker may apply at `now`."""
+    earlier = aliased(PaymentEvent)
+    held = (
+        select(earlier.id)
+        .where(
+            earlier.status == EventStatus.PENDING,
+            earlier.payment_intent_id == PaymentEvent.payment_intent_id,
+            earlier.next_attempt_at > now,
+            earlier.received_at <= PaymentEvent.received_at,
+        )
+        .exists()
+    )
+    return (
+        select(PaymentEvent.id, PaymentEvent.payment_intent_id)
+        .where(
+            PaymentEvent.status == EventStatus.PENDING,
+            or_(PaymentEvent.next_attempt_at.is_(None), PaymentEvent.next_attempt_at <= now),
+            ~held,
+        )
+        .order_by(PaymentEvent.received_at)
+        .limit(limit)
+    )
+
+
+def pending_backlog():
+    """(pending, failed) counts; handy for health checks and the CLI."""
+    pending = PaymentEvent.query.filter(PaymentEvent.status == EventStatus.PENDING).count()
+    failed = PaymentEvent.query.filter(PaymentEvent.status == EventStatus.FAILED).count()
+    return pending, failed
+
+
+def retry_failed(event_ids=None):
+    """Move FAILED events back to PENDING so the worker picks them up again."""
+    stmt = (
+        update(PaymentEvent)
+        .where(PaymentEvent.status == EventStatus.FAILED)
+        .values(status=EventStatus.PENDING, attempts=0, next_attempt_at=None)
+    )
+    if event_ids:
+        stmt = stmt.where(or_(PaymentEvent.stripe_event_id.in_(event_ids), PaymentEvent.id.in_(event_ids)))
+    count = db.session.execute(stmt).rowcount
+    db.session.commit()
+    return count
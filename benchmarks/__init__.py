@@ -0,0 +1 @@
+"""Benchmarks for the webhook path; see benchmarks/README.md."""
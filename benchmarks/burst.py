@@ -0,0 +1,195 @@
+# benchmarks/burst.py
+"""Webhook burst with and without admission control (in-process, test clients).
+
+    python -m benchmarks.burst [--orders 200] [--concurrency 64] [--statement-ms 2]
+
+This is like Stripe redelivering a backlog after an outage. Every event of a
+synthetic stream (benchmarks/events.py) is posted at once from
+`--concurrency` threads. The database is made to saturate: each SQL
+statement first waits for one of `--db-capacity` slots and holds it for
+`--statement-ms`, so statement latency grows with the load, as it does on a
+busy Postgres. The same burst is run twice:
+
+- off: every event is accepted, as before admission control
+- on:  WEBHOOK_ADMISSION_ENABLED with `--max-in-flight` and
+       `--shed-latency-ms`; rejected events get 503
+
+Reported per mode:
+- accepted and shed counts, split into priority (money-moving) and
+  informational events,
+- latency percentiles of the accepted requests, and how many of them took
+  longer than `--timeout-ms`: Stripe counts those as failed and sends them
+  again although the work was done,
+- errors (other non-200s).
+
+After the burst, every event that did not get a 200 is redelivered one at a
+time until it does, like Stripe's retries. `drain_s` is the time until every
+event was applied. The final row counts show that shedding delays events
+but never loses them.
+"""
+
+import argparse
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from .events import generate, iter_bodies, sign
+from .webhooks import ENDPOINT, environ, make_app, reset_db, row_counts
+
+MODES = ("off", "on")
+MAX_RETRY_ROUNDS = 20
+
+
+@contextmanager
+def _slow_database(engine, capacity, statement_s):
+    """Make every statement queue for one of `capacity` slots and hold it for `statement_s`."""
+    from sqlalchemy import event as sa_event
+
+    slots = threading.BoundedSemaphore(capacity)
+
+    def before_cursor_execute(*args):
+        with slots:
+            time.sleep(statement_s)
+
+    sa_event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield
+    finally:
+        sa_event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _percentiles(latencies):
+    if not latencies:
+        return None
+    ms = sorted(x * 1000 for x in latencies)
+    q = statistics.quantiles(ms, n=100, method="inclusive") if len(ms) > 1 else ms * 99
+    return {"p50": round(q[49], 3), "p99": round(q[98], 3), "max": round(ms[-1], 3)}
+
+
+def _burst(app, events, concurrency):
+    """Post every (evt_id, type, body) at once; returns per-event (status, seconds) and the wall time."""
+    local = threading.local()
+
+    def post(item):
+        _, _, body = item
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        t = time.perf_counter()
+        status = local.client.post(ENDPOINT, data=body, headers={"Stripe-Signature": sign(body)}).status_code
+        return status, time.perf_counter() - t
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(post, events))
+    return results, time.perf_counter() - started
+
+
+def _redeliver(app, events):
+    """Retry events one at a time until each gets a 200; returns the number of rounds."""
+    client = app.test_client()
+    rounds = 0
+    while events and rounds < MAX_RETRY_ROUNDS:
+        rounds += 1
+        events = [e for e in events if client.post(ENDPOINT, data=e[2],
+                                                   headers={"Stripe-Signature": sign(e[2])}).status_code != 200]
+    return rounds, len(events)
+
+
+def run_mode(mode, stream, concurrency=64, db_capacity=4, statement_ms=2.0, max_in_flight=4,
+             shed_latency_ms=25.0, timeout_ms=1000.0):
+    """One burst in `mode` ("on" or "off") against a fresh SQLite database."""
+    from app.extensions import db
+    from app.webhooks.admission import DEFAULT_PRIORITY_TYPES
+
+    tmpdir = tempfile.mkdtemp(prefix="webhook-burst-")
+    try:
+        with environ(WEBHOOK_ADMISSION_ENABLED="1" if mode == "on" else "0", WEBHOOK_MAX_IN_FLIGHT=max_in_flight,
+                     WEBHOOK_SHED_DB_LATENCY_MS=shed_latency_ms):
+            app = make_app(f"sqlite:///{tmpdir}/burst.db")
+        reset_db(app, stream.orders)
+        admission = app.extensions["admission"]
+        is_priority = admission.is_priority if admission else (lambda t: t in DEFAULT_PRIORITY_TYPES)
+        events = [(evt_id, event["type"], body) for event, (evt_id, body) in zip(stream.events, iter_bodies(stream))]
+
+        with app.app_context():
+            engine = db.engine
+        with _slow_database(engine, db_capacity, statement_ms / 1000):
+            started = time.perf_counter()
+            results, elapsed = _burst(app, events, concurrency)
+
+        counts = {kind: {"accepted": 0, "timed_out": 0, "shed": 0, "errors": 0} for kind in ("priority", "other")}
+        accepted_latency = {"priority": [], "other": []}
+        for (_, evt_type, _), (status, seconds) in zip(events, results):
+            kind = "priority" if is_priority(evt_type) else "other"
+            if status == 200:
+                counts[kind]["accepted"] += 1
+                accepted_latency[kind].append(seconds)
+                counts[kind]["timed_out"] += seconds * 1000 > timeout_ms
+            else:
+                counts[kind]["shed" if status == 503 else "errors"] += 1
+        retry = [e for e, (status, _) in zip(events, results) if status != 200]
+        retry_rounds, lost = _redeliver(app, retry)
+        drained = time.perf_counter() - started
+
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "drain_s": round(drained, 3),
+            "counts": counts,
+            "accepted_latency_ms": {kind: _percentiles(v) for kind, v in accepted_latency.items()},
+            "admission": admission.stats() if admission else None,
+            "redelivered": len(retry),
+            "retry_rounds": retry_rounds,
+            "lost": lost,
+            "rows": row_counts(app),
+        }
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def run(orders=200, seed=1, concurrency=64, db_capacity=4, statement_ms=2.0, max_in_flight=4,
+        shed_latency_ms=25.0, timeout_ms=1000.0):
+    stream = generate(n_orders=orders, seed=seed)
+    params = {"orders": orders, "seed": seed, "concurrency": concurrency, "db_capacity": db_capacity,
+              "statement_ms": statement_ms, "max_in_flight": max_in_flight, "shed_latency_ms": shed_latency_ms,
+              "timeout_ms": timeout_ms}
+    result = {mode: run_mode(mode, stream, concurrency, db_capacity, statement_ms, max_in_flight, shed_latency_ms,
+                             timeout_ms)
+              for mode in MODES}
+    return {"benchmark": "burst", "params": params, "stream": stream.stats, "result": result}
+
+
+def format_report(report):
+    lines = []
+    for mode, r in report["result"].items():
+        lines.append(f"burst [admission {mode}] burst {r['elapsed_s']}s, drained {r['drain_s']}s, "
+                     f"redelivered {r['redelivered']} in {r['retry_rounds']} rounds, lost {r['lost']}, rows {r['rows']}")
+        for kind, c in r["counts"].items():
+            lat = r["accepted_latency_ms"][kind]
+            lat = f" p50={lat['p50']}ms p99={lat['p99']}ms" if lat else ""
+            lines.append(f"  {kind:8} accepted={c['accepted']} (timed out {c['timed_out']}) shed={c['shed']} "
+                         f"errors={c['errors']}{lat}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--db-capacity", type=int, default=4, help="Statements the fake database runs at once.")
+    parser.add_argument("--statement-ms", type=float, default=2.0, help="Time each statement holds a slot.")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="SQLite has one writer: keep this small.")
+    parser.add_argument("--shed-latency-ms", type=float, default=25.0)
+    parser.add_argument("--timeout-ms", type=float, default=1000.0, help="Sender's timeout, scaled to the burst.")
+    args = parser.parse_args(argv)
+    report = run(args.orders, args.seed, args.concurrency, args.db_capacity, args.statement_ms,
+                 args.max_in_flight, args.shed_latency_ms, args.timeout_ms)
+    print("\n".join(format_report(report)))
+
+
+if __name__ == "__main__":
+    main()
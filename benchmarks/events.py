@@ -0,0 +1,173 @@
+# benchmarks/events.py
+"""Synthetic, correctly signed Stripe event streams.
+
+`generate()` builds a stream the way Stripe delivers it to one endpoint:
+
+- orders paid by 1-3 PaymentIntents (installments), each going through
+  payment_intent.created -> processing -> succeeded plus charge.succeeded,
+  with some paid through Checkout (checkout.session.completed instead of
+  the charge);
+- lifecycles of many orders interleaved;
+- a share of deliveries repeated later (Stripe retries: same event id);
+- a share of adjacent deliveries swapped (out-of-order arrival).
+
+The stream is deterministic for a given seed so results are comparable
+across commits. Sign each body just before sending with `sign()`; the
+signature's timestamp has to be fresh.
+"""
+
+import hashlib
+import hmac
+import json
+import random
+import time
+from dataclasses import dataclass, field
+
+TEST_WEBHOOK_SECRET = "whsec_benchmark"
+
+CARDS = (
+    {"brand": "visa", "last4": "4242", "exp_month": 12, "exp_year": 2030},
+    {"brand": "mastercard", "last4": "4444", "exp_month": 6, "exp_year": 2029},
+    {"brand": "amex", "last4": "0005", "exp_month": 3, "exp_year": 2031},
+)
+
+
+@dataclass
+class Stream:
+    events: list                       # in delivery order; duplicates are the same dict
+    orders: dict                       # order_id -> amount_due (minor units)
+    stats: dict = field(default_factory=dict)
+
+
+def sign(body, secret=TEST_WEBHOOK_SECRET, timestamp=None):
+    """Stripe-Signature header value for `body` (str)."""
+    ts = int(timestamp if timestamp is not None else time.time())
+    mac = hmac.new(secret.encode(), f"{ts}.{body}".encode(), hashlib.sha256).hexdigest()
+    return f"t={ts},v1={mac}"
+
+
+def generate(n_orders=200, seed=1, duplicate_rate=0.05, reorder_rate=0.05,
+             checkout_rate=0.2, max_payments=3, concurrency=50):
+    """Return a `Stream` for `n_orders` orders (about 4 events per PaymentIntent)."""
+    rng = random.Random(seed)
+    orders = {}
+    lifecycles = []
+    clock = 1_700_000_000
+
+    for i in range(n_orders):
+        order_id = f"order_{seed}_{i}"
+        amount_due = rng.randrange(1_000, 50_000, 100)
+        orders[order_id] = amount_due
+        n_payments = rng.randint(1, max_payments)
+        for k, amount in enumerate(_split(amount_due, n_payments, rng)):
+            pi_id = f"pi_{seed}_{i}_{k}"
+            checkout = rng.random() < checkout_rate
+            lifecycles.append(_lifecycle(pi_id, order_id, amount, clock, checkout, rng))
+            clock += 10
+
+    events = _interleave(lifecycles, concurrency, rng)
+    n_unique = len(events)
+
+    # Swap adjacent deliveries: the later event arrives first
+    swapped = 0
+    for j in range(len(events) - 1):
+        if rng.random() < reorder_rate:
+            events[j], events[j + 1] = events[j + 1], events[j]
+            swapped += 1
+
+    # Re-deliver some events a little later, as Stripe retries do
+    duplicates = 0
+    for j in range(n_unique - 1, -1, -1):
+        if rng.random() < duplicate_rate:
+            events.insert(min(len(events), j + rng.randint(1, 20)), events[j])
+            duplicates += 1
+
+    # One unrelated event type now and then, which the handler ignores
+    for j in range(0, len(events), 97):
+        events.insert(j, {"id": f"evt_{seed}_cus_{j}", "type": "customer.created",
+                          "created": clock, "data": {"object": {"id": f"cus_{j}", "object": "customer"}}})
+
+    return Stream(events=events, orders=orders, stats={
+        "orders": n_orders,
+        "payment_intents": len(lifecycles),
+        "events": len(events),
+        "unique_events": len({e["id"] for e in events}),
+        "handled_events": len({e["id"] for e in events if e["type"] != "customer.created"}),
+        "duplicates": duplicates,
+        "reordered": swapped,
+    })
+
+
+def iter_bodies(stream):
+    """Serialized event bodies, in delivery order."""
+    for event in stream.events:
+        yield event["id"], json.dumps(event)
+
+
+def _split(total, parts, rng):
+    if parts == 1:
+        return [total]
+    cuts = sorted(rng.sample(range(100, total, 100), parts - 1))
+    return [b - a for a, b in zip([0] + cuts, cuts + [total])]
+
+
+def _lifecycle(pi_id, order_id, amount, created, checkout, rng):
+    card = rng.choice(CARDS)
+    metadata = {"order_id": order_id}
+
+    def pi(evt, status, received, t, charges=()):
+        return {
+            "id": f"evt_{pi_id}_{evt}",
+            "object": "event",
+            "type": f"payment_intent.{evt}",
+            "created": created + t,
+            "livemode": False,
+            "data": {"object": {
+                "id": pi_id, "object": "payment_intent", "amount": amount,
+                "amount_received": received, "currency": "usd", "status": status,
+                "metadata": metadata, "charges": {"object": "list", "data": list(charges)},
+                "payment_method_types": ["card"],
+            }},
+        }
+
+    charge = {
+        "id": f"ch_{pi_id}", "object": "charge", "payment_intent": pi_id, "amount": amount,
+        "currency": "usd", "paid": True, "status": "succeeded",
+        "payment_method_details": {"type": "card", "card": card},
+    }
+    events = [
+        pi("created", "requires_payment_method", 0, 0),
+        pi("processing", "processing", 0, 1),
+        pi("succeeded", "succeeded", amount, 2, charges=[charge]),
+    ]
+    if checkout:
+        events.append({
+            "id": f"evt_{pi_id}_checkout", "object": "event", "type": "checkout.session.completed",
+            "created": created + 3, "livemode": False,
+            "data": {"object": {
+                "id": f"cs_{pi_id}", "object": "checkout.session", "payment_intent": pi_id,
+                "amount_total": amount, "currency": "usd", "payment_status": "paid",
+                "metadata": metadata,
+            }},
+        })
+    else:
+        events.append({
+            "id": f"evt_{pi_id}_charge", "object": "event", "type": "charge.succeeded",
+            "created": created + 3, "livemode": False, "data": {"object": charge},
+        })
+    return events
+
+
+def _interleave(lifecycles, concurrency, rng):
+    """Merge lifecycles as if `concurrency` payments were in flight at once."""
+    pending = [list(reversed(lc)) for lc in lifecycles]
+    active, out, nxt = [], [], 0
+    while active or nxt < len(pending):
+        while len(active) < concurrency and nxt < len(pending):
+            active.append(pending[nxt])
+            nxt += 1
+        lc = rng.choice(active)
+        out.append(lc.pop())
+        if not lc:
+            active.remove(lc)
+    return out
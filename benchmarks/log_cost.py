@@ -0,0 +1,127 @@
+# benchmarks/log_cost.py
+"""Logging cost per webhook request, on the request thread (no app, no DB).
+
+    python -m benchmarks.log_cost [--requests 20000] [--rounds 3]
+
+Each simulated request starts a log context, logs two INFO lines with
+%-style arguments and the summary line with `extra=` fields, the same
+shape as a real webhook request. Output goes to a temporary file. Compared:
+
+- legacy:       the old "JSON-ish" format string, written synchronously
+- json-sync:    JsonFormatter, written synchronously
+- json-async:   JsonFormatter behind the QueueHandler (the default)
+- json-sampled: json-async with LOG_SAMPLE_RATE=0.1
+- disabled:     logger at WARNING, %-style calls; `fstring-disabled` is the
+                same with f-strings, which still format every message
+
+For async modes `drain_us_per_request` is the listener's time to write the
+backlog, which is paid off the request thread. `--stall-ms` makes every
+`--stall-every`th write block, like stderr behind a busy log shipper: the
+synchronous modes pay those stalls in their p99, the async ones do not.
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+
+from app.logs import AsyncLogging, ContextFilter, JsonFormatter, bind, clear_context, new_context
+
+MODES = ("legacy", "json-sync", "json-async", "json-sampled", "disabled", "fstring-disabled")
+_LEGACY_FORMAT = '{"level": "%(levelname)s", "msg": "%(message)s", "name": "%(name)s"}'
+
+
+class _StallingFile:
+    """A file whose every `every`th write blocks for `stall` seconds."""
+
+    def __init__(self, f, stall, every):
+        self.f, self.stall, self.every, self.writes = f, stall, every, 0
+
+    def write(self, s):
+        self.writes += 1
+        if self.stall and self.writes % self.every == 0:
+            time.sleep(self.stall)
+        return self.f.write(s)
+
+    def flush(self):
+        self.f.flush()
+
+
+class _Payload:
+    """Something with a non-trivial __str__, like an event fragment."""
+
+    def __str__(self):
+        return repr({"id": "pi_3Nxyz", "amount_received": 1000, "currency": "usd", "status": "succeeded"})
+
+
+def _logger(mode, stream):
+    logger = logging.Logger(f"bench.{mode}")
+    target = logging.StreamHandler(stream)
+    target.setFormatter(logging.Formatter(_LEGACY_FORMAT) if mode == "legacy" else JsonFormatter())
+    queued = None
+    handler = target
+    if mode in ("json-async", "json-sampled"):
+        queued = AsyncLogging(target, maxsize=1_000_000)
+        handler = queued.handler
+    if mode != "legacy":
+        handler.addFilter(ContextFilter(0.1 if mode == "json-sampled" else 1.0))
+    logger.addHandler(handler)
+    logger.setLevel(logging.WARNING if mode.endswith("disabled") else logging.INFO)
+    return logger, queued
+
+
+def _request(logger, i, payload, fstrings, sampled):
+    new_context(request_id=f"{i:016x}", method="POST", path="/webhooks/stripe", sampled=sampled)
+    bind(event_id=f"evt_{i}", event_type="payment_intent.succeeded", payment_intent_id=f"pi_{i}")
+    if fstrings:
+        logger.info(f"Event payload {payload}")
+        logger.info(f"order order_{i}: total_paid={1000} refunded={0} / amount_due={1000} -> PAID")
+    else:
+        logger.info("Event payload %s", payload)
+        logger.info("order %s: total_paid=%s refunded=%s / amount_due=%s -> %s", f"order_{i}", 1000, 0, 1000, "PAID")
+    logger.info("request", extra={"status": 200, "latency_ms": 1.234})
+    clear_context()
+
+
+def run(requests=20000, rounds=3, stall_ms=0.0, stall_every=500):
+    payload = _Payload()
+    results = {}
+    for mode in MODES:
+        best = drain = float("inf")
+        for _ in range(rounds):
+            with tempfile.TemporaryFile("w+") as f:
+                logger, queued = _logger(mode, _StallingFile(f, stall_ms / 1000, stall_every))
+                timings = []
+                for i in range(requests):
+                    t = time.perf_counter()
+                    _request(logger, i, payload, mode == "fstring-disabled", sampled=i % 10 == 0)
+                    timings.append(time.perf_counter() - t)
+                if queued is not None:
+                    t = time.perf_counter()
+                    queued.stop()
+                    drain = min(drain, time.perf_counter() - t)
+            if sum(timings) < best:
+                best = sum(timings)
+                timings.sort()
+                p99 = timings[int(len(timings) * 0.99)]
+        results[mode] = {"us_per_request": round(best / requests * 1e6, 2), "p99_us": round(p99 * 1e6, 2)}
+        if drain != float("inf"):
+            results[mode]["drain_us_per_request"] = round(drain / requests * 1e6, 2)
+    return {"requests": requests, "stall_ms": stall_ms, "result": results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--stall-ms", type=float, default=0.0, help="Block the sink this long...")
+    parser.add_argument("--stall-every", type=int, default=500, help="...every this many writes.")
+    args = parser.parse_args(argv)
+    report = run(args.requests, args.rounds, args.stall_ms, args.stall_every)
+    for mode, r in report["result"].items():
+        drain = f" (+{r['drain_us_per_request']}us drained off-thread)" if "drain_us_per_request" in r else ""
+        print(f"log cost [{mode}] {r['us_per_request']}us/request p99={r['p99_us']}us{drain}")
+
+
+if __name__ == "__main__":
+    main()
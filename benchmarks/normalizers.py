@@ -0,0 +1,37 @@
+# benchmarks/normalizers.py
+"""CPU per event of the normalizer registry, on a synthetic stream (no app, no DB).
+
+    python -m benchmarks.normalizers [--orders 2000] [--rounds 5]
+"""
+
+import argparse
+import time
+
+from app.webhooks.normalizers import normalize_event
+
+from .events import generate
+
+
+def run(orders=2000, rounds=5):
+    events = generate(n_orders=orders).events
+    normalize_event(events[0])  # warm up
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.process_time()
+        for event in events:
+            normalize_event(event)
+        best = min(best, time.process_time() - started)
+    return {"events": len(events), "us_per_event": round(best / len(events) * 1e6, 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args(argv)
+    r = run(args.orders, args.rounds)
+    print(f"normalizers: {r['events']} events, {r['us_per_event']}us/event (best of {args.rounds})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# benchmarks/parsing.py
+"""Per-event CPU of the webhook's verify/parse/store steps, old path vs fast path.
+
+    python -m benchmarks.parsing [--iterations 2000] [--json-backend stdlib]
+
+old:  body.decode() -> stripe.Webhook.construct_event -> encode_payload(re-dumped event)
+fast: verify_signature(raw bytes) -> payloads.loads(raw) -> encode_payload(raw)
+
+Measured in process CPU time, for a small PaymentIntent event and a large
+Checkout session (hundreds of line items). No database involved.
+"""
+
+import argparse
+import json
+import time
+
+import stripe
+
+from app import payloads
+from app.payloads import encode_payload
+from app.webhooks.signature import verify_signature
+
+from .events import TEST_WEBHOOK_SECRET, generate, sign
+from .webhooks import RESULTS_DIR, _git_commit
+
+
+def sample_events():
+    small = next(e for e in generate(n_orders=1).events if e["type"] == "payment_intent.succeeded")
+    items = [{
+        "id": f"li_{i}", "object": "item", "amount_subtotal": 1999, "amount_total": 1999,
+        "currency": "usd", "description": f"Line item {i} " + "x" * 40, "quantity": 1,
+        "price": {"id": f"price_{i}", "object": "price", "unit_amount": 1999, "currency": "usd",
+                  "product": f"prod_{i}", "metadata": {"sku": f"SKU-{i:05d}"}},
+    } for i in range(300)]
+    large = {
+        "id": "evt_checkout_large", "object": "event", "type": "checkout.session.completed",
+        "created": 1_700_000_000, "livemode": False,
+        "data": {"object": {
+            "id": "cs_large", "object": "checkout.session", "payment_intent": "pi_large",
+            "amount_total": 1999 * len(items), "currency": "usd", "payment_status": "paid",
+            "metadata": {"order_id": "order_large"},
+            "line_items": {"object": "list", "data": items, "has_more": False},
+        }},
+    }
+    # Stripe sends pretty-printed JSON
+    return {"small": json.dumps(small, indent=2).encode(), "large": json.dumps(large, indent=2).encode()}
+
+
+def old_path(raw, header):
+    event = stripe.Webhook.construct_event(payload=raw.decode("utf-8"), sig_header=header,
+                                           secret=TEST_WEBHOOK_SECRET)
+    return event, encode_payload(event)
+
+
+def fast_path(raw, header):
+    verify_signature(raw, header, TEST_WEBHOOK_SECRET)
+    return payloads.loads(raw), encode_payload(raw)
+
+
+def measure(fn, raw, iterations):
+    header = sign(raw.decode("utf-8"))
+    fn(raw, header)  # warm up
+    started = time.process_time()
+    for _ in range(iterations):
+        fn(raw, header)
+    return (time.process_time() - started) / iterations * 1e6
+
+
+def run(iterations=2000, backend="auto"):
+    saved = payloads.orjson
+    if backend == "stdlib":
+        payloads.orjson = None
+    try:
+        results = {}
+        for name, raw in sample_events().items():
+            n = max(20, iterations // 20) if name == "large" else iterations
+            old_us, fast_us = measure(old_path, raw, n), measure(fast_path, raw, n)
+            results[name] = {
+                "bytes": len(raw), "iterations": n,
+                "old_us": round(old_us, 1), "fast_us": round(fast_us, 1),
+                "speedup": round(old_us / fast_us, 2),
+            }
+        return {
+            "benchmark": "parsing",
+            "commit": _git_commit(),
+            "json_backend": "orjson" if payloads.orjson is not None else "stdlib",
+            "result": results,
+        }
+    finally:
+        payloads.orjson = saved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--json-backend", choices=("auto", "stdlib"), default="auto")
+    parser.add_argument("--save", action="store_true", help=f"write JSON to {RESULTS_DIR}")
+    args = parser.parse_args(argv)
+
+    report = run(args.iterations, args.json_backend)
+    print(f"parsing [{report['json_backend']}]")
+    for name, r in report["result"].items():
+        print(f"  {name:<6} {r['bytes']:>7} bytes  old={r['old_us']}us  fast={r['fast_us']}us  x{r['speedup']}")
+    if args.save:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        path = RESULTS_DIR / f"parsing-{report['json_backend']}-{int(time.time())}-{report['commit'] or 'nogit'}.json"
+        path.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"  saved {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+# benchmarks/serve.py
+"""The app as the benchmark runner serves it in a separate process.
+
+Configuration comes from the environment (the runner sets
+SQLALCHEMY_DATABASE_URI and STRIPE_WEBHOOK_SECRET); BENCH_LOG_LEVEL sets
+the app logger's level. Gunicorn loads `benchmarks.serve:build_app()`;
+`python -m benchmarks.serve` runs Werkzeug's forking server.
+"""
+
+import argparse
+import logging
+import os
+
+
+def build_app():
+    from app import create_app
+
+    app = create_app()
+    app.logger.setLevel(os.getenv("BENCH_LOG_LEVEL", "WARNING"))
+    return app
+
+
+def main(argv=None):
+    from werkzeug.serving import run_simple
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=4, help="worker processes (forked per request)")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    run_simple(args.host, args.port, build_app(), threaded=False, processes=args.workers)
+
+
+if __name__ == "__main__":
+    main()
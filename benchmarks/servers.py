@@ -0,0 +1,38 @@
+# benchmarks/servers.py
+"""Dev server vs production profile on the same event stream.
+
+    python -m benchmarks.servers [--orders 200] [--concurrency 16]
+
+Runs the webhook benchmark against `flask run --debug` (the old Procfile)
+and against gunicorn with gunicorn.conf.py, saves both results and prints
+how the production profile compares.
+"""
+
+import argparse
+import os
+
+from .webhooks import RESULTS_DIR, compare, format_report, run, save
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=max(2, os.cpu_count() or 1))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--out", default=str(RESULTS_DIR))
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    reports = []
+    for server in ("flask-dev", "gunicorn"):
+        report = run("server", orders=args.orders, server=server, workers=args.workers,
+                     concurrency=args.concurrency)
+        print("\n".join(format_report(report)))
+        if not args.no_save:
+            print(f"  saved {save(report, args.out)}")
+        reports.append(report)
+    print("\n".join(["flask-dev -> gunicorn"] + compare(*reports)[1:]))
+
+
+if __name__ == "__main__":
+    main()
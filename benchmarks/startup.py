@@ -0,0 +1,100 @@
+# benchmarks/startup.py
+"""Process startup cost: `import app` and create_app() per mode, in fresh interpreters.
+
+    python -m benchmarks.startup [--runs 5] [--save]
+
+Each run is a new `python -X importtime` process, so nothing is cached in
+sys.modules (the OS file cache is warm after the first run; the best of
+`--runs` is reported). Also lists the modules with the largest self import
+time, which is where to look when the import budget in
+tests/test_startup.py starts failing.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .webhooks import RESULTS_DIR, _git_commit
+
+ROOT = Path(__file__).resolve().parent.parent
+MODES = ("web", "cli")
+
+_PROBE = """
+import time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+app.create_app({mode!r})
+t2 = time.perf_counter()
+print(f"{{(t1 - t0) * 1000:.3f}} {{(t2 - t1) * 1000:.3f}}")
+"""
+
+
+def parse_importtime(stderr):
+    """{module: (self_us, cumulative_us)} from `python -X importtime` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def probe(mode, env=None):
+    """One fresh interpreter: (import_ms, create_app_ms, importtime modules)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        proc_env = {**os.environ, "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp}/startup.db", **(env or {})}
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _PROBE.format(mode=mode)],
+            cwd=ROOT, env=proc_env, capture_output=True, text=True, check=True,
+        )
+    import_ms, create_ms = (float(x) for x in proc.stdout.split())
+    return import_ms, create_ms, parse_importtime(proc.stderr)
+
+
+def run(runs=5, top=10):
+    results = {}
+    for mode in MODES:
+        samples = [probe(mode) for _ in range(runs)]
+        best = min(samples, key=lambda s: s[0] + s[1])
+        modules = best[2]
+        results[mode] = {
+            "import_ms": round(best[0], 1),
+            "create_app_ms": round(best[1], 1),
+            "modules": len(modules),
+            "top_self_ms": {
+                name: round(self_us / 1000, 1)
+                for name, (self_us, _) in sorted(modules.items(), key=lambda kv: -kv[1][0])[:top]
+            },
+            "heavy_imported": sorted(m for m in ("stripe", "alembic", "flask_migrate") if m in modules),
+        }
+    return {"benchmark": "startup", "commit": _git_commit(), "runs": runs, "result": results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--save", action="store_true", help=f"write JSON to {RESULTS_DIR}")
+    args = parser.parse_args(argv)
+
+    report = run(args.runs)
+    for mode, r in report["result"].items():
+        print(f"startup [{mode}] import={r['import_ms']}ms create_app={r['create_app_ms']}ms "
+              f"modules={r['modules']} heavy={','.join(r['heavy_imported']) or '-'}")
+        for name, ms in r["top_self_ms"].items():
+            print(f"    {ms:>7}ms  {name}")
+    if args.save:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        path = RESULTS_DIR / f"startup-{int(time.time())}-{report['commit'] or 'nogit'}.json"
+        path.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"  saved {path}")
+
+
+if __name__ == "__main__":
+    main()
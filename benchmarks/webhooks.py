@@ -0,0 +1,371 @@
+# benchmarks/webhooks.py
+"""Throughput/latency benchmark for POST /webhooks/stripe.
+
+    python -m benchmarks.webhooks --orders 500                  # test client, in-process
+    python -m benchmarks.webhooks --mode server --workers 4 --concurrency 16
+    python -m benchmarks.webhooks --compare old.json new.json
+    python -m benchmarks.servers                                # flask dev server vs gunicorn profile
+
+Each run seeds the orders of a synthetic stream (benchmarks/events.py) into
+a fresh database, delivers every event signed with the benchmark secret,
+and reports latency percentiles, events/sec, SQL statements per event
+(test-client mode only: server workers are separate processes) and how
+much the database grew. Results are written to benchmarks/results/ as JSON.
+
+The database is a temporary SQLite file unless --database-url is given;
+its tables are dropped and recreated, so never point it at real data.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from .events import TEST_WEBHOOK_SECRET, generate, iter_bodies, sign
+
+RESULTS_DIR = Path(__file__).parent / "results"
+SERVERS = ("werkzeug", "gunicorn", "flask-dev")
+ENDPOINT = "/webhooks/stripe"
+
+
+# --- database ----------------------------------------------------------------
+
+def bench_env(database_url):
+    return {
+        "SQLALCHEMY_DATABASE_URI": database_url,
+        "STRIPE_WEBHOOK_SECRET": TEST_WEBHOOK_SECRET,
+        "STRIPE_API_KEY": "",  # never call Stripe; events carry metadata.order_id
+    }
+
+
+@contextmanager
+def environ(**values):
+    """Set environment variables for create_app, restoring the old values afterwards."""
+    saved = {k: os.environ.get(k) for k in values}
+    os.environ.update({k: str(v) for k, v in values.items()})
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def make_app(database_url, log_level="WARNING"):
+    """The app on `database_url`, configured for the benchmark; the environment is left as it was."""
+    from app import create_app
+
+    with environ(**bench_env(database_url)):
+        app = create_app()
+    app.logger.setLevel(log_level)
+    return app
+
+
+def reset_db(app, orders):
+    from app.extensions import db
+    from app.models import Order, OrderStatus
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add_all(
+            Order(id=oid, currency="usd", amount_due=due, status=OrderStatus.AWAITING_PAYMENT)
+            for oid, due in orders.items()
+        )
+        db.session.commit()
+        db.session.remove()
+
+
+def db_size(app):
+    """Bytes used by the database (SQLite file + WAL, or pg_database_size)."""
+    from sqlalchemy import text
+    from app.extensions import db
+
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name == "sqlite":
+            with engine.connect() as conn:   # fold the WAL back in so only table data is measured
+                conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+            path = engine.url.database
+            return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+        if engine.dialect.name == "postgresql":
+            with engine.connect() as conn:
+                return conn.execute(text("SELECT pg_database_size(current_database())")).scalar()
+    return None
+
+
+def row_counts(app):
+    from app.extensions import db
+    from app.models import Payment, PaymentEvent
+
+    with app.app_context():
+        counts = {"payments": db.session.query(Payment).count(), "payment_events": db.session.query(PaymentEvent).count()}
+        db.session.remove()
+        return counts
+
+
+# --- drivers -----------------------------------------------------------------
+
+def run_test_client(app, stream):
+    """Deliver the stream sequentially through Flask's test client."""
+    from sqlalchemy import event as sa_event
+    from app.extensions import db
+
+    client = app.test_client()
+    statements = [0]
+
+    def count(*args):
+        statements[0] += 1
+
+    with app.app_context():
+        engine = db.engine
+    latencies, errors = [], 0
+    sa_event.listen(engine, "before_cursor_execute", count)
+    started = time.perf_counter()
+    try:
+        for _, body in iter_bodies(stream):
+            headers = {"Stripe-Signature": sign(body), "Content-Type": "application/json"}
+            t0 = time.perf_counter()
+            resp = client.post(ENDPOINT, data=body, headers=headers)
+            latencies.append(time.perf_counter() - t0)
+            errors += resp.status_code != 200
+    finally:
+        elapsed = time.perf_counter() - started
+        sa_event.remove(engine, "before_cursor_execute", count)
+    return latencies, errors, elapsed, statements[0]
+
+
+def run_server(stream, database_url, server, workers, concurrency, log_level):
+    """Start a multi-worker server in a subprocess and deliver over HTTP."""
+    port = _free_port()
+    env = dict(os.environ, **bench_env(database_url), BENCH_LOG_LEVEL=log_level)
+    if server == "gunicorn":
+        # The production profile (gunicorn.conf.py), with the worker count overridden
+        if shutil.which("gunicorn") is None:
+            raise SystemExit("gunicorn is not installed")
+        env.update(WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{port}", GUNICORN_LOG_LEVEL="warning")
+        cmd = ["gunicorn", "-c", "gunicorn.conf.py", "benchmarks.serve:build_app()"]
+    elif server == "flask-dev":
+        # What the Procfile used to run (minus the reloader, which forks a child we couldn't stop)
+        cmd = [sys.executable, "-m", "flask", "--app", "benchmarks.serve:build_app()", "run",
+               "--debug", "--no-reload", "--port", str(port)]
+    else:
+        cmd = [sys.executable, "-m", "benchmarks.serve", "--port", str(port), "--workers", str(workers)]
+    proc = subprocess.Popen(cmd, env=env, cwd=Path(__file__).parent.parent,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_ready(port, proc)
+        return _deliver_http(stream, port, concurrency)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def _deliver_http(stream, port, concurrency):
+    local = threading.local()
+
+    def post(item):
+        _, body = item
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            conn = local.conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        headers = {"Stripe-Signature": sign(body), "Content-Type": "application/json"}
+        t0 = time.perf_counter()
+        try:
+            conn.request("POST", ENDPOINT, body=body.encode(), headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            status = resp.status
+            if resp.getheader("Connection", "").lower() == "close" or resp.version == 10:
+                conn.close()
+                local.conn = None
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            local.conn = None
+            status = 0
+        return time.perf_counter() - t0, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(post, iter_bodies(stream)))
+    elapsed = time.perf_counter() - started
+    latencies = [lat for lat, _ in results]
+    errors = sum(status != 200 for _, status in results)
+    return latencies, errors, elapsed, None
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(port, proc, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"server exited with {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/healthz")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise SystemExit("server did not become ready")
+
+
+# --- reporting ---------------------------------------------------------------
+
+def summarize(latencies, errors, elapsed, statements):
+    ms = sorted(x * 1000 for x in latencies)
+    q = statistics.quantiles(ms, n=100, method="inclusive") if len(ms) > 1 else ms * 99
+    return {
+        "events": len(ms),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "events_per_sec": round(len(ms) / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            "p50": round(q[49], 3), "p95": round(q[94], 3), "p99": round(q[98], 3),
+            "mean": round(statistics.fmean(ms), 3), "max": round(ms[-1], 3),
+        },
+        "statements_per_event": round(statements / len(ms), 2) if statements is not None else None,
+    }
+
+
+def run(mode="client", orders=200, seed=1, workers=4, concurrency=8, server="werkzeug",
+        database_url=None, log_level="WARNING"):
+    """Run one benchmark and return the result dict."""
+    stream = generate(n_orders=orders, seed=seed)
+    tmpdir = None
+    if database_url is None:
+        tmpdir = tempfile.mkdtemp(prefix="webhook-bench-")
+        database_url = f"sqlite:///{tmpdir}/bench.db"
+    try:
+        app = make_app(database_url, log_level)
+        reset_db(app, stream.orders)
+        size_before = db_size(app)
+        if mode == "client":
+            measured = run_test_client(app, stream)
+        else:
+            measured = run_server(stream, database_url, server, workers, concurrency, log_level)
+        size_after = db_size(app)
+        result = summarize(*measured)
+        result["rows"] = row_counts(app)
+        if size_before is not None:
+            result["db_bytes"] = {
+                "before": size_before, "after": size_after, "growth": size_after - size_before,
+                "growth_per_event": round((size_after - size_before) / max(1, stream.stats["unique_events"]), 1),
+            }
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    return {
+        "benchmark": "webhooks",
+        "mode": mode,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {"orders": orders, "seed": seed, "log_level": log_level,
+                   "dialect": database_url.split(":", 1)[0],
+                   **({"server": server, "workers": workers, "concurrency": concurrency} if mode == "server" else {})},
+        "stream": stream.stats,
+        "result": result,
+    }
+
+
+def save(report, out_dir=RESULTS_DIR):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stamp = report["timestamp"].replace(":", "").replace("-", "")
+    path = out_dir / f"{report['benchmark']}-{report['mode']}-{stamp}-{report['commit'] or 'nogit'}.json"
+    path.write_text(json.dumps(report, indent=2) + "\n")
+    return path
+
+
+def compare(old, new):
+    """Lines describing how the headline numbers moved from `old` to `new`."""
+    a, b = old["result"], new["result"]
+    rows = [("events/sec", a["events_per_sec"], b["events_per_sec"])]
+    rows += [(f"{k} ms", a["latency_ms"][k], b["latency_ms"][k]) for k in ("p50", "p95", "p99")]
+    rows.append(("statements/event", a.get("statements_per_event"), b.get("statements_per_event")))
+    rows.append(("db bytes/event", (a.get("db_bytes") or {}).get("growth_per_event"),
+                 (b.get("db_bytes") or {}).get("growth_per_event")))
+    lines = [f"{old['commit']} -> {new['commit']}"]
+    for name, x, y in rows:
+        change = f"{(y - x) / x * 100:+.1f}%" if x and y is not None else "n/a"
+        lines.append(f"  {name:<18} {x!s:>10} -> {y!s:>10}  {change}")
+    return lines
+
+
+def format_report(report):
+    r = report["result"]
+    lat = r["latency_ms"]
+    lines = [
+        f"{report['benchmark']} [{report['mode']}] {report['params']}",
+        f"  events={r['events']} errors={r['errors']} elapsed={r['elapsed_s']}s events/sec={r['events_per_sec']}",
+        f"  latency ms: p50={lat['p50']} p95={lat['p95']} p99={lat['p99']} max={lat['max']}",
+        f"  statements/event={r['statements_per_event']} rows={r['rows']}",
+    ]
+    if "db_bytes" in r:
+        lines.append(f"  db growth={r['db_bytes']['growth']} bytes ({r['db_bytes']['growth_per_event']} per event)")
+    return lines
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("client", "server", "both"), default="client")
+    parser.add_argument("--orders", type=int, default=200, help="orders in the synthetic stream (~8 events each)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--server", choices=SERVERS, default="werkzeug")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads in server mode")
+    parser.add_argument("--database-url", help="default: a temporary SQLite file (tables are recreated!)")
+    parser.add_argument("--log-level", default="WARNING", help="app logger level during the run")
+    parser.add_argument("--out", default=str(RESULTS_DIR), help="directory for the JSON results")
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two saved results and exit")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        old, new = (json.loads(Path(p).read_text()) for p in args.compare)
+        print("\n".join(compare(old, new)))
+        return
+
+    modes = ("client", "server") if args.mode == "both" else (args.mode,)
+    for mode in modes:
+        report = run(mode, orders=args.orders, seed=args.seed, workers=args.workers,
+                     concurrency=args.concurrency, server=args.server,
+                     database_url=args.database_url, log_level=args.log_level)
+        print("\n".join(format_report(report)))
+        if not args.no_save:
+            print(f"  saved {save(report, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# gunicorn.conf.py
+"""Production server profile: `gunicorn wsgi:app` (this file is picked up from the cwd).
+
+gthread workers: one process per CPU, a few threads each, so a webhook
+waiting on the database or the Stripe API doesn't hold a whole process.
+The app is preloaded in the master (create_app and mapper configuration
+run once) and each worker disposes the inherited engine pools after fork,
+so no pooled connection is ever shared between processes.
+
+Environment:
+    PORT / BIND             listen address (default 0.0.0.0:8000)
+    WEB_CONCURRENCY         worker processes (default: CPU count, at least 2)
+    GUNICORN_THREADS        threads per worker (default 4); also the default DB_POOL_SIZE
+    GUNICORN_TIMEOUT        seconds before a stuck worker is killed (default 30)
+    GUNICORN_GRACEFUL_TIMEOUT  seconds in-flight requests get to finish on shutdown (default 30)
+"""
+
+import os
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", str(max(2, os.cpu_count() or 1))))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+preload_app = True
+
+# SIGTERM: stop accepting, let in-flight webhooks commit, then exit. Stripe
+# retries anything we never answered, so a cut-off request is not lost.
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+keepalive = 5
+
+# Heartbeat file on tmpfs rather than disk, where available
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG") or None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+# One pooled connection per thread, unless configured otherwise. Must be set
+# before the app (and so Config) is loaded.
+os.environ.setdefault("DB_POOL_SIZE", str(threads))
+
+
+def when_ready(server):
+    # Runs in the master after preload, before any worker forks: configure
+    # the mappers now instead of in every worker on its first query, and
+    # warm the seen-events filter once for all workers (inherited on fork,
+    # or shared through SEEN_FILTER_PATH).
+    from sqlalchemy.orm import configure_mappers
+
+    configure_mappers()
+    app = server.app.wsgi()
+    seen = app.extensions.get("seen_events")
+    if seen is not None:
+        from app.extensions import db
+
+        with app.app_context():
+            seen.warm()
+            db.session.remove()
+
+
+def post_fork(server, worker):
+    # Connections opened by the master (e.g. during preload) must not be
+    # used by the child; drop them from the child's pools without closing
+    # the sockets the parent may still own.
+    from app.extensions import db
+
+    app = server.app.wsgi()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
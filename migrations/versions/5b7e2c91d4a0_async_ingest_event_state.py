@@ -0,0 +1,43 @@
+"""async ingest: processing state on payment_events
+
+Revision ID: 5b7e2c91d4a0
+Revises: 40c4af8a8994
+Create Date: 2026-10-17 09:12:40.114310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e2c91d4a0'
+down_revision = '40c4af8a8994'
+branch_labels = None
+depends_on = None
+
+eventstatus = sa.Enum('PENDING', 'PROCESSED', 'FAILED', name='eventstatus')
+
+
+def upgrade():
+    eventstatus.create(op.get_bind(), checkfirst=True)
+
+    # Existing rows were applied synchronously, so they start out PROCESSED.
+    op.add_column('payment_events', sa.Column('payment_intent_id', sa.String(), nullable=True))
+    op.add_column('payment_events', sa.Column('status', eventstatus, nullable=False, server_default='PROCESSED'))
+    op.add_column('payment_events', sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('payment_events', sa.Column('next_attempt_at', sa.DateTime(), nullable=True))
+    op.add_column('payment_events', sa.Column('last_error', sa.Text(), nullable=True))
+    op.add_column('payment_events', sa.Column('processed_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_payment_events_status_received_at', 'payment_events', ['status', 'received_at'])
+
+
+def downgrade():
+    op.drop_index('ix_payment_events_status_received_at', table_name='payment_events')
+    with op.batch_alter_table('payment_events') as batch_op:
+        batch_op.drop_column('processed_at')
+        batch_op.drop_column('last_error')
+        batch_op.drop_column('next_attempt_at')
+        batch_op.drop_column('attempts')
+        batch_op.drop_column('status')
+        batch_op.drop_column('payment_intent_id')
+    eventstatus.drop(op.get_bind(), checkfirst=True)
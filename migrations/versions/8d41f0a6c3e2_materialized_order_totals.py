@@ -0,0 +1,39 @@
+"""materialized order totals (amount_paid / amount_refunded)
+
+Revision ID: 8d41f0a6c3e2
+Revises: 5b7e2c91d4a0
+Create Date: 2026-10-17 11:02:17.552019
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41f0a6c3e2'
+down_revision = '5b7e2c91d4a0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('orders', sa.Column('amount_paid', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('orders', sa.Column('amount_refunded', sa.Integer(), nullable=False, server_default='0'))
+
+    # Seed the totals from the payments we already have; from here on they
+    # are maintained incrementally (`flask orders reconcile` re-checks them).
+    op.execute(
+        """
+        UPDATE orders SET amount_paid = (
+            SELECT coalesce(sum(p.amount_received), 0)
+            FROM payments AS p
+            WHERE p.order_id = orders.id AND p.status = 'SUCCEEDED'
+        )
+        """
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('orders') as batch_op:
+        batch_op.drop_column('amount_refunded')
+        batch_op.drop_column('amount_paid')
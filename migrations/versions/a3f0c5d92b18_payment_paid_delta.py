@@ -0,0 +1,26 @@
+"""payments.paid_delta for single-statement webhook upserts
+
+Revision ID: a3f0c5d92b18
+Revises: e6f13b8a90d4
+Create Date: 2026-10-17 16:02:44.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f0c5d92b18'
+down_revision = 'e6f13b8a90d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Only meaningful right after a write; existing rows start at 0.
+    op.add_column('payments', sa.Column('paid_delta', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('payments') as batch_op:
+        batch_op.drop_column('paid_delta')
@@ -0,0 +1,29 @@
+"""archived_event_ids: ids of events moved out of payment_events
+
+Revision ID: b91e3f6d0c48
+Revises: c7d1e94f2a05
+Create Date: 2026-10-17 19:12:40.271836
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b91e3f6d0c48'
+down_revision = 'c7d1e94f2a05'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'archived_event_ids',
+        sa.Column('stripe_event_id', sa.String(), nullable=False),
+        sa.Column('received_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('stripe_event_id'),
+    )
+
+
+def downgrade():
+    op.drop_table('archived_event_ids')
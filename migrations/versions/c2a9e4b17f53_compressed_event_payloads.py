@@ -0,0 +1,29 @@
+"""compressed event payloads (payment_events.payload_data)
+
+Revision ID: c2a9e4b17f53
+Revises: 8d41f0a6c3e2
+Create Date: 2026-10-17 13:40:51.207733
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2a9e4b17f53'
+down_revision = '8d41f0a6c3e2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # New rows go to payload_data; existing text payloads stay readable and
+    # are converted in chunks by `flask webhooks compress-payloads`.
+    op.add_column('payment_events', sa.Column('payload_data', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    # Run this only after decoding payload_data back into payload, or the
+    # compressed payloads are lost.
+    with op.batch_alter_table('payment_events') as batch_op:
+        batch_op.drop_column('payload_data')
@@ -0,0 +1,32 @@
+"""last_event_created on payments and refunds, for dropping out-of-order events;
+payments.refunded_delta for refunds counted before the payment was linked
+
+Revision ID: c7d1e94f2a05
+Revises: f4b8d2e6a1c7
+Create Date: 2026-10-17 18:05:12.540973
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7d1e94f2a05'
+down_revision = 'f4b8d2e6a1c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # NULL until the next event: existing rows accept whatever arrives first.
+    op.add_column('payments', sa.Column('last_event_created', sa.BigInteger(), nullable=True))
+    op.add_column('refunds', sa.Column('last_event_created', sa.BigInteger(), nullable=True))
+    op.add_column('payments', sa.Column('refunded_delta', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('refunds') as batch_op:
+        batch_op.drop_column('last_event_created')
+    with op.batch_alter_table('payments') as batch_op:
+        batch_op.drop_column('refunded_delta')
+        batch_op.drop_column('last_event_created')
@@ -0,0 +1,40 @@
+"""indexes for keyset pagination on (created_at, id) in the reporting API
+
+Revision ID: d58a2c7e9f31
+Revises: b91e3f6d0c48
+Create Date: 2026-10-17 20:03:18.664210
+
+"""
+from contextlib import nullcontext
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd58a2c7e9f31'
+down_revision = 'b91e3f6d0c48'
+branch_labels = None
+depends_on = None
+
+
+def _index_block():
+    # Built CONCURRENTLY on Postgres, as in e6f13b8a90d4
+    if op.get_bind().dialect.name == 'postgresql':
+        return op.get_context().autocommit_block(), {'postgresql_concurrently': True}
+    return nullcontext(), {}
+
+
+def upgrade():
+    block, kw = _index_block()
+    with block:
+        op.create_index('ix_orders_created_at_id', 'orders', ['created_at', 'id'], **kw)
+        op.create_index('ix_orders_status_created_at_id', 'orders', ['status', 'created_at', 'id'], **kw)
+        op.create_index('ix_payments_created_at_id', 'payments', ['created_at', 'id'], **kw)
+
+
+def downgrade():
+    block, kw = _index_block()
+    with block:
+        op.drop_index('ix_payments_created_at_id', table_name='payments', **kw)
+        op.drop_index('ix_orders_status_created_at_id', table_name='orders', **kw)
+        op.drop_index('ix_orders_created_at_id', table_name='orders', **kw)
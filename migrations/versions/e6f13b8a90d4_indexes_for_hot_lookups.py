@@ -0,0 +1,52 @@
+"""indexes for hot lookups (payments.order_id, payment_events.payment_id/received_at)
+
+Revision ID: e6f13b8a90d4
+Revises: c2a9e4b17f53
+Create Date: 2026-10-17 15:18:06.630912
+
+"""
+from contextlib import nullcontext
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6f13b8a90d4'
+down_revision = 'c2a9e4b17f53'
+branch_labels = None
+depends_on = None
+
+SUCCEEDED = sa.text("status = 'SUCCEEDED'")
+
+
+def _index_block():
+    # On Postgres build the indexes CONCURRENTLY (outside the migration
+    # transaction) so webhook writes aren't blocked on a large table.
+    if op.get_bind().dialect.name == 'postgresql':
+        return op.get_context().autocommit_block(), {'postgresql_concurrently': True}
+    return nullcontext(), {}
+
+
+def upgrade():
+    block, kw = _index_block()
+    with block:
+        op.create_index('ix_payments_order_id_status', 'payments', ['order_id', 'status'], **kw)
+        op.create_index(
+            'ix_payments_order_id_succeeded', 'payments', ['order_id'],
+            postgresql_include=['amount_received'],
+            postgresql_where=SUCCEEDED,
+            sqlite_where=SUCCEEDED,
+            **kw
+        )
+        op.create_index('ix_payment_events_payment_id_received_at', 'payment_events', ['payment_id', 'received_at'], **kw)
+        op.create_index('ix_payment_events_received_at', 'payment_events', ['received_at'], **kw)
+
+
+def downgrade():
+    block, kw = _index_block()
+    with block:
+        op.drop_index('ix_payment_events_received_at', table_name='payment_events', **kw)
+        op.drop_index('ix_payment_events_payment_id_received_at', table_name='payment_events', **kw)
+        op.drop_index('ix_payments_order_id_succeeded', table_name='payments', **kw)
+        op.drop_index('ix_payments_order_id_status', table_name='payments', **kw)
@@ -0,0 +1,50 @@
+"""refunds and disputes (refunds table, payments.amount_refunded)
+
+Revision ID: f4b8d2e6a1c7
+Revises: a3f0c5d92b18
+Create Date: 2026-10-17 17:20:31.904518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4b8d2e6a1c7'
+down_revision = 'a3f0c5d92b18'
+branch_labels = None
+depends_on = None
+
+refundkind = sa.Enum('REFUND', 'DISPUTE', name='refundkind')
+
+
+def upgrade():
+    op.add_column('payments', sa.Column('amount_refunded', sa.Integer(), nullable=False, server_default='0'))
+    op.create_table(
+        'refunds',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('stripe_refund_id', sa.String(), nullable=False),
+        sa.Column('kind', refundkind, nullable=False),
+        sa.Column('payment_id', sa.String(), nullable=False),
+        sa.Column('stripe_charge_id', sa.String(), nullable=True),
+        sa.Column('amount', sa.Integer(), nullable=False),
+        sa.Column('currency', sa.String(length=3), nullable=True),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('reason', sa.String(), nullable=True),
+        sa.Column('counted_amount', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('counted_delta', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['payment_id'], ['payments.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('stripe_refund_id'),
+    )
+    op.create_index('ix_refunds_payment_id', 'refunds', ['payment_id'])
+
+
+def downgrade():
+    op.drop_index('ix_refunds_payment_id', table_name='refunds')
+    op.drop_table('refunds')
+    refundkind.drop(op.get_bind(), checkfirst=True)
+    with op.batch_alter_table('payments') as batch_op:
+        batch_op.drop_column('amount_refunded')
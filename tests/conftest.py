@@ -1,4 +1,4 @@
-import os, tempfile, uuid, pytest
+import json, os, tempfile, uuid, pytest
 from app import create_app
 from app.extensions import db
 
@@ -25,3 +25,45 @@ def app():
 @pytest.fixture()
 def client(app):
     return app.test_client()
+
+@pytest.fixture()
+def fake_stripe():
+    from fake_stripe import FakeStripe
+    server = FakeStripe().start()
+    yield server
+    server.stop()
+
+
+def sign_payload(payload, secret="whsec_dummy", timestamp=None):
+    """Build a valid Stripe-Signature header for `payload` (str)."""
+    import hashlib, hmac, time
+    ts = int(timestamp if timestamp is not None else time.time())
+    mac = hmac.new(secret.encode(), f"{ts}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return f"t={ts},v1={mac}"
+
+
+def pi_event(evt_id, pi_id="pi_1", status="succeeded", amount=1000, order_id="order_1", created=None):
+    """A `payment_intent.<status>` event; `order_id=None` leaves the metadata empty."""
+    event = {
+        "id": evt_id,
+        "type": f"payment_intent.{status}",
+        "data": {"object": {
+            "id": pi_id, "currency": "usd", "amount_received": amount, "status": status,
+            "charges": {"data": []}, "metadata": {"order_id": order_id} if order_id else {},
+        }},
+    }
+    if created is not None:
+        event["created"] = created
+    return event
+
+
+def post_event(client, event, signature=None):
+    """POST `event` (a dict, or the raw body) to the webhook, signed unless `signature` is given."""
+    body = event if isinstance(event, str) else json.dumps(event)
+    return client.post("/webhooks/stripe", data=body, headers={"Stripe-Signature": signature or sign_payload(body)})
+
+
+@pytest.fixture()
+def post(client):
+    """`post(event, signature=None)`: deliver an event through the test client; returns the response."""
+    return lambda event, signature=None: post_event(client, event, signature)
@@ -0,0 +1,64 @@
+"""Tiny local stand-in for the Stripe REST API (only what the app calls)."""
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeStripe:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.payment_intents = {}   # pi_id -> metadata
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True
+        )
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with fake._lock:
+                    fake.requests.append(self.path)
+                if fake.delay:
+                    time.sleep(fake.delay)
+                m = re.fullmatch(r"/v1/payment_intents/([^/?]+)", self.path.split("?")[0])
+                if m and m.group(1) in fake.payment_intents:
+                    self._send(200, {
+                        "id": m.group(1),
+                        "object": "payment_intent",
+                        "metadata": fake.payment_intents[m.group(1)],
+                    })
+                else:
+                    self._send(404, {"error": {"type": "invalid_request_error", "message": "No such payment_intent"}})
+
+            def _send(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,71 @@
+import re
+from app.models import PaymentEvent
+from app.webhooks.admission import LATENCY_HALF_LIFE, Admission
+from conftest import pi_event
+
+
+def test_admission_is_off_by_default(app):
+    assert app.extensions["admission"] is None
+
+
+def test_saturated_worker_sheds_with_503_and_retry_after(app, client, post):
+    admission = app.extensions["admission"] = Admission(max_in_flight=1, retry_after=7)
+    assert admission.try_acquire("payment_intent.succeeded") is None     # another request holds the only slot
+
+    resp = post(pi_event("evt_1"))
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "7"
+    assert PaymentEvent.query.count() == 0                               # nothing touched the database
+    assert post({"id": "evt_2", "type": "customer.created", "data": {"object": {}}}).status_code == 200
+
+    admission.release()
+    assert post(pi_event("evt_1")).status_code == 200                    # the redelivery goes through
+    assert PaymentEvent.query.count() == 1
+    assert admission.in_flight == 0
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert re.search(r'^webhook_events_total\{.*outcome="shed".*\} 1', text, re.M)
+    assert "webhook_admission_shed_priority_total 1" in text
+    assert "webhook_admission_shed_in_flight_total 1" in text
+
+
+def test_priority_events_keep_reserved_slots():
+    admission = Admission(max_in_flight=4, priority_reserved=0.25)
+    assert [admission.try_acquire("payment_intent.created") for _ in range(4)] == [None, None, None, "in_flight"]
+    assert admission.try_acquire("charge.refunded") is None              # the reserved slot
+    assert admission.try_acquire("payment_intent.succeeded") == "in_flight"
+    stats = admission.stats()
+    assert (stats["admitted_priority_total"], stats["admitted_other_total"]) == (1, 3)
+    assert (stats["shed_priority_total"], stats["shed_other_total"]) == (1, 1)
+
+
+def test_refund_events_are_admitted_into_the_reserved_share():
+    # On current API versions refunds arrive only as refund.* (charge.refunded carries none)
+    admission = Admission(max_in_flight=4, priority_reserved=0.25)
+    assert [admission.try_acquire("payment_intent.created") for _ in range(3)] == [None, None, None]
+    assert admission.try_acquire("charge.updated") == "in_flight"
+    assert admission.try_acquire("refund.updated") is None
+    assert admission.stats()["admitted_priority_total"] == 1
+
+
+def test_slow_database_sheds_informational_first_and_recovers():
+    admission = Admission(max_in_flight=8, latency_threshold=0.1)
+    assert admission.try_acquire("payment_intent.succeeded") is None
+    admission._latency = 0.15                                            # between 1x and 2x the threshold
+
+    assert admission.try_acquire("payment_intent.processing") == "db_latency"
+    assert admission.try_acquire("payment_intent.succeeded") is None
+
+    admission._latency_at -= 2 * LATENCY_HALF_LIFE                       # no samples for a while: decayed to 1/4
+    assert admission.db_latency() < 0.05
+    assert admission.try_acquire("payment_intent.processing") is None
+
+    admission.release(statements=10, db_seconds=0.01)                    # fast requests pull the estimate down
+    assert admission.db_latency() < 0.04
+
+
+def test_idle_worker_always_admits_one_request_to_remeasure():
+    admission = Admission(max_in_flight=8, latency_threshold=0.1)
+    admission._latency = 10.0
+    assert admission.try_acquire("payment_intent.processing") is None
+    assert admission.try_acquire("payment_intent.processing") == "db_latency"
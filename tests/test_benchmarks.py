@@ -0,0 +1,82 @@
+import json
+import os
+import stripe
+from benchmarks import webhooks
+from benchmarks.events import TEST_WEBHOOK_SECRET, generate, iter_bodies, sign
+
+
+def test_generated_stream_is_signed_and_realistic():
+    stream = generate(n_orders=40, seed=7)
+    types = {e["type"] for e in stream.events}
+    assert {"payment_intent.created", "payment_intent.processing", "payment_intent.succeeded",
+            "charge.succeeded", "checkout.session.completed"} <= types
+    assert stream.stats["duplicates"] > 0 and stream.stats["reordered"] > 0
+    assert stream.stats["unique_events"] < len(stream.events)
+    assert stream.stats["payment_intents"] > len(stream.orders)   # some orders paid in installments
+    assert generate(n_orders=40, seed=7).events == stream.events  # deterministic
+
+    evt_id, body = next(iter_bodies(stream))
+    event = stripe.Webhook.construct_event(body, sign(body), TEST_WEBHOOK_SECRET)
+    assert event["id"] == evt_id
+
+
+def test_client_run_reports_and_saves(tmp_path, monkeypatch):
+    monkeypatch.delenv("SQLALCHEMY_DATABASE_URI", raising=False)
+    report = webhooks.run("client", orders=5)
+    assert "SQLALCHEMY_DATABASE_URI" not in os.environ                 # restored for the rest of the suite
+    result = report["result"]
+    assert result["events"] == report["stream"]["events"] and result["errors"] == 0
+    assert result["rows"]["payment_events"] == report["stream"]["handled_events"] < report["stream"]["unique_events"]
+    assert result["latency_ms"]["p50"] <= result["latency_ms"]["p99"]
+    assert result["statements_per_event"] > 0
+    assert result["db_bytes"]["growth"] > 0
+
+    path = webhooks.save(report, tmp_path)
+    assert json.loads(path.read_text())["result"] == result
+    assert "events/sec" in "\n".join(webhooks.compare(report, report))
+
+
+def test_parsing_microbenchmark_paths_agree():
+    from benchmarks import parsing
+
+    for raw in parsing.sample_events().values():
+        header = sign(raw.decode())
+        old_event, _ = parsing.old_path(raw, header)
+        fast_event, stored = parsing.fast_path(raw, header)
+        assert fast_event == json.loads(raw)
+        assert fast_event["id"] == old_event["id"]
+    report = parsing.run(iterations=40)
+    assert set(report["result"]) == {"small", "large"}
+
+
+def test_startup_benchmark_reports_both_modes():
+    from benchmarks import startup
+
+    report = startup.run(runs=1, top=3)
+    assert set(report["result"]) == {"web", "cli"}
+    for r in report["result"].values():
+        assert r["import_ms"] > 0 and len(r["top_self_ms"]) == 3
+        assert r["heavy_imported"] == []
+
+
+def test_log_cost_benchmark_covers_every_mode():
+    from benchmarks import log_cost
+
+    report = log_cost.run(requests=200, rounds=1, stall_ms=1, stall_every=50)
+    assert set(report["result"]) == set(log_cost.MODES)
+    assert "drain_us_per_request" in report["result"]["json-async"]
+    assert report["result"]["disabled"]["us_per_request"] < report["result"]["json-sync"]["us_per_request"]
+
+
+def test_burst_benchmark_sheds_but_loses_nothing():
+    from benchmarks import burst
+
+    report = burst.run(orders=5, concurrency=8, statement_ms=1, max_in_flight=2)
+    assert "WEBHOOK_ADMISSION_ENABLED" not in os.environ          # restored for the rest of the suite
+    off, on = report["result"]["off"], report["result"]["on"]
+    assert sum(c["shed"] for c in off["counts"].values()) == 0 and off["admission"] is None
+    assert on["admission"]["peak_in_flight"] <= 2
+    assert on["redelivered"] == sum(c["shed"] + c["errors"] for c in on["counts"].values())
+    assert off["lost"] == on["lost"] == 0
+    assert off["rows"] == on["rows"]
+    assert "priority" in "\n".join(burst.format_report(report))
@@ -0,0 +1,68 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.config import engine_options
+from app.extensions import db
+from app.models import Order, OrderStatus, Payment, PaymentEvent
+from conftest import sign_payload
+
+THREADS = 16
+EVENTS_PER_THREAD = 25
+MIN_EVENTS_PER_SEC = 50   # far below what a laptop does; catches lock stalls/timeouts
+
+
+def test_sqlite_connections_use_wal_and_tuned_pragmas(app):
+    with db.engine.connect() as conn:
+        pragma = lambda name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()  # noqa: E731
+        assert pragma("journal_mode") == "wal"
+        assert pragma("synchronous") == 1          # NORMAL
+        assert pragma("busy_timeout") == 5000
+        assert pragma("mmap_size") == 256 * 1024 * 1024
+
+
+def test_postgres_pool_options_come_from_env(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "12")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "3")
+    monkeypatch.setenv("DB_POOL_RECYCLE", "600")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+    opts = engine_options("postgresql+psycopg://u@db/app")
+    assert (opts["pool_size"], opts["max_overflow"], opts["pool_recycle"], opts["pool_pre_ping"]) == (12, 3, 600, False)
+    assert "pool_size" not in engine_options("sqlite:///app.db")
+
+
+def test_concurrent_writers_on_sqlite_file_do_not_lock_out(app):
+    db.session.add(Order(id="order_1", currency="usd", amount_due=10**9, status=OrderStatus.AWAITING_PAYMENT))
+    db.session.commit()
+    errors = []
+    barrier = threading.Barrier(THREADS)
+
+    def writer(t):
+        client = app.test_client()
+        barrier.wait()
+        for i in range(EVENTS_PER_THREAD):
+            event = {
+                "id": f"evt_{t}_{i}", "type": "payment_intent.succeeded",
+                "data": {"object": {"id": f"pi_{t}_{i}", "currency": "usd", "amount_received": 100,
+                                    "status": "succeeded", "charges": {"data": []},
+                                    "metadata": {"order_id": "order_1"}}},   # every writer hits one order row
+            }
+            body = json.dumps(event)
+            try:
+                resp = client.post("/webhooks/stripe", data=body, headers={"Stripe-Signature": sign_payload(body)})
+                if resp.status_code != 200:
+                    errors.append(resp.status_code)
+            except Exception as e:   # "database is locked" surfaces as OperationalError
+                errors.append(repr(e))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(THREADS) as pool:
+        list(pool.map(writer, range(THREADS)))
+    elapsed = time.perf_counter() - started
+
+    total = THREADS * EVENTS_PER_THREAD
+    assert errors == []
+    db.session.expire_all()
+    assert PaymentEvent.query.count() == Payment.query.count() == total
+    assert db.session.get(Order, "order_1").amount_paid == 100 * total
+    assert total / elapsed > MIN_EVENTS_PER_SEC
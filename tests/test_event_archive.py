@@ -0,0 +1,101 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+import pytest
+from app.events import archive
+from app.extensions import db
+from app.models import ArchivedEvent, EventStatus, PaymentEvent
+from app.webhooks.batch import process_batch
+from conftest import pi_event
+
+CREATED = 1_700_000_000
+
+
+def event(evt_id, pi_id):
+    return pi_event(evt_id, pi_id, order_id=None, created=CREATED)
+
+
+def age_events(post, ages):
+    """Deliver one event per entry and backdate its received_at by that many days."""
+    now = datetime.utcnow()
+    for i, days in enumerate(ages):
+        post(event(f"evt_{i}", f"pi_{i}"))
+        db.session.query(PaymentEvent).filter_by(stripe_event_id=f"evt_{i}").update(
+            {"received_at": now - timedelta(days=days, minutes=i)}
+        )
+    db.session.commit()
+
+
+def read_archive(dest):
+    records = {}
+    for directory, _, files in os.walk(dest):
+        for name in files:
+            assert name.endswith(".jsonl.gz")
+            with gzip.open(os.path.join(directory, name)) as f:
+                for line in f:
+                    record = json.loads(line)
+                    records[record["stripe_event_id"]] = (os.path.basename(directory), record)
+    return records
+
+
+def test_archive_exports_deletes_and_keeps_ids(app, post, tmp_path):
+    age_events(post, [200, 120, 120, 95, 10])
+    db.session.query(PaymentEvent).filter_by(stripe_event_id="evt_3").update({"status": EventStatus.PENDING})
+    db.session.commit()
+
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["events", "archive", "--older-than", "90d", "--dest", str(tmp_path),
+                                 "--format", "jsonl", "--chunk-size", "2"])
+    assert result.exit_code == 0, result.output
+    assert "archived 3 event(s) received before" in result.output
+
+    records = read_archive(tmp_path)
+    assert set(records) == {"evt_0", "evt_1", "evt_2"}
+    partition, record = records["evt_1"]
+    assert partition == f"dt={record['received_at'][:10]}"
+    assert record["status"] == "PROCESSED"
+    assert record["payload"]["data"]["object"]["id"] == "pi_1"   # embedded as JSON, not a string
+
+    # PENDING and recent events stay; archived ids are remembered
+    assert {e.stripe_event_id for e in db.session.query(PaymentEvent)} == {"evt_3", "evt_4"}
+    assert {a.stripe_event_id for a in db.session.query(ArchivedEvent)} == {"evt_0", "evt_1", "evt_2"}
+
+    # Nothing left to do on a second run
+    result = runner.invoke(args=["events", "archive", "--dest", str(tmp_path), "--format", "jsonl"])
+    assert "archived 0 event(s)" in result.output
+
+
+def test_archived_events_stay_duplicates(app, post, tmp_path):
+    age_events(post, [100])
+    list(archive.archive_events(datetime.utcnow() - timedelta(days=90), str(tmp_path), fmt="jsonl"))
+    assert db.session.query(PaymentEvent).count() == 0
+
+    assert post(event("evt_0", "pi_0")).status_code == 200
+    assert db.session.query(PaymentEvent).count() == 0
+
+    stats = process_batch([event("evt_0", "pi_0"), event("evt_new", "pi_0")])
+    assert (stats.duplicates, stats.recorded) == (1, 1)
+
+
+def test_dry_run_and_bad_age(app, post, tmp_path):
+    age_events(post, [100, 1])
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["events", "archive", "--older-than", "30d", "--dry-run"])
+    assert result.exit_code == 0
+    assert result.output.startswith("1 event(s) received before")
+    assert db.session.query(PaymentEvent).count() == 2
+
+    assert runner.invoke(args=["events", "archive", "--older-than", "ninety days"]).exit_code == 2
+    assert archive.parse_age("2w") == timedelta(weeks=2)
+
+
+def test_parquet_export(app, post, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    age_events(post, [100])
+    list(archive.archive_events(datetime.utcnow() - timedelta(days=90), str(tmp_path), fmt="parquet"))
+    (directory,) = os.listdir(tmp_path)
+    (name,) = os.listdir(tmp_path / directory)
+    rows = pq.read_table(tmp_path / directory / name).to_pylist()
+    assert [r["stripe_event_id"] for r in rows] == ["evt_0"]
+    assert json.loads(rows[0]["payload"])["id"] == "evt_0"
@@ -0,0 +1,97 @@
+import json
+import os
+import uuid
+from sqlalchemy import event as sa_event
+from app.extensions import db
+from app.models import PaymentEvent, Payment
+from app.payloads import RAW, ZLIB, decode_payload, encode_payload
+
+
+def big_event(evt_id="evt_big", pi_id="pi_big", padding=200_000):
+    return {
+        "id": evt_id,
+        "type": "payment_intent.succeeded",
+        "data": {"object": {
+            "id": pi_id, "currency": "usd", "amount_received": 2500, "status": "succeeded",
+            "metadata": {"order_id": "order_1"},
+            "description": os.urandom(padding // 2).hex(),  # incompressible
+            "charges": {"data": [{"id": "ch_1", "payment_method_details": {
+                "type": "card", "card": {"brand": "visa", "last4": "4242", "exp_month": 1, "exp_year": 2031},
+            }, "receipt": os.urandom(padding // 2).hex()}]},
+        }},
+    }
+
+
+def test_roundtrip_and_format_markers():
+    small = {"id": "evt_1"}
+    blob = encode_payload(small)
+    assert blob[:1] == RAW
+    assert json.loads(decode_payload(blob)) == small
+
+    event = {"id": "evt_2", "data": {"object": {"lines": [{"amount": 100, "currency": "usd"}] * 200}}}
+    blob = encode_payload(event)
+    assert blob[:1] == ZLIB
+    assert len(blob) < len(json.dumps(event)) / 10
+    assert json.loads(decode_payload(blob)) == event
+
+
+def test_oversized_payload_is_reduced_but_still_valid_json(app):
+    event = big_event()
+    blob = encode_payload(event, max_bytes=1024)
+    stored = json.loads(decode_payload(blob))
+    assert stored["truncated"] is True
+    obj = stored["data"]["object"]
+    assert obj["metadata"] == {"order_id": "order_1"}
+    assert obj["charges"]["data"][0]["payment_method_details"]["card"]["last4"] == "4242"
+    assert "description" not in obj
+
+
+def test_webhook_stores_compressed_payload_and_listing_skips_it(app, post):
+    app.config["EVENT_PAYLOAD_MAX_BYTES"] = 4096
+    event = big_event()
+    assert post(event).status_code == 200
+
+    statements = []
+    listener = lambda *a: statements.append(a[2])  # noqa: E731
+    sa_event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        db.session.expunge_all()
+        payment = Payment.query.one()
+        listed = payment.events
+        assert [e.type for e in listed] == ["payment_intent.succeeded"]
+    finally:
+        sa_event.remove(db.engine, "before_cursor_execute", listener)
+    assert not [s for s in statements if "payload" in s]
+
+    pe = listed[0]
+    assert len(pe.payload_data) <= 4096
+    assert pe.payload is None
+    assert pe.payload_json["id"] == "evt_big"
+    assert pe.payload_json is pe.payload_json  # decoded once
+    assert payment.card_last4 == "4242"
+
+
+def test_legacy_rows_readable_and_backfilled(app):
+    legacy = json.dumps({"id": "evt_old", "type": "charge.succeeded", "data": {"object": {"note": "z" * 500}}})
+    db.session.add_all([
+        PaymentEvent(id=str(uuid.uuid4()), stripe_event_id="evt_old", type="charge.succeeded", payload=legacy),
+        # Pre-compression rows were cut at 1 MB, mid-JSON
+        PaymentEvent(id=str(uuid.uuid4()), stripe_event_id="evt_cut", type="charge.succeeded", payload=legacy[:40]),
+    ])
+    db.session.commit()
+    db.session.expunge_all()
+
+    old = PaymentEvent.query.filter_by(stripe_event_id="evt_old").one()
+    assert old.payload_json["id"] == "evt_old"
+    assert PaymentEvent.query.filter_by(stripe_event_id="evt_cut").one().payload_json is None
+
+    result = app.test_cli_runner().invoke(args=["webhooks", "compress-payloads", "--chunk-size", "1"])
+    assert result.exit_code == 0, result.output
+    assert "converted 2 payload(s)" in result.output
+
+    db.session.expunge_all()
+    for pe in PaymentEvent.query.all():
+        assert pe.payload is None
+        assert pe.payload_data is not None
+    assert PaymentEvent.query.filter_by(stripe_event_id="evt_old").one().payload_text == legacy
+    assert PaymentEvent.query.filter_by(stripe_event_id="evt_cut").one().payload_text == legacy[:40]
@@ -0,0 +1,40 @@
+import os
+import runpy
+from pathlib import Path
+from app.extensions import db
+
+CONF = Path(__file__).parent.parent / "gunicorn.conf.py"
+
+
+class FakeArbiter:
+    def __init__(self, app):
+        self.app = self
+        self._app = app
+
+    def wsgi(self):
+        return self._app
+
+
+def test_profile_derives_workers_threads_and_pool_size(monkeypatch):
+    monkeypatch.setattr("os.cpu_count", lambda: 6)
+    monkeypatch.delenv("WEB_CONCURRENCY", raising=False)
+    monkeypatch.setenv("GUNICORN_THREADS", "8")
+    monkeypatch.setenv("DB_POOL_SIZE", "")   # restored (removed) after the test
+    monkeypatch.delenv("DB_POOL_SIZE")
+    conf = runpy.run_path(str(CONF))
+    assert (conf["worker_class"], conf["workers"], conf["threads"]) == ("gthread", 6, 8)
+    assert conf["preload_app"] is True
+    assert conf["graceful_timeout"] > 0
+    assert os.environ["DB_POOL_SIZE"] == "8"
+
+
+def test_post_fork_drops_connections_inherited_from_the_master(app):
+    conf = runpy.run_path(str(CONF))
+    with db.engine.connect():
+        pass
+    pool = db.engine.pool
+    assert pool.checkedin() == 1
+
+    conf["when_ready"](FakeArbiter(app))
+    conf["post_fork"](FakeArbiter(app), None)
+    assert db.engine.pool is not pool and db.engine.pool.checkedin() == 0
@@ -0,0 +1,78 @@
+import io
+import json
+import logging
+import threading
+from app.logs import configure_logging
+from conftest import pi_event
+
+
+def reconfigure(app, **config):
+    app.config.update(config)
+    stream = io.StringIO()
+    configure_logging(app, stream=stream)
+    return stream
+
+
+def lines(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+EVENT = pi_event("evt_1")
+
+
+def test_request_lines_are_json_with_context(app, post):
+    stream = reconfigure(app, LOG_ASYNC=False)
+    post(EVENT)
+    summary = lines(stream)[-1]
+    assert summary["logger"] == "app.request" and summary["msg"] == "request"
+    assert (summary["event_id"], summary["event_type"], summary["payment_intent_id"]) == ("evt_1", "payment_intent.succeeded", "pi_1")
+    assert (summary["outcome"], summary["status"], summary["path"]) == ("processed", 200, "/webhooks/stripe")
+    assert summary["latency_ms"] > 0 and len(summary["request_id"]) == 16
+
+    # Quotes, newlines and tracebacks stay inside one valid line
+    with app.test_request_context():
+        try:
+            raise ValueError('bad "payload"\nline two')
+        except ValueError:
+            app.logger.exception("failed on %s", '{"id": "evt_2"}')
+    record = lines(stream)[-1]
+    assert record["msg"] == 'failed on {"id": "evt_2"}' and record["exc"].endswith('ValueError: bad "payload"\nline two')
+    assert "request_id" not in record     # context is per request
+
+
+def test_async_emission_happens_off_the_request_thread(app, post):
+    stream = reconfigure(app, LOG_ASYNC=True, LOG_QUEUE_SIZE=100)
+    emitted_by = []
+    listener = app.extensions["logging"]
+    listener.target.addFilter(lambda r: emitted_by.append(threading.current_thread()) or True)
+
+    post("not json")
+    listener.stop()     # drains the queue
+    warning, summary = lines(stream)
+    assert warning["level"] == "WARNING" and warning["msg"].startswith("webhook signature or payload error")
+    assert summary["status"] == 400 and summary["outcome"] == "invalid_signature"
+    assert emitted_by and threading.current_thread() not in emitted_by
+
+    # A full queue drops records instead of blocking the caller
+    listener.handler.maxsize = 1
+    for _ in range(3):
+        app.logger.info("overflow")
+    assert listener.stats() == {"queued": 1, "dropped": 2}
+
+
+def test_sampling_keeps_warnings_and_skips_disabled_formatting(app, post):
+    stream = reconfigure(app, LOG_ASYNC=False, LOG_SAMPLE_RATE=0.0)
+    post(EVENT)
+    post("not json")
+    assert [r["level"] for r in lines(stream)] == ["WARNING"]
+
+    class Expensive:
+        formatted = 0
+
+        def __str__(self):
+            Expensive.formatted += 1
+            return "x"
+
+    app.logger.setLevel(logging.WARNING)
+    app.logger.info("payload %s", Expensive())
+    assert Expensive.formatted == 0
@@ -0,0 +1,55 @@
+import re
+from app.extensions import db
+from app.models import Order, OrderStatus
+from conftest import pi_event
+
+
+def sample(text, name):
+    m = re.search(rf"^{re.escape(name)} (\S+)$", text, re.M)
+    return float(m.group(1)) if m else None
+
+
+def test_metrics_endpoint_reports_stages_outcomes_and_db_time(app, client, post):
+    db.session.add(Order(id="order_1", currency="usd", amount_due=1000, status=OrderStatus.AWAITING_PAYMENT))
+    db.session.commit()
+    event = pi_event("evt_1")
+    assert post(event).status_code == 200
+    assert post(event).status_code == 200                       # duplicate
+    assert post({"id": "evt_2", "type": "customer.created", "data": {"object": {}}}).status_code == 200
+    assert post(event, signature="t=1,v1=bad").status_code == 400
+
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/plain"
+    text = resp.get_data(as_text=True)
+
+    assert sample(text, 'webhook_events_total{type="payment_intent.succeeded",outcome="processed"}') == 1
+    assert sample(text, 'webhook_events_total{type="payment_intent.succeeded",outcome="duplicate"}') == 1
+    assert sample(text, 'webhook_events_total{type="customer.created",outcome="ignored"}') == 1
+    assert sample(text, 'webhook_events_total{type="",outcome="invalid_signature"}') == 1
+
+    assert sample(text, 'webhook_stage_seconds_count{stage="verify"}') == 3
+    assert sample(text, 'webhook_stage_seconds_count{stage="payment"}') == 1   # the duplicate is caught first
+    assert sample(text, 'webhook_stage_seconds_count{stage="order"}') == 1
+    assert sample(text, 'webhook_stage_seconds_count{stage="commit"}') == 1   # the duplicate rolls back
+    assert sample(text, 'webhook_stage_seconds_bucket{stage="verify",le="+Inf"}') == 3
+
+    assert sample(text, 'http_request_seconds_count{endpoint="webhooks.stripe_webhook"}') == 4
+    # processed: event insert + payment upsert + order update + event link;
+    # duplicate: event insert; ignored type: nothing
+    assert sample(text, "db_statements_per_request_sum") == 4 + 1
+    assert sample(text, "db_seconds_total") > 0
+    assert sample(text, "pi_cache_misses") == 0
+
+
+def test_metrics_objects_are_reused_across_requests(app, client, post):
+    metrics = app.extensions["metrics"]
+    client.get("/healthz")
+    before = (len(metrics.requests), len(metrics.events), id(metrics.stages["verify"]))
+    for _ in range(5):
+        client.get("/healthz")
+        post({"id": "evt_x"}, signature="t=1,v1=bad")
+    client.get("/healthz")
+    after = (len(metrics.requests), len(metrics.events), id(metrics.stages["verify"]))
+    assert after == (before[0] + 1, before[1] + 1, before[2])   # one webhook endpoint, one outcome key
+    assert metrics.requests["healthz"].count == 7
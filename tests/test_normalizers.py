@@ -0,0 +1,69 @@
+import pytest
+from app.models import PaymentStatus
+from app.webhooks import normalizers
+from app.webhooks.normalizers import Normalized, normalize_event, payment_intent_id_for, register, resolve
+
+
+@pytest.fixture()
+def registry(monkeypatch):
+    """Scratch copies of the registry tables, restored after the test."""
+    monkeypatch.setattr(normalizers, "_EXACT", dict(normalizers._EXACT))
+    monkeypatch.setattr(normalizers, "_PREFIXES", dict(normalizers._PREFIXES))
+    monkeypatch.setattr(normalizers, "_resolved", {})
+
+
+def event(evt_type, **obj):
+    return {"id": "evt_1", "type": evt_type, "data": {"object": obj}}
+
+
+def test_payment_intent_event():
+    n = normalize_event(event(
+        "payment_intent.succeeded", id="pi_1", currency="usd", amount_received=700, status="succeeded",
+        metadata={"order_id": "o1"},
+        charges={"data": [{"payment_method_details": {"type": "card", "card": {"brand": "visa", "last4": "4242"}}}]},
+    ))
+    assert n == Normalized("pi_1", "usd", 700, PaymentStatus.SUCCEEDED, "card", {"brand": "visa", "last4": "4242"}, "o1")
+
+
+def test_charge_and_checkout_events_point_at_their_payment_intent():
+    charge = normalize_event(event("charge.succeeded", payment_intent="pi_2", amount=300, paid=True,
+                                   status="succeeded", currency="eur"))
+    assert (charge.payment_intent_id, charge.amount_received, charge.status) == ("pi_2", 300, PaymentStatus.SUCCEEDED)
+    failed = normalize_event(event("charge.failed", payment_intent="pi_2", amount=300, paid=False, status="failed"))
+    assert failed.status == PaymentStatus.PROCESSING   # unknown Stripe status
+    checkout = normalize_event(event("checkout.session.completed", payment_intent="pi_3", amount_total=900,
+                                     metadata={"order_id": "o3"}))
+    assert (checkout.amount_received, checkout.status, checkout.order_id) == (900, PaymentStatus.SUCCEEDED, "o3")
+
+
+def test_unknown_types_and_events_without_a_payment_intent():
+    assert resolve("customer.created") is None
+    assert normalize_event(event("customer.created", id="cus_1")) is None
+    assert payment_intent_id_for("customer.created", {"id": "cus_1"}) is None
+    # handled type, but e.g. a charge made without a PaymentIntent
+    assert normalize_event(event("charge.succeeded", id="ch_1", payment_intent=None)) is None
+    assert payment_intent_id_for("charge.refunded", {"payment_intent": "pi_9"}) == "pi_9"
+
+
+def test_exact_match_beats_prefix_and_longest_prefix_wins(registry):
+    resolve("charge.dispute.created")   # cached before the registrations below
+    register("charge.dispute.", pi_field="payment_intent")(lambda obj: "dispute")
+    register("charge.dispute.closed", pi_field="payment_intent")(lambda obj: "closed")
+    obj = {"payment_intent": "pi_1"}
+    assert normalize_event({"type": "charge.dispute.created", "data": {"object": obj}}) == "dispute"
+    assert normalize_event({"type": "charge.dispute.closed", "data": {"object": obj}}) == "closed"
+    assert resolve("charge.succeeded").normalize is normalizers._charge
+
+
+def test_resolution_is_cached_and_bounded(registry, monkeypatch):
+    monkeypatch.setattr(normalizers, "_RESOLVED_MAX", 2)
+    for t in ("a.x", "b.y", "c.z"):
+        resolve(t)
+    assert list(normalizers._resolved) == ["a.x", "b.y"]
+
+
+def test_normalized_records_are_slotted():
+    n = normalize_event(event("payment_intent.created", id="pi_1", status="requires_payment_method"))
+    assert not hasattr(n, "__dict__")
+    with pytest.raises(AttributeError):
+        n.amount_received = 5
@@ -0,0 +1,63 @@
+import json
+from sqlalchemy import event as sa_event
+from app.extensions import db
+from app.models import Order, OrderStatus
+
+
+def test_create_order(app, client):
+    resp = client.post("/orders", json={"id": "web0016737", "currency": "USD", "amount_due": 5500})
+    assert resp.status_code == 201 and resp.headers["Location"].endswith("/orders/web0016737")
+    body = resp.get_json()
+    assert (body["currency"], body["amount_due"], body["status"]) == ("usd", 5500, "AWAITING_PAYMENT")
+
+    assert client.post("/orders", json={"id": "web0016737", "currency": "usd", "amount_due": 1}).status_code == 409
+    assert client.post("/orders", json={"id": "o2", "currency": "dollars", "amount_due": 1}).status_code == 400
+    assert client.post("/orders", json={"id": "o2", "currency": "usd", "amount_due": 12.5}).status_code == 400
+    assert client.post("/orders", json={"id": "o2", "currency": "usd", "amount_due": 1, "status": "PAID"}).status_code == 400
+    assert client.post("/orders", json={"id": "o2", "currency": "usd", "amount_due": 1, "external_ref": {"a": 1}}).status_code == 400
+    assert client.post("/orders", json={"id": "o2", "currency": "usd", "amount_due": 1, "external_ref": "r" * 256}).status_code == 400
+    assert db.session.query(Order).count() == 1
+
+
+def test_bulk_csv_upload_validates_in_chunks(app, client):
+    app.config["ORDER_IMPORT_CHUNK_SIZE"] = 3
+    lines = ["id,currency,amount_due,external_ref"]
+    lines += [f"o{i},usd,{100 + i},ref-{i}" for i in range(10)]
+    lines += ["bad1,usd,-5,", "o3,usd,999,", "bad2,xx,100,", "bad3,usd,²,"]
+    inserts = []
+    sa_event.listen(db.engine, "before_cursor_execute",
+                    lambda conn, cur, stmt, params, ctx, many: inserts.append(stmt) if stmt.startswith("INSERT") else None)
+
+    resp = client.post("/orders/import", data="\n".join(lines) + "\n", content_type="text/csv")
+    stats = resp.get_json()
+    assert (stats["received"], stats["inserted"], stats["duplicates"], stats["invalid"]) == (14, 10, 1, 3)
+    assert [e["line"] for e in stats["errors"]] == [12, 14, 15]
+    assert len(inserts) == 4                        # one multi-row INSERT per chunk of 3; the last is all invalid
+    assert db.session.get(Order, "o7").external_ref == "ref-7"
+
+
+def test_ndjson_upload_skips_existing_ids(app, client):
+    body = "\n".join(json.dumps({"id": f"o{i}", "currency": "eur", "amount_due": 100}) for i in range(5))
+    assert client.post("/orders/import", data=body, content_type="application/x-ndjson").get_json()["inserted"] == 5
+    stats = client.post("/orders/import?format=ndjson", data=body + "\nnot json\n").get_json()
+    assert (stats["inserted"], stats["duplicates"], stats["invalid"]) == (0, 5, 1)
+    assert client.post("/orders/import", data=body, content_type="text/plain").status_code == 400
+
+
+def test_import_command(app, tmp_path):
+    path = tmp_path / "orders.jsonl"
+    with path.open("w") as f:
+        for i in range(2500):
+            f.write(json.dumps({"id": f"order_{i}", "currency": "usd", "amount_due": 1000,
+                                "status": "draft", "created_at": "2026-10-01T12:00:00+02:00"}) + "\n")
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["orders", "import", str(path), "--chunk-size", "1000"])
+    assert result.exit_code == 0, result.output
+    assert "inserted=2500 duplicates=0 invalid=0" in result.output and "rows/sec" in result.output
+
+    order = db.session.get(Order, "order_42")
+    assert order.status is OrderStatus.DRAFT and order.created_at.hour == 10
+
+    result = runner.invoke(args=["orders", "import", str(path)])
+    assert "inserted=0 duplicates=2500" in result.output
+    assert runner.invoke(args=["orders", "import", str(tmp_path / "orders.txt")]).exit_code != 0
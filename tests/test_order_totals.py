@@ -0,0 +1,71 @@
+from sqlalchemy import event as sa_event
+from app.extensions import db
+from app.models import Order, OrderStatus, Payment, PaymentStatus
+from conftest import pi_event
+
+
+def add_order(order_id="order_1", amount_due=3000, **kwargs):
+    db.session.add(Order(id=order_id, currency="usd", amount_due=amount_due,
+                         status=kwargs.pop("status", OrderStatus.AWAITING_PAYMENT), **kwargs))
+    db.session.commit()
+
+
+def test_installments_update_totals_incrementally(app, post):
+    add_order()
+    statements = []
+    sa_event.listen(db.engine, "before_cursor_execute", lambda *a: statements.append(a[2].lower()))
+
+    assert post(pi_event("evt_1", "pi_1", "processing", 0)).status_code == 200
+    order = db.session.get(Order, "order_1")
+    assert (order.amount_paid, order.status) == (0, OrderStatus.AWAITING_PAYMENT)
+
+    assert post(pi_event("evt_2", "pi_1", "succeeded", 1000)).status_code == 200
+    order = db.session.get(Order, "order_1")
+    assert (order.amount_paid, order.status) == (1000, OrderStatus.PARTIALLY_PAID)
+
+    # Re-delivery of the same state under a new event id adds nothing
+    assert post(pi_event("evt_3", "pi_1", "succeeded", 1000)).status_code == 200
+    assert post(pi_event("evt_4", "pi_2", "succeeded", 2000)).status_code == 200
+    order = db.session.get(Order, "order_1")
+    assert (order.amount_paid, order.status) == (3000, OrderStatus.PAID)
+
+    assert not [s for s in statements if "sum(" in s]
+
+
+def test_canceled_after_success_subtracts(app, post):
+    add_order(amount_due=1000)
+    assert post(pi_event("evt_1", "pi_1", "succeeded", 1000)).status_code == 200
+    assert post(pi_event("evt_2", "pi_1", "canceled", 0)).status_code == 200
+    order = db.session.get(Order, "order_1")
+    assert (order.amount_paid, order.status) == (0, OrderStatus.AWAITING_PAYMENT)
+
+
+def test_reconcile_reports_and_repairs_drift(app, post):
+    add_order("order_1", amount_due=1000)
+    add_order("order_2", amount_due=1000)
+    add_order("order_draft", amount_due=1000, status=OrderStatus.DRAFT)
+    assert post(pi_event("evt_1", "pi_1", "succeeded", 1000, order_id="order_1")).status_code == 200
+    assert post(pi_event("evt_2", "pi_2", "succeeded", 400, order_id="order_2")).status_code == 200
+
+    # Simulate drift: a payment written behind the materialized totals' back
+    db.session.add(Payment(id="p_x", order_id="order_2", stripe_payment_intent_id="pi_x",
+                           currency="usd", amount_received=600, status=PaymentStatus.SUCCEEDED))
+    db.session.get(Order, "order_1").amount_paid = 5
+    db.session.commit()
+
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["orders", "reconcile", "--chunk-size", "2"])
+    assert result.exit_code == 1
+    assert "order order_1: amount_paid 5 -> 1000" in result.output
+    assert "order order_2: amount_paid 400 -> 1000, status PARTIALLY_PAID -> PAID" in result.output
+    assert "found 2 drifted order(s)" in result.output
+
+    result = runner.invoke(args=["orders", "reconcile", "--repair"])
+    assert result.exit_code == 0
+    assert "repaired 2 drifted order(s)" in result.output
+
+    db.session.expire_all()
+    assert db.session.get(Order, "order_2").amount_paid == 1000
+    assert db.session.get(Order, "order_2").status == OrderStatus.PAID
+    assert db.session.get(Order, "order_draft").status == OrderStatus.DRAFT
+    assert runner.invoke(args=["orders", "reconcile"]).exit_code == 0
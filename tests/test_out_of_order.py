@@ -0,0 +1,113 @@
+import random
+import pytest
+from app.extensions import db
+from app.models import Order, OrderStatus, Payment, PaymentStatus, Refund
+from app.webhooks.batch import process_batch
+from conftest import pi_event
+
+
+def refund_event(evt_id, pi_id, status, amount, created):
+    return {
+        "id": evt_id,
+        "type": "refund.updated",
+        "created": created,
+        "data": {"object": {
+            "id": f"re_{pi_id}", "payment_intent": pi_id, "amount": amount, "currency": "usd", "status": status,
+        }},
+    }
+
+
+def lifecycles():
+    """Three orders: paid, paid in two installments with one refunded, and a payment that failed then succeeded."""
+    t = 1_700_000_000
+    return [
+        pi_event("evt_a1", "pi_a", "requires_payment_method", 0, "order_a", t),
+        pi_event("evt_a2", "pi_a", "processing", 0, "order_a", t + 1),
+        pi_event("evt_a3", "pi_a", "succeeded", 1000, "order_a", t + 2),
+
+        pi_event("evt_b1", "pi_b1", "succeeded", 500, "order_b", t),
+        pi_event("evt_b2", "pi_b2", "processing", 0, "order_b", t + 5),
+        pi_event("evt_b3", "pi_b2", "succeeded", 500, "order_b", t + 6),
+        refund_event("evt_b4", "pi_b2", "pending", 500, t + 10),
+        refund_event("evt_b5", "pi_b2", "succeeded", 500, t + 11),
+
+        # Same second: processing and succeeded (the lifecycle rank breaks the tie)
+        pi_event("evt_c1", "pi_c", "requires_payment_method", 0, "order_c", t),
+        pi_event("evt_c2", "pi_c", "processing", 0, "order_c", t + 3),
+        pi_event("evt_c3", "pi_c", "succeeded", 800, "order_c", t + 3),
+    ]
+
+
+EXPECTED = {
+    "order_a": (1000, 0, OrderStatus.PAID),
+    "order_b": (1000, 500, OrderStatus.PARTIALLY_REFUNDED),
+    "order_c": (800, 0, OrderStatus.PARTIALLY_PAID),
+}
+
+
+def add_orders():
+    for order_id in EXPECTED:
+        db.session.add(Order(id=order_id, currency="usd", amount_due=1000, status=OrderStatus.AWAITING_PAYMENT))
+    db.session.commit()
+
+
+def final_state():
+    db.session.expire_all()
+    orders = {o.id: (o.amount_paid, o.amount_refunded, o.status) for o in db.session.query(Order)}
+    payments = {p.stripe_payment_intent_id: (p.status, p.amount_received, p.amount_refunded)
+                for p in db.session.query(Payment)}
+    refunds = {r.stripe_refund_id: (r.status, r.counted_amount) for r in db.session.query(Refund)}
+    return orders, payments, refunds
+
+
+def reset():
+    for model in (Refund, Payment, Order):
+        db.session.query(model).delete()
+    db.session.execute(db.text("DELETE FROM payment_events"))
+    db.session.commit()
+    add_orders()
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_shuffled_lifecycles_end_in_the_same_state(app, post, seed):
+    add_orders()
+    events = lifecycles()
+    random.Random(seed).shuffle(events)
+    for event in events:
+        assert post(event).status_code == 200
+
+    orders, payments, refunds = final_state()
+    assert orders == EXPECTED
+    assert payments["pi_a"] == (PaymentStatus.SUCCEEDED, 1000, 0)
+    assert payments["pi_c"] == (PaymentStatus.SUCCEEDED, 800, 0)
+    assert refunds == {"re_pi_b2": ("succeeded", 500)}
+
+
+def test_shuffled_batches_match_in_order_webhooks(app):
+    add_orders()
+    process_batch(lifecycles())
+    expected = final_state()
+    assert expected[0] == EXPECTED
+
+    rng = random.Random(7)
+    for _ in range(5):
+        reset()
+        events = lifecycles()
+        rng.shuffle(events)
+        # Small batches, so later batches carry events older than what is stored
+        for i in range(0, len(events), 3):
+            process_batch(events[i:i + 3])
+        assert final_state() == expected
+
+
+def test_stale_event_is_dropped_without_touching_the_order(app, post):
+    add_orders()
+    late = pi_event("evt_late", "pi_a", "processing", 0, "order_a", 1_700_000_001)
+    for event in (pi_event("evt_ok", "pi_a", "succeeded", 1000, "order_a", 1_700_000_002), late):
+        post(event)
+
+    payment = db.session.query(Payment).one()
+    assert (payment.status, payment.last_event_created, payment.paid_delta) == (PaymentStatus.SUCCEEDED, 1_700_000_002, 1000)
+    # The stale event is still recorded (and linked), so a re-delivery is a duplicate
+    row = db.session.execute(db.text("SELECT payment_id FROM payment_events WHERE stripe_event_id = 'evt_late'")).one()
+    assert row.payment_id == payment.id
@@ -0,0 +1,109 @@
+import json
+import random
+from app.extensions import db
+from app.models import Order, OrderStatus, Payment, PaymentEvent, PaymentStatus
+from app.webhooks.reconcile import ReconcileStats, reconcile_export
+
+AS_OF = 1_790_000_000
+
+
+def payment(pi_id, amount, status=PaymentStatus.SUCCEEDED, order_id=None, last_event_created=AS_OF - 3600):
+    db.session.add(Payment(id=f"pay_{pi_id}", stripe_payment_intent_id=pi_id, order_id=order_id, currency="usd",
+                           amount_received=amount, status=status, last_event_created=last_event_created))
+
+
+def pi(pi_id, amount, status="succeeded", order_id=None):
+    return {"object": "payment_intent", "id": pi_id, "currency": "usd", "status": status,
+            "amount_received": amount if status == "succeeded" else 0,
+            "metadata": {"order_id": order_id} if order_id else {}}
+
+
+def test_sort_merge_reports_each_kind(app):
+    for i in range(30):
+        if i == 17:
+            payment("pi_017", 400)                               # amount differs
+        elif i == 21:
+            payment("pi_021", 0, PaymentStatus.PROCESSING)       # status differs
+        else:
+            payment(f"pi_{i:03d}", 1000)
+    payment("pi_local_only", 500)
+    db.session.commit()
+
+    export = [pi(f"pi_{i:03d}", 1000) for i in range(30) if i not in (5, 21)]
+    export += [pi("pi_100", 2500), pi("pi_021", 0, "canceled")]
+    export.append({"object": "charge", "payment_intent": "pi_100", "status": "failed", "paid": False, "amount": 2500, "currency": "usd"})
+    random.Random(3).shuffle(export)
+    lines = [json.dumps({"object": "list", "data": export[:10]})] + [json.dumps(o) for o in export[10:]]
+
+    stats = ReconcileStats()
+    found = list(reconcile_export(lines, "jsonl", as_of=AS_OF, run_size=7, chunk_size=4, stats=stats))
+    assert [(d.payment_intent_id, d.kind) for d in found] == [("pi_017", "amount"), ("pi_021", "status"), ("pi_100", "missing")]
+    assert found[0].local == (400, PaymentStatus.SUCCEEDED) and found[0].export == (1000, PaymentStatus.SUCCEEDED)
+    assert found[2].export == (2500, PaymentStatus.SUCCEEDED)      # succeeded PI beats its failed charge
+    assert (stats.export_rows, stats.local_rows, stats.matched, stats.local_only) == (31, 31, 27, 2)   # pi_005, pi_local_only
+
+
+def test_repair_applies_synthesized_events_once(app):
+    db.session.add(Order(id="order_1", currency="usd", amount_due=3000, status=OrderStatus.AWAITING_PAYMENT))
+    payment("pi_a", 0, PaymentStatus.PROCESSING, order_id="order_1")
+    payment("pi_newer", 0, PaymentStatus.PROCESSING, last_event_created=AS_OF + 60)   # updated after the export
+    db.session.commit()
+    export = [pi("pi_a", 1000), pi("pi_b", 2000, order_id="order_1"), pi("pi_newer", 700)]
+    lines = [json.dumps(o) for o in export]
+
+    stats = ReconcileStats()
+    assert len(list(reconcile_export(lines, "jsonl", as_of=AS_OF, repair=True, stats=stats))) == 3
+    assert (stats.repair.recorded, stats.repair.stale) == (3, 1)
+    order = db.session.get(Order, "order_1")
+    assert (order.amount_paid, order.status) == (3000, OrderStatus.PAID)
+    assert db.session.query(Payment).filter_by(stripe_payment_intent_id="pi_newer").one().status == PaymentStatus.PROCESSING
+
+    stats = ReconcileStats()
+    found = list(reconcile_export(lines, "jsonl", as_of=AS_OF, repair=True, stats=stats))
+    assert [d.payment_intent_id for d in found] == ["pi_newer"]
+    assert (stats.repair.recorded, stats.repair.duplicates) == (0, 1)
+    assert db.session.query(PaymentEvent).filter(PaymentEvent.stripe_event_id.like("evt_reconcile_%")).count() == 3
+
+
+def test_reconcile_command_reads_a_dashboard_csv(app, tmp_path):
+    payment("pi_1", 1050)
+    payment("pi_2", 500)
+    db.session.commit()
+    path = tmp_path / "unified_payments.csv"
+    path.write_text(
+        "id,Created (UTC),Amount,Currency,Status,PaymentIntent ID,order_id (metadata)\n"
+        "ch_2,2026-10-01 10:00,5.00,usd,Paid,pi_2,\n"
+        "ch_1,2026-10-01 09:00,10.50,usd,Paid,pi_1,\n"
+        "ch_3,2026-10-01 11:00,\"1,200\",jpy,Failed,pi_3,order_9\n"
+    )
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["payments", "reconcile", str(path)])
+    assert result.exit_code == 1
+    assert "pi_3: missing (export: 0 REQUIRES_PAYMENT_METHOD)" in result.output
+    assert "matched=2 missing=1" in result.output and "rows/sec" in result.output
+
+    result = runner.invoke(args=["payments", "reconcile", str(path), "--repair"])
+    assert result.exit_code == 0 and "repair: recorded=1" in result.output
+    assert runner.invoke(args=["payments", "reconcile", str(path)]).exit_code == 0
+
+
+def test_higher_local_amount_is_reported_but_not_repaired(app, tmp_path):
+    # The upsert keeps the greater amount_received, so replaying the export's lower amount would change nothing.
+    payment("pi_a", 900)
+    payment("pi_b", 500)
+    db.session.commit()
+    lines = [json.dumps(pi("pi_a", 700)), json.dumps(pi("pi_b", 600))]
+
+    stats = ReconcileStats()
+    found = list(reconcile_export(lines, "jsonl", as_of=AS_OF, repair=True, stats=stats))
+    assert [(d.payment_intent_id, d.repairable) for d in found] == [("pi_a", False), ("pi_b", True)]
+    assert (stats.amount_mismatch, stats.unrepairable) == (2, 1)
+    assert stats.repair.recorded == 1
+    assert {p.stripe_payment_intent_id: p.amount_received for p in db.session.query(Payment)} == {"pi_a": 900, "pi_b": 600}
+
+    path = tmp_path / "export.jsonl"
+    path.write_text("\n".join(lines) + "\n")
+    result = app.test_cli_runner().invoke(args=["payments", "reconcile", str(path), "--as-of", str(AS_OF), "--repair"])
+    assert result.exit_code == 1
+    assert "pi_a: amount differs: 900 SUCCEEDED (export: 700 SUCCEEDED); not repairable" in result.output
+    assert "unrepairable=1" in result.output
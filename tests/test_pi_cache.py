@@ -0,0 +1,112 @@
+import threading
+from app.stripe_cache import PaymentIntentCache, SQLiteSharedTier, StripeFetcher
+from app.models import Payment, Order, OrderStatus
+from app.extensions import db
+
+
+def make_cache(fake, **kwargs):
+    return PaymentIntentCache(StripeFetcher("sk_test_dummy", fake.url), **kwargs)
+
+
+def test_lru_hits_after_first_fetch(fake_stripe):
+    fake_stripe.payment_intents["pi_1"] = {"order_id": "order_1"}
+    cache = make_cache(fake_stripe)
+
+    assert cache.get_metadata("pi_1") == {"order_id": "order_1"}
+    assert cache.get_metadata("pi_1") == {"order_id": "order_1"}
+
+    stats = cache.stats()
+    assert (stats["misses"], stats["hits"], stats["fetches"]) == (1, 1, 1)
+    assert stats["fetch_seconds"] > 0
+    assert len(fake_stripe.requests) == 1
+
+
+def test_ttl_expiry_and_lru_bound(fake_stripe):
+    for i in range(3):
+        fake_stripe.payment_intents[f"pi_{i}"] = {"order_id": f"order_{i}"}
+
+    cache = make_cache(fake_stripe, maxsize=2)
+    for i in range(3):
+        cache.get_metadata(f"pi_{i}")
+    assert cache.stats()["size"] == 2
+    cache.get_metadata("pi_0")  # evicted as least recently used
+    assert cache.stats()["fetches"] == 4
+
+    expiring = make_cache(fake_stripe, ttl=0)
+    expiring.get_metadata("pi_1")
+    expiring.get_metadata("pi_1")
+    assert expiring.stats()["fetches"] == 2
+
+
+def test_concurrent_misses_share_one_retrieval(fake_stripe):
+    fake_stripe.payment_intents["pi_hot"] = {"order_id": "order_hot"}
+    fake_stripe.delay = 0.2
+    cache = make_cache(fake_stripe)
+
+    results = []
+    barrier = threading.Barrier(8)
+
+    def lookup():
+        barrier.wait()
+        results.append(cache.get_metadata("pi_hot"))
+
+    threads = [threading.Thread(target=lookup) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == [{"order_id": "order_hot"}] * 8
+    assert len(fake_stripe.requests) == 1
+    stats = cache.stats()
+    assert stats["fetches"] == 1
+    assert stats["misses"] + stats["coalesced"] + stats["hits"] == 8
+
+
+def test_failed_lookup_is_not_cached(fake_stripe):
+    cache = make_cache(fake_stripe)
+    for _ in range(2):
+        try:
+            cache.get_metadata("pi_missing")
+        except Exception:
+            pass
+        else:
+            raise AssertionError("expected a Stripe error")
+    assert cache.stats()["fetch_errors"] == 2
+    assert len(fake_stripe.requests) == 2
+
+
+def test_shared_tier_serves_other_workers(fake_stripe, tmp_path):
+    fake_stripe.payment_intents["pi_1"] = {"order_id": "order_1"}
+    path = str(tmp_path / "pi_cache.sqlite")
+
+    first = make_cache(fake_stripe, shared=SQLiteSharedTier(path, ttl=60))
+    second = make_cache(fake_stripe, shared=SQLiteSharedTier(path, ttl=60))  # e.g. another worker process
+    assert first.get_metadata("pi_1") == {"order_id": "order_1"}
+    assert second.get_metadata("pi_1") == {"order_id": "order_1"}
+
+    assert second.stats()["shared_hits"] == 1
+    assert second.stats()["fetches"] == 0
+    assert len(fake_stripe.requests) == 1
+
+
+def test_webhook_links_order_through_cache(app, post, fake_stripe):
+    fake_stripe.payment_intents["pi_1"] = {"order_id": "order_1"}
+    app.extensions["pi_cache"] = make_cache(fake_stripe)
+    db.session.add(Order(id="order_1", currency="usd", amount_due=500, status=OrderStatus.AWAITING_PAYMENT))
+    db.session.commit()
+
+    # A charge event carries no PI metadata, so the PI has to be looked up
+    event = {
+        "id": "evt_ch_1",
+        "type": "charge.succeeded",
+        "data": {"object": {
+            "id": "ch_1", "payment_intent": "pi_1", "currency": "usd", "amount": 500,
+            "paid": True, "status": "succeeded", "payment_method_details": {},
+        }},
+    }
+    assert post(event).status_code == 200
+
+    assert Payment.query.one().order_id == "order_1"
+    assert db.session.get(Order, "order_1").status == OrderStatus.PAID
+    assert app.extensions["pi_cache"].stats()["fetches"] == 1
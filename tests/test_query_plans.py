@@ -0,0 +1,67 @@
+"""EXPLAIN QUERY PLAN regression tests: hot queries must not full-scan a table."""
+
+import pathlib
+from datetime import datetime
+import re
+import pytest
+from sqlalchemy import func, select, tuple_
+from app.extensions import db
+from app.models import Order, Payment, PaymentEvent, PaymentStatus
+from app.orders.totals import _delta_update
+from app.webhooks.worker import due_events
+
+TOOLS_SQL = pathlib.Path(__file__).resolve().parent.parent / "tools" / "sql"
+
+HOT_QUERIES = {
+    "dedupe event id": lambda: select(PaymentEvent.id).where(PaymentEvent.stripe_event_id == "evt_1"),
+    "batch dedupe": lambda: select(PaymentEvent.stripe_event_id).where(
+        PaymentEvent.stripe_event_id.in_(["evt_1", "evt_2"])
+    ),
+    "payment by payment intent": lambda: select(Payment).where(Payment.stripe_payment_intent_id == "pi_1"),
+    "order by id": lambda: select(Order).where(Order.id == "order_1"),
+    "order total delta": _delta_update,
+    "payments of orders": lambda: select(Payment).where(Payment.order_id.in_(["order_1", "order_2"])),
+    "succeeded total per order": lambda: (
+        select(Payment.order_id, func.sum(Payment.amount_received))
+        .where(Payment.order_id.in_(["order_1", "order_2"]), Payment.status == PaymentStatus.SUCCEEDED)
+        .group_by(Payment.order_id)
+    ),
+    "events of payment by time": lambda: (
+        select(PaymentEvent.id).where(PaymentEvent.payment_id == "pay_1").order_by(PaymentEvent.received_at)
+    ),
+    "worker poll": lambda: due_events(datetime(2026, 1, 1), 500),
+    "orders page by status": lambda: (
+        select(Order.id, Order.created_at)
+        .where(Order.status == "PAID", tuple_(Order.created_at, Order.id) > tuple_(None, None))
+        .order_by(Order.created_at, Order.id).limit(100)
+    ),
+    "payments page since": lambda: (
+        select(Payment.id, Payment.created_at)
+        .where(Payment.created_at >= datetime(2026, 1, 1), tuple_(Payment.created_at, Payment.id) > tuple_(None, None))
+        .order_by(Payment.created_at, Payment.id).limit(100)
+    ),
+    "payment events.sql": lambda: (TOOLS_SQL / "payment events.sql").read_text(),
+}
+
+# "SCAN t" and "SCAN t USING [COVERING] INDEX i" both read every row/entry;
+# only "SEARCH ..." steps narrow by key.
+FULL_SCAN = re.compile(r"^SCAN \w+")
+
+
+def query_plan(stmt):
+    sql = stmt if isinstance(stmt, str) else str(
+        stmt.compile(dialect=db.engine.dialect, compile_kwargs={"render_postcompile": True})
+    )
+    # Placeholders don't change the plan; bind NULLs
+    rows = db.session.connection().exec_driver_sql(
+        "EXPLAIN QUERY PLAN " + sql, tuple([None] * sql.count("?"))
+    ).all()
+    return [row[-1] for row in rows]
+
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_query_uses_an_index(app, name):
+    plan = query_plan(HOT_QUERIES[name]())
+    scans = [step for step in plan if FULL_SCAN.match(step)]
+    assert not scans, f"{name}: full table scan in plan {plan}"
+    assert any("USING" in step for step in plan), f"{name}: no index used in plan {plan}"
@@ -0,0 +1,98 @@
+import uuid
+import pytest
+from sqlalchemy import event as sa_event, select
+from sqlalchemy.exc import InvalidRequestError
+from app.extensions import db
+from app.models import Order, OrderStatus, Payment, PaymentEvent, PaymentStatus
+from app.orders import reporting
+from app.query_profiles import AUDIT_PAYMENT, REPORT_ORDER
+from conftest import pi_event
+
+# event insert-or-skip, payment upsert, order UPDATE, event link
+EXPECTED_WEBHOOK_STATEMENTS = 4
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _count(self, *args):
+        self.statements.append(args[2])
+
+    def __enter__(self):
+        self.statements.clear()
+        sa_event.listen(self.engine, "before_cursor_execute", self._count)
+        return self
+
+    def __exit__(self, *exc):
+        sa_event.remove(self.engine, "before_cursor_execute", self._count)
+
+
+def seed_history(n_events, n_payments, order_id="order_1"):
+    """An order with `n_payments` payments; the first one has `n_events` stored events."""
+    db.session.add(Order(id=order_id, currency="usd", amount_due=10**9, status=OrderStatus.PARTIALLY_PAID))
+    for p in range(n_payments):
+        db.session.add(Payment(id=f"pay_{p}", order_id=order_id, stripe_payment_intent_id=f"pi_{p}",
+                               currency="usd", amount_received=100, status=PaymentStatus.SUCCEEDED))
+    for i in range(n_events):
+        pe = PaymentEvent(id=str(uuid.uuid4()), stripe_event_id=f"evt_hist_{i}", type="charge.succeeded", payment_id="pay_0")
+        pe.set_payload({"id": f"evt_hist_{i}", "blob": "x" * 2000})
+        db.session.add(pe)
+    db.session.commit()
+    db.session.expunge_all()
+
+
+def count_statements(post, event):
+    with StatementCounter(db.engine) as counter:
+        assert post(event).status_code == 200
+    return len(counter.statements)
+
+
+@pytest.mark.parametrize("history", [(1, 1), (200, 50)])
+def test_webhook_statement_count_independent_of_history(app, post, history):
+    seed_history(*history)
+    # Same shape of event each time: update an existing payment and its order total
+    assert count_statements(post, pi_event("evt_new", "pi_0", amount=150)) == EXPECTED_WEBHOOK_STATEMENTS
+
+
+def test_webhook_profile_reads_just_the_payment_row(app, post):
+    seed_history(n_events=3, n_payments=1)
+    assert post(pi_event("evt_new", "pi_0", amount=150, created=2_000)).status_code == 200
+    with StatementCounter(db.engine) as counter:
+        # Older than the last applied event: the stale path looks the payment up
+        assert post(pi_event("evt_old", "pi_0", amount=120, created=1_000)).status_code == 200
+    lookups = [s for s in counter.statements if s.lstrip().startswith("SELECT") and "FROM payments" in s]
+    assert len(lookups) == 1
+    assert "JOIN" not in lookups[0] and "payment_events" not in lookups[0]
+    assert PaymentEvent.query.filter_by(stripe_event_id="evt_old").one().payment_id == "pay_0"
+
+
+def test_report_profile_loads_order_with_payments(app):
+    seed_history(n_events=3, n_payments=4)
+    with StatementCounter(db.engine) as counter:
+        detail = reporting.order_detail("order_1")
+    assert [p["id"] for p in detail["payments"]] == ["pay_0", "pay_1", "pay_2", "pay_3"]
+    assert len(counter.statements) == 2
+    assert "FROM payments" in counter.statements[1] and " IN (" in counter.statements[1]
+    assert not [s for s in counter.statements if "payment_events" in s or "card_exp" in s]
+
+    order = db.session.execute(select(Order).options(*REPORT_ORDER).where(Order.id == "order_1")).scalar_one()
+    with pytest.raises(InvalidRequestError):
+        order.payments[0].events
+
+
+def test_audit_profile_lists_event_headers_without_payload(app, client):
+    seed_history(n_events=3, n_payments=1)
+    with StatementCounter(db.engine) as counter:
+        body = client.get("/payments/pay_0/events").get_json()
+    assert [e["stripe_event_id"] for e in body["events"]] == ["evt_hist_0", "evt_hist_1", "evt_hist_2"]
+    assert body["id"] == "pay_0" and set(body["events"][0]) >= {"type", "status", "received_at"}
+    assert len(counter.statements) == 2
+    assert "FROM payment_events" in counter.statements[1]
+    assert not [s for s in counter.statements if "payload" in s]
+    assert client.get("/payments/nope/events").status_code == 404
+
+    payment = db.session.execute(select(Payment).options(*AUDIT_PAYMENT).where(Payment.id == "pay_0")).scalar_one()
+    with pytest.raises(InvalidRequestError):
+        payment.events[0].payload_data
@@ -0,0 +1,152 @@
+import os
+from app.extensions import db
+from app.models import Order, OrderStatus, Payment, PaymentEvent, Refund, RefundKind
+from app.orders.totals import reconcile_order_totals
+from app.webhooks.batch import process_batch
+from app.webhooks.worker import EventWorker
+from conftest import pi_event
+
+
+def refund_event(evt_id, refund_id, amount, status="succeeded", pi_id="pi_1", evt_type="refund.updated"):
+    return {
+        "id": evt_id,
+        "type": evt_type,
+        "data": {"object": {
+            "id": refund_id, "object": "refund", "payment_intent": pi_id, "charge": "ch_1",
+            "amount": amount, "currency": "usd", "status": status, "reason": "requested_by_customer",
+        }},
+    }
+
+
+def dispute_event(evt_id, status, amount=1000, evt_type="charge.dispute.updated"):
+    return {
+        "id": evt_id,
+        "type": evt_type,
+        "data": {"object": {
+            "id": "dp_1", "object": "dispute", "payment_intent": "pi_1", "charge": "ch_1",
+            "amount": amount, "currency": "usd", "status": status, "reason": "fraudulent",
+        }},
+    }
+
+
+def paid_order(post, amount=1000):
+    db.session.add(Order(id="order_1", currency="usd", amount_due=amount, status=OrderStatus.AWAITING_PAYMENT))
+    db.session.commit()
+    assert post(pi_event("evt_paid", amount=amount)).status_code == 200
+
+
+def totals():
+    db.session.expire_all()
+    order = db.session.get(Order, "order_1")
+    payment = db.session.execute(db.select(Payment).filter_by(stripe_payment_intent_id="pi_1")).scalar_one()
+    return order.amount_paid, order.amount_refunded, payment.amount_refunded, order.status
+
+
+def test_partial_then_full_refund(app, post):
+    paid_order(post)
+    assert post(refund_event("evt_r1", "re_1", 300)).status_code == 200
+    assert totals() == (1000, 300, 300, OrderStatus.PARTIALLY_REFUNDED)
+
+    assert post(refund_event("evt_r2", "re_2", 700, evt_type="refund.created")).status_code == 200
+    assert totals() == (1000, 1000, 1000, OrderStatus.REFUNDED)
+    assert not list(reconcile_order_totals())
+
+
+def test_redelivered_refund_is_counted_once(app, post):
+    paid_order(post)
+    assert post(refund_event("evt_r1", "re_1", 300, status="pending", evt_type="refund.created")).status_code == 200
+    assert post(refund_event("evt_r1", "re_1", 300, status="pending", evt_type="refund.created")).status_code == 200
+    # Same refund, new event id and a later status: still 300
+    assert post(refund_event("evt_r2", "re_1", 300)).status_code == 200
+    assert totals() == (1000, 300, 300, OrderStatus.PARTIALLY_REFUNDED)
+    assert db.session.query(Refund).count() == 1
+
+
+def test_failed_refund_gives_the_amount_back(app, post):
+    paid_order(post)
+    assert post(refund_event("evt_r1", "re_1", 300, status="pending")).status_code == 200
+    assert post(refund_event("evt_r2", "re_1", 300, status="failed")).status_code == 200
+    assert totals() == (1000, 0, 0, OrderStatus.PAID)
+    assert db.session.query(Refund).one().status == "failed"
+
+
+def test_dispute_lost_and_won(app, post):
+    paid_order(post)
+    assert post(dispute_event("evt_d1", "warning_needs_response", evt_type="charge.dispute.created")).status_code == 200
+    assert totals() == (1000, 0, 0, OrderStatus.PAID)
+
+    assert post(dispute_event("evt_d2", "needs_response")).status_code == 200
+    assert totals() == (1000, 1000, 1000, OrderStatus.REFUNDED)
+    assert db.session.query(Refund).one().kind == RefundKind.DISPUTE
+
+    assert post(dispute_event("evt_d3", "won", evt_type="charge.dispute.closed")).status_code == 200
+    assert totals() == (1000, 0, 0, OrderStatus.PAID)
+
+
+def test_charge_refunded_with_embedded_refunds(app, post):
+    paid_order(post)
+    resp = post({
+        "id": "evt_ch",
+        "type": "charge.refunded",
+        "data": {"object": {
+            "id": "ch_1", "object": "charge", "payment_intent": "pi_1", "amount": 1000,
+            "amount_refunded": 400, "currency": "usd", "metadata": {"order_id": "order_1"},
+            "refunds": {"data": [
+                {"id": "re_1", "amount": 100, "currency": "usd", "status": "succeeded"},
+                {"id": "re_2", "amount": 300, "currency": "usd", "status": "succeeded"},
+            ]},
+        }},
+    })
+    assert resp.status_code == 200
+    # ...and the per-refund event for one of them changes nothing
+    assert post(refund_event("evt_r2", "re_2", 300)).status_code == 200
+    assert totals() == (1000, 400, 400, OrderStatus.PARTIALLY_REFUNDED)
+    assert {r.stripe_charge_id for r in db.session.query(Refund)} == {"ch_1"}
+
+
+def test_refund_before_payment_event(app, post):
+    db.session.add(Order(id="order_1", currency="usd", amount_due=1000, status=OrderStatus.AWAITING_PAYMENT))
+    db.session.commit()
+    # charge.refunded carries the charge's metadata, so the placeholder
+    # Payment it creates is already linked to the order
+    event = refund_event("evt_r1", "re_1", 1000)
+    charge = {"id": "ch_1", "payment_intent": "pi_1", "metadata": {"order_id": "order_1"},
+              "refunds": {"data": [event["data"]["object"]]}}
+    assert post({"id": "evt_r1", "type": "charge.refunded", "data": {"object": charge}}).status_code == 200
+    assert post(pi_event("evt_paid")).status_code == 200
+    assert totals() == (1000, 1000, 1000, OrderStatus.REFUNDED)
+    assert not list(reconcile_order_totals())
+
+
+def test_batch_applies_refunds(app):
+    db.session.add(Order(id="order_1", currency="usd", amount_due=1000, status=OrderStatus.AWAITING_PAYMENT))
+    db.session.commit()
+    events = [pi_event("evt_paid"), refund_event("evt_r1", "re_1", 250), refund_event("evt_r2", "re_1", 250)]
+    for i, e in enumerate(events):
+        e["created"] = i
+
+    stats = process_batch(events)
+    assert stats.recorded == 3
+    assert totals() == (1000, 250, 250, OrderStatus.PARTIALLY_REFUNDED)
+    assert process_batch(events).duplicates == 3
+    assert totals() == (1000, 250, 250, OrderStatus.PARTIALLY_REFUNDED)
+
+
+def test_oversize_refund_events_keep_what_the_worker_applies(app, post):
+    app.config.update(WEBHOOK_INGEST_MODE="async", EVENT_PAYLOAD_MAX_BYTES=300)
+    db.session.add(Order(id="order_1", currency="usd", amount_due=1000, status=OrderStatus.AWAITING_PAYMENT))
+    db.session.commit()
+    padding = os.urandom(500).hex()     # incompressible, so the stored payloads are reduced
+    refund = refund_event("evt_r1", "re_1", 300)
+    refund["data"]["object"]["description"] = padding
+    charge = {"id": "ch_1", "object": "charge", "payment_intent": "pi_1", "amount": 1000, "currency": "usd",
+              "metadata": {"order_id": "order_1"}, "description": padding,
+              "refunds": {"data": [{"id": "re_2", "amount": 200, "currency": "usd", "status": "succeeded"}]}}
+    for event in (pi_event("evt_paid"), refund, {"id": "evt_ch", "type": "charge.refunded", "data": {"object": charge}}):
+        assert post(event).status_code == 200
+
+    assert EventWorker(app, threads=1).run_once() == 3
+    assert db.session.query(PaymentEvent).filter_by(stripe_event_id="evt_ch").one().payload_json["truncated"]
+    assert totals() == (1000, 500, 500, OrderStatus.PARTIALLY_REFUNDED)
+    refunds = {r.stripe_refund_id: (r.stripe_charge_id, r.reason, r.counted_amount) for r in db.session.query(Refund)}
+    assert refunds == {"re_1": ("ch_1", "requested_by_customer", 300), "re_2": ("ch_1", None, 200)}
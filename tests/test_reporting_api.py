@@ -0,0 +1,87 @@
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import event as sa_event
+from app.extensions import db
+from app.models import Order, OrderStatus, Payment, PaymentStatus
+from conftest import sign_payload
+
+T0 = datetime(2026, 10, 1, 12, 0, 0)
+
+
+def seed(n_orders=25):
+    for i in range(n_orders):
+        status = OrderStatus.PAID if i % 2 else OrderStatus.AWAITING_PAYMENT
+        # Pairs share a created_at, so pages must break ties on id
+        created = T0 + timedelta(minutes=i // 2)
+        db.session.add(Order(id=f"order_{i:03d}", currency="usd", amount_due=1000, status=status,
+                             amount_paid=1000 if i % 2 else 0, created_at=created, updated_at=created))
+        db.session.add(Payment(id=f"pay_{i:03d}", order_id=f"order_{i:03d}", stripe_payment_intent_id=f"pi_{i}",
+                               currency="usd", amount_received=1000, status=PaymentStatus.SUCCEEDED,
+                               created_at=created, updated_at=created))
+    db.session.commit()
+
+
+def test_order_pages_follow_the_cursor(app, client):
+    seed()
+    seen, cursor = [], None
+    while True:
+        url = "/orders?status=paid&limit=5" + (f"&cursor={cursor}" if cursor else "")
+        body = client.get(url).get_json()
+        seen += [o["id"] for o in body["data"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [f"order_{i:03d}" for i in range(1, 25, 2)]
+    assert body["data"][-1]["status"] == "PAID"
+    assert set(body["data"][0]) == {"id", "external_ref", "currency", "amount_due", "amount_paid",
+                                    "amount_refunded", "status", "created_at", "updated_at"}
+
+
+def test_payments_stream_as_ndjson_in_keyset_chunks(app, client, monkeypatch):
+    seed()
+    monkeypatch.setattr("app.orders.routes.STREAM_CHUNK", 4)
+    statements = []
+    sa_event.listen(db.engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+
+    since = (T0 + timedelta(minutes=3)).isoformat()
+    resp = client.get(f"/payments?since={since}", headers={"Accept": "application/x-ndjson"})
+    assert resp.mimetype == "application/x-ndjson"
+    rows = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert [r["id"] for r in rows] == [f"pay_{i:03d}" for i in range(6, 25)]
+    assert rows[0]["status"] == "SUCCEEDED" and rows[0]["created_at"] == since
+
+    selects = [s for s in statements if "FROM payments" in s]
+    assert len(selects) == 5                               # ceil(19 / 4) chunks
+    assert all("LIMIT" in s for s in selects)
+    assert not [s for s in statements if "payment_events" in s]
+
+
+def test_order_detail_etag(app, client):
+    db.session.add(Order(id="order_1", currency="usd", amount_due=1000, status=OrderStatus.AWAITING_PAYMENT))
+    db.session.commit()
+
+    resp = client.get("/orders/order_1")
+    assert resp.status_code == 200 and resp.get_json()["payments"] == []
+    etag = resp.headers["ETag"]
+    assert client.get("/orders/order_1", headers={"If-None-Match": etag}).status_code == 304
+
+    # A payment landing on the order changes the tag
+    body = json.dumps({
+        "id": "evt_1", "type": "payment_intent.succeeded",
+        "data": {"object": {"id": "pi_1", "currency": "usd", "amount_received": 1000, "status": "succeeded",
+                            "charges": {"data": []}, "metadata": {"order_id": "order_1"}}},
+    })
+    client.post("/webhooks/stripe", data=body, headers={"Stripe-Signature": sign_payload(body)})
+    resp = client.get("/orders/order_1", headers={"If-None-Match": etag})
+    assert resp.status_code == 200 and resp.headers["ETag"] != etag
+    detail = resp.get_json()
+    assert (detail["status"], detail["amount_paid"]) == ("PAID", 1000)
+    assert [p["stripe_payment_intent_id"] for p in detail["payments"]] == ["pi_1"]
+
+
+def test_bad_requests(app, client):
+    assert client.get("/orders/nope").status_code == 404
+    assert client.get("/orders?status=shipped").status_code == 400
+    assert client.get("/orders?cursor=garbage").status_code == 400
+    assert client.get("/orders?limit=0").status_code == 400
+    assert client.get("/payments?since=yesterday").status_code == 400
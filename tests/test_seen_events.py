@@ -0,0 +1,74 @@
+import os
+from sqlalchemy import event as sa_event
+from app.extensions import db
+from app.models import Payment
+from app.seen_events import BloomFilter, SeenEvents, bloom_size
+from conftest import pi_event
+
+
+def enable(app, **config):
+    app.config.update(SEEN_FILTER_ENABLED=True, SEEN_FILTER_CAPACITY=1000, **config)
+    seen = app.extensions["seen_events"] = SeenEvents.from_app(app)
+    return seen
+
+
+def test_sizing_and_false_positive_rate():
+    assert bloom_size(1_000_000, 0.001) == (14377592, 10)
+
+    bloom = BloomFilter(*bloom_size(10_000, 0.01))
+    for i in range(10_000):
+        bloom.add(f"evt_{i}")
+    assert all(f"evt_{i}" in bloom for i in range(10_000))     # no false negatives
+    false_positives = sum(f"evt_other_{i}" in bloom for i in range(10_000))
+    assert false_positives < 200
+    assert 0.005 < bloom.estimated_fp_rate() < 0.02
+    assert 9_000 < bloom.estimated_items() < 11_000
+
+
+def test_mmap_file_is_shared_across_processes(tmp_path):
+    path = str(tmp_path / "seen.bloom")
+    bits, hashes = bloom_size(1000, 0.01)
+    parent = BloomFilter(bits, hashes, path=path)
+    pid = os.fork()
+    if pid == 0:  # child: add through its own mapping of the file
+        BloomFilter(bits, hashes, path=path).add("evt_from_child")
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert "evt_from_child" in parent
+    assert os.path.getsize(path) == 64 + bits // 8
+
+    # A file sized for other parameters starts over
+    assert "evt_from_child" not in BloomFilter(*bloom_size(5000, 0.01), path=path)
+
+
+def test_duplicates_skip_the_work_and_new_events_skip_the_probe(app, post):
+    assert post(pi_event("evt_old", order_id=None)).status_code == 200           # received before the filter existed
+    seen = enable(app)
+    statements = []
+    sa_event.listen(db.engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+
+    # Warmed from the table: caught by the probe
+    assert post(pi_event("evt_old", amount=5, order_id=None)).status_code == 200
+    assert len(statements) == 2                    # warm-up query + one probe
+    assert seen.stats()["warmed_ids"] == 1
+
+    statements.clear()
+    assert post(pi_event("evt_new", order_id=None)).status_code == 200
+    assert not [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+
+    statements.clear()
+    assert post(pi_event("evt_new", amount=5, order_id=None)).status_code == 200   # added after commit
+    assert len(statements) == 1
+    assert db.session.query(Payment).one().amount_received == 1000
+
+    stats = seen.stats()
+    assert (stats["checks"], stats["maybe_seen"], stats["false_positives"]) == (3, 2, 0)
+
+
+def test_metrics_report_filter_size_and_fp_rate(app, client, post):
+    enable(app, SEEN_FILTER_FP_RATE=0.01)
+    assert post(pi_event("evt_1", order_id=None)).status_code == 200
+    text = client.get("/metrics").get_data(as_text=True)
+    assert f"seen_filter_memory_bytes {bloom_size(1000, 0.01)[0] // 8}" in text
+    assert "seen_filter_fp_rate_target 0.01" in text
+    assert "seen_filter_fp_rate_estimated " in text
@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+import pytest
+from benchmarks.startup import ROOT, parse_importtime, probe
+
+HEAVY = ("stripe", "alembic", "flask_migrate")
+IMPORT_BUDGET_MS = 1500   # generous: ~400ms locally; catches a heavy import creeping back in
+
+
+def test_import_and_cli_app_stay_lean():
+    import_ms, create_ms, modules = probe("cli")
+    slowest = sorted(modules.items(), key=lambda kv: -kv[1][0])[:10]
+    assert modules["app"][1] / 1000 < IMPORT_BUDGET_MS, f"`import app` too slow; top self times (us): {slowest}"
+    assert not [m for m in HEAVY if m in modules]
+
+
+def test_heavy_modules_load_on_first_use():
+    code = "\n".join([
+        "import sys",
+        "from app import create_app",
+        "web, cli = create_app(), create_app('cli')",
+        f"loaded = lambda: ','.join(m for m in {HEAVY!r} if m in sys.modules) or '-'",
+        "print(loaded())",
+        "print(' '.join(cli.cli.commands['db'].list_commands(None)))",
+        "print(loaded())",
+    ])
+    env = {**os.environ, "SQLALCHEMY_DATABASE_URI": "sqlite://"}
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout.splitlines()
+    assert out[0] == "-"
+    assert "upgrade" in out[1].split()
+    assert "flask_migrate" in out[2].split(",")
+
+
+def test_cli_mode_has_commands_but_no_routes():
+    from app import create_app
+
+    app = create_app("cli")
+    assert app.config["APP_MODE"] == "cli"
+    rules = {r.rule for r in app.url_map.iter_rules()}
+    assert "/webhooks/stripe" not in rules and "/metrics" not in rules
+    assert {"webhooks", "orders", "events", "db"} <= set(app.cli.commands)
+
+    with pytest.raises(ValueError):
+        create_app("worker")
+
+
+def test_parse_importtime():
+    stderr = ("import time: self [us] | cumulative | imported package\n"
+              "import time:       120 |        120 |   _io\n"
+              "import time:      2000 |       5000 | app\n")
+    assert parse_importtime(stderr) == {"_io": (120, 120), "app": (2000, 5000)}
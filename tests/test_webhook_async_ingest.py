@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from app.extensions import db
+from app.models import PaymentEvent, Payment, PaymentStatus, EventStatus, Order, OrderStatus
+from app.webhooks.worker import EventWorker
+from conftest import pi_event
+
+
+def test_async_ingest_records_pending_and_worker_applies(app, post):
+    app.config["WEBHOOK_INGEST_MODE"] = "async"
+    db.session.add(Order(id="order_1", currency="usd", amount_due=1000, status=OrderStatus.AWAITING_PAYMENT))
+    db.session.commit()
+
+    resp = post(pi_event("evt_1", "pi_1"))
+    assert resp.status_code == 200
+
+    pe = PaymentEvent.query.filter_by(stripe_event_id="evt_1").one()
+    assert pe.status == EventStatus.PENDING
+    assert pe.payment_intent_id == "pi_1"
+    assert Payment.query.count() == 0
+
+    assert EventWorker(app, threads=2).run_once() == 1
+
+    db.session.expire_all()
+    pe = PaymentEvent.query.filter_by(stripe_event_id="evt_1").one()
+    assert pe.status == EventStatus.PROCESSED
+    assert pe.processed_at is not None
+    payment = Payment.query.filter_by(stripe_payment_intent_id="pi_1").one()
+    assert pe.payment_id == payment.id
+    assert db.session.get(Order, "order_1").status == OrderStatus.PAID
+
+    # Nothing left to do
+    assert EventWorker(app, threads=2).run_once() == 0
+
+
+def test_worker_applies_events_per_payment_intent_in_arrival_order(app, post):
+    app.config["WEBHOOK_INGEST_MODE"] = "async"
+    post(pi_event("evt_a1", "pi_a", status="processing", amount=0))
+    post(pi_event("evt_b1", "pi_b", status="processing", amount=0))
+    post(pi_event("evt_a2", "pi_a", status="succeeded", amount=500))
+    post(pi_event("evt_b2", "pi_b", status="canceled", amount=0))
+
+    assert EventWorker(app, threads=4).run_once() == 4
+
+    db.session.expire_all()
+    assert Payment.query.filter_by(stripe_payment_intent_id="pi_a").one().status == PaymentStatus.SUCCEEDED
+    assert Payment.query.filter_by(stripe_payment_intent_id="pi_b").one().status == PaymentStatus.CANCELED
+
+
+def test_worker_retries_with_backoff_and_holds_later_events(app, post):
+    app.config["WEBHOOK_INGEST_MODE"] = "async"
+    post(pi_event("evt_1", "pi_1", status="processing", amount=0))
+    post(pi_event("evt_2", "pi_1", status="succeeded", amount=700))
+
+    worker = EventWorker(app, threads=1, max_attempts=2, backoff_base=60)
+    with patch("app.webhooks.worker.apply_event", side_effect=RuntimeError("db hiccup")):
+        assert worker.run_once() == 0
+
+    db.session.expire_all()
+    first = PaymentEvent.query.filter_by(stripe_event_id="evt_1").one()
+    second = PaymentEvent.query.filter_by(stripe_event_id="evt_2").one()
+    assert first.status == EventStatus.PENDING
+    assert first.attempts == 1
+    assert "db hiccup" in first.last_error
+    assert first.next_attempt_at > datetime.utcnow() + timedelta(seconds=30)
+    # evt_2 was not attempted: it must not overtake evt_1
+    assert second.attempts == 0
+
+    # Still backing off: nothing for pi_1 is due
+    assert worker.run_once() == 0
+
+    first.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert worker.run_once() == 2
+
+    db.session.expire_all()
+    assert Payment.query.filter_by(stripe_payment_intent_id="pi_1").one().status == PaymentStatus.SUCCEEDED
+
+
+def test_backed_off_events_do_not_fill_the_batch(app, post):
+    app.config["WEBHOOK_INGEST_MODE"] = "async"
+    for i in range(5):
+        post(pi_event(f"evt_wait_{i}", f"pi_wait_{i}"))
+    post(pi_event("evt_due", "pi_due"))
+    db.session.expire_all()
+    later = datetime.utcnow() + timedelta(minutes=5)
+    PaymentEvent.query.filter(PaymentEvent.stripe_event_id.like("evt_wait_%")).update(
+        {"next_attempt_at": later}, synchronize_session=False
+    )
+    db.session.commit()
+
+    # All five backed-off rows arrived first; a batch of 2 still reaches the due one
+    assert EventWorker(app, threads=1, batch_size=2).run_once() == 1
+    db.session.expire_all()
+    assert Payment.query.one().stripe_payment_intent_id == "pi_due"
+
+
+def test_worker_marks_event_failed_after_max_attempts(app, post):
+    app.config["WEBHOOK_INGEST_MODE"] = "async"
+    post(pi_event("evt_bad", "pi_1"))
+
+    worker = EventWorker(app, threads=1, max_attempts=1)
+    with patch("app.webhooks.worker.apply_event", side_effect=ValueError("poison")):
+        assert worker.run_once() == 1
+
+    db.session.expire_all()
+    pe = PaymentEvent.query.filter_by(stripe_event_id="evt_bad").one()
+    assert pe.status == EventStatus.FAILED
+    assert pe.attempts == 1
+    assert Payment.query.count() == 0
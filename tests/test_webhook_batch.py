@@ -0,0 +1,139 @@
+import json
+from sqlalchemy import event as sa_event
+from app.extensions import db
+from app.models import PaymentEvent, Payment, PaymentStatus, Order, OrderStatus
+from app.webhooks.batch import process_batch, process_events
+from conftest import pi_event
+
+
+def charge_event(evt_id, pi_id, amount, created=0):
+    return {
+        "id": evt_id,
+        "type": "charge.succeeded",
+        "created": created,
+        "data": {"object": {
+            "id": f"ch_{evt_id}", "payment_intent": pi_id, "currency": "usd", "amount": amount,
+            "paid": True, "status": "succeeded",
+            "payment_method_details": {"type": "card", "card": {
+                "brand": "visa", "last4": "4242", "exp_month": 12, "exp_year": 2030,
+            }},
+        }},
+    }
+
+
+def lifecycle(n_orders=3):
+    events = []
+    for i in range(n_orders):
+        oid = f"order_{i}"
+        # Two installments per order, each with a created -> succeeded -> charge sequence
+        for k in range(2):
+            pi = f"pi_{i}_{k}"
+            base = (i * 10 + k) * 3
+            events.append(pi_event(f"evt_{pi}_c", pi, "requires_payment_method", 0, oid, base))
+            events.append(pi_event(f"evt_{pi}_s", pi, "succeeded", 500, oid, base + 1))
+            events.append(charge_event(f"evt_{pi}_ch", pi, 500, base + 2))
+    events.append({"id": "evt_customer", "type": "customer.created", "data": {"object": {"id": "cus_1"}}})
+    return events
+
+
+def seed_orders(n_orders=3, amount_due=1000):
+    for i in range(n_orders):
+        db.session.add(Order(id=f"order_{i}", currency="usd", amount_due=amount_due, status=OrderStatus.AWAITING_PAYMENT))
+    db.session.commit()
+
+
+def snapshot():
+    db.session.expire_all()
+    payments = {
+        p.stripe_payment_intent_id: (p.order_id, p.amount_received, p.status, p.card_last4)
+        for p in Payment.query.all()
+    }
+    orders = {o.id: o.status for o in Order.query.all()}
+    linked = {e.stripe_event_id: e.payment_id is not None for e in PaymentEvent.query.all()}
+    return payments, orders, linked
+
+
+def test_batch_matches_per_request_processing(app, post):
+    events = lifecycle()
+    seed_orders()
+    for event in events:
+        assert post(event).status_code == 200
+    expected = snapshot()
+
+    # Same events, fresh tables, batch path
+    db.session.expunge_all()
+    db.drop_all()
+    db.create_all()
+    seed_orders()
+    stats = process_events(events, batch_size=7)
+    assert stats.recorded == len(events) - 1     # customer.created is ignored, as by the route
+    assert (stats.ignored, stats.unhandled) == (1, 0)
+
+    assert snapshot() == expected
+    assert all(status == OrderStatus.PAID for status in expected[1].values())
+
+
+def test_batch_skips_known_and_repeated_event_ids(app):
+    seed_orders(1)
+    first = [pi_event("evt_1", "pi_1", "processing", 0, "order_0", created=0)]
+    process_batch(first)
+
+    stats = process_batch([
+        pi_event("evt_1", "pi_1", "processing", 0, "order_0", created=0),   # already stored
+        pi_event("evt_2", "pi_1", "succeeded", 1000, "order_0", created=5),
+        pi_event("evt_2", "pi_1", "succeeded", 1000, "order_0", created=5),  # repeated in batch
+    ])
+    assert (stats.received, stats.duplicates, stats.recorded) == (3, 2, 1)
+    assert PaymentEvent.query.count() == 2
+
+    db.session.expire_all()
+    payment = Payment.query.one()
+    assert payment.status == PaymentStatus.SUCCEEDED
+    assert payment.amount_received == 1000
+    assert {e.payment_id for e in PaymentEvent.query.all()} == {payment.id}
+    assert db.session.get(Order, "order_0").status == OrderStatus.PAID
+
+
+def test_batch_statement_count_does_not_grow_with_batch_size(app):
+    seed_orders(20)
+    statements = []
+
+    def count(*args):
+        statements.append(args[2])
+
+    def run(events):
+        statements.clear()
+        sa_event.listen(db.engine, "before_cursor_execute", count)
+        try:
+            process_batch(events)
+        finally:
+            sa_event.remove(db.engine, "before_cursor_execute", count)
+        return len(statements)
+
+    small = run(lifecycle(2))
+    db.session.expunge_all()
+    db.drop_all()
+    db.create_all()
+    seed_orders(20)
+    large = run(lifecycle(20))
+    assert small == large
+
+
+def test_replay_cli(app, tmp_path):
+    seed_orders()
+    events = lifecycle()
+    path = tmp_path / "events.jsonl"
+    # Mix plain event lines with a `stripe events list` page
+    lines = [json.dumps(e) for e in events[:5]]
+    lines.append(json.dumps({"object": "list", "data": events[5:], "has_more": False}))
+    path.write_text("\n".join(lines) + "\n")
+
+    result = app.test_cli_runner().invoke(args=["webhooks", "replay", str(path), "--batch-size", "4"])
+    assert result.exit_code == 0, result.output
+    assert f"replayed {len(events)} event(s)" in result.output
+    assert "events/sec" in result.output
+    assert PaymentEvent.query.count() == len(events) - 1   # minus the ignored customer.created
+
+    # Replaying the same file is a no-op
+    result = app.test_cli_runner().invoke(args=["webhooks", "replay", str(path)])
+    assert f"duplicates={len(events) - 1} unhandled=0 ignored=1" in result.output
@@ -0,0 +1,51 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.extensions import db
+from app.models import Order, OrderStatus, Payment, PaymentEvent, PaymentStatus
+from conftest import pi_event, post_event
+
+THREADS = 8
+
+
+def post_concurrently(app, events):
+    """POST each event from its own thread, all released at once; returns status codes."""
+    barrier = threading.Barrier(len(events))
+
+    def post(event):
+        client = app.test_client()
+        barrier.wait()
+        return post_event(client, event).status_code
+
+    with ThreadPoolExecutor(len(events)) as pool:
+        return list(pool.map(post, events))
+
+
+def seed_order(amount_due=1000):
+    db.session.add(Order(id="order_1", currency="usd", amount_due=amount_due, status=OrderStatus.AWAITING_PAYMENT))
+    db.session.commit()
+
+
+def test_concurrent_duplicate_deliveries_apply_once(app):
+    seed_order()
+    codes = post_concurrently(app, [pi_event("evt_dup", amount=400)] * THREADS)
+    assert codes == [200] * THREADS
+
+    db.session.expire_all()
+    assert PaymentEvent.query.count() == 1
+    payment = Payment.query.one()
+    assert (payment.status, payment.amount_received) == (PaymentStatus.SUCCEEDED, 400)
+    assert PaymentEvent.query.one().payment_id == payment.id
+    order = db.session.get(Order, "order_1")
+    assert (order.amount_paid, order.status) == (400, OrderStatus.PARTIALLY_PAID)
+
+
+def test_concurrent_distinct_events_for_one_payment_count_it_once(app):
+    seed_order()
+    # Stripe sends several events that all report the same succeeded state
+    codes = post_concurrently(app, [pi_event(f"evt_{i}", amount=400) for i in range(THREADS)])
+    assert codes == [200] * THREADS
+
+    db.session.expire_all()
+    assert PaymentEvent.query.count() == THREADS
+    assert Payment.query.count() == 1
+    assert db.session.get(Order, "order_1").amount_paid == 400
@@ -1,7 +1,9 @@
 import json
 from unittest.mock import patch
+from sqlalchemy import event as sa_event
 from app.extensions import db
 from app.models import PaymentEvent, Payment, PaymentStatus
+from conftest import sign_payload
 
 def make_event(evt_id="evt_1", evt_type="payment_intent.succeeded", pi_id="pi_123", currency="usd", amount=1234):
     return {
@@ -19,13 +21,12 @@ def make_event(evt_id="evt_1", evt_type="payment_intent.succeeded", pi_id="pi_12
         }
     }
 
-@patch("stripe.Webhook.construct_event")
-def test_idempotent_processing(mock_construct, client, app):
+def test_idempotent_processing(client, app):
     # First delivery
     event = make_event(evt_id="evt_A", pi_id="pi_A")
-    mock_construct.return_value = event
+    body = json.dumps(event)
 
-    resp = client.post("/webhooks/stripe", data=json.dumps(event), headers={"Stripe-Signature": "t=0,v1=deadbeef"})
+    resp = client.post("/webhooks/stripe", data=body, headers={"Stripe-Signature": sign_payload(body)})
     assert resp.status_code == 200
 
     with app.app_context():
@@ -36,11 +37,25 @@ def test_idempotent_processing(mock_construct, client, app):
         assert p.stripe_payment_intent_id == "pi_A"
 
     # Duplicate delivery (same event id)
-    mock_construct.return_value = event
-    resp2 = client.post("/webhooks/stripe", data=json.dumps(event), headers={"Stripe-Signature": "t=0,v1=deadbeef"})
+    resp2 = client.post("/webhooks/stripe", data=body, headers={"Stripe-Signature": sign_payload(body)})
     assert resp2.status_code == 200
 
     with app.app_context():
         # No additional rows
         assert db.session.query(PaymentEvent).count() == 1
         assert db.session.query(Payment).count() == 1
+
+
+def test_duplicate_is_caught_before_any_apply_work(app, post):
+    event = make_event(evt_id="evt_B", pi_id="pi_B")
+    event["data"]["object"]["metadata"] = {}     # order unknown: the first delivery looks the PI up
+    statements = []
+    sa_event.listen(db.engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+    with patch("app.webhooks.processing._link_order", return_value=(None, None)) as link:
+        assert post(event).status_code == 200
+        assert link.call_count == 1
+
+        statements.clear()
+        assert post(event).status_code == 200
+        assert link.call_count == 1
+    assert len(statements) == 1 and statements[0].lstrip().upper().startswith("INSERT INTO PAYMENT_EVENTS")
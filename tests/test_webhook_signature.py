@@ -0,0 +1,64 @@
+import json
+import time
+import pytest
+import stripe
+from app.models import PaymentEvent
+from app.webhooks.signature import SignatureVerificationError, verify_signature
+from conftest import sign_payload
+
+SECRET = "whsec_dummy"
+BODY = (
+    '{\n  "id": "evt_1",\n  "type": "payment_intent.created",\n'
+    '  "data": {"object": {"id": "pi_1", "status": "requires_payment_method", "description": "Zoë"}}\n}'
+)
+
+
+def stripe_accepts(body, header):
+    try:
+        stripe.WebhookSignature.verify_header(body, header, SECRET, tolerance=300)
+        return True
+    except stripe.SignatureVerificationError:
+        return False
+
+
+def ours_accepts(body, header):
+    try:
+        verify_signature(body.encode(), header, SECRET, tolerance=300)
+        return True
+    except SignatureVerificationError:
+        return False
+
+
+@pytest.mark.parametrize("header", [
+    sign_payload(BODY),
+    sign_payload(BODY, secret="whsec_other"),
+    sign_payload(BODY, timestamp=time.time() - 301),
+    sign_payload(BODY) + ",v1=" + "0" * 64,                             # extra (rotated) signature
+    "v1=" + "0" * 64 + "," + sign_payload(BODY).replace("v1=", "v0="),  # only an unknown scheme matches
+    sign_payload(BODY).split(",")[1],                                   # no timestamp
+    sign_payload(BODY).split(",")[0],                                   # no signature
+    "t=abc,v1=00",
+    "",
+])
+def test_same_verdict_as_the_stripe_library(header):
+    assert ours_accepts(BODY, header) == stripe_accepts(BODY, header)
+
+
+def test_tampered_body_or_garbled_signature_is_rejected():
+    header = sign_payload(BODY)
+    assert not ours_accepts(BODY.replace("created", "succeeded"), header)
+    assert not ours_accepts(BODY, header.replace("v1=", "v1=é"))   # the library raises TypeError here
+
+
+def test_webhook_stores_the_body_as_received(app, client):
+    resp = client.post("/webhooks/stripe", data=BODY.encode(), headers={"Stripe-Signature": sign_payload(BODY)})
+    assert resp.status_code == 200
+    pe = PaymentEvent.query.one()
+    assert pe.payload_text == BODY
+    assert pe.payload_json == json.loads(BODY)
+
+
+def test_signed_non_object_body_is_invalid(client):
+    body = "[1, 2]"
+    resp = client.post("/webhooks/stripe", data=body, headers={"Stripe-Signature": sign_payload(body)})
+    assert resp.status_code == 400